@@ -4,6 +4,8 @@ class GitHubStatsWidget {
     this.currentRepo = null;
     this.widget = null;
     this.autoHideTimer = null;
+    // 服务器返回 429 后，在 Retry-After 指定的时间之前不再请求
+    this.retryAfterUntil = 0;
     this.locale = 'zh';
     this.messages = {
       'zh': {
@@ -17,6 +19,7 @@ class GitHubStatsWidget {
         'clickToConfig': '点击插件图标设置',
         'statsTimeout': '统计超时，请稍后重试',
         'fetchStatsFailed': '获取统计失败',
+        'rateLimited': '请求过于频繁，请稍后再试',
         'alertConfigServer': '请先点击插件图标配置服务器地址'
       },
       'en': {
@@ -30,6 +33,7 @@ class GitHubStatsWidget {
         'clickToConfig': 'Click extension icon to setup',
         'statsTimeout': 'Stats timeout, please try again later',
         'fetchStatsFailed': 'Failed to fetch stats',
+        'rateLimited': 'Too many requests, please try again later',
         'alertConfigServer': 'Please click the extension icon to configure the server address'
       }
     };
@@ -93,6 +97,7 @@ class GitHubStatsWidget {
       this.currentRepo = {
         owner,
         repo,
+        refPath: this.detectRefPath(pathParts),
         fullName: `${owner}/${repo}`,
         url: `https://github.com/${owner}/${repo}`
       };
@@ -104,6 +109,20 @@ class GitHubStatsWidget {
     }
   }
 
+  // 分支、标签或提交页面中引用所在的路径（tree/ 等之后的全部内容），默认分支返回 null
+  // 分支名中的 / 在URL中无法与目录区分，由服务器从中找出最长的已有分支或标签
+  detectRefPath(pathParts) {
+    const section = pathParts[2];
+    const decode = (parts) => parts.map(decodeURIComponent).join('/');
+    if (['tree', 'blob', 'commit', 'commits'].includes(section) && pathParts[3]) {
+      return decode(pathParts.slice(3));
+    }
+    if (section === 'releases' && pathParts[3] === 'tag' && pathParts[4]) {
+      return decode(pathParts.slice(4));
+    }
+    return null;
+  }
+
   isValidRepoPage(pathParts) {
     // 排除用户页面、组织页面等
     const invalidPaths = ['settings', 'notifications', 'explore', 'marketplace'];
@@ -114,7 +133,7 @@ class GitHubStatsWidget {
     
     // 检查是否在仓库的子页面
     if (pathParts.length >= 2) {
-      const validRepoPaths = ['tree', 'blob', 'commits', 'releases', 'issues', 'pull', 'actions', 'projects', 'wiki', 'security', 'insights', 'settings'];
+      const validRepoPaths = ['tree', 'blob', 'commit', 'commits', 'releases', 'issues', 'pull', 'actions', 'projects', 'wiki', 'security', 'insights', 'settings'];
       
       // 如果只有两个路径部分（owner/repo），肯定是仓库页面
       if (pathParts.length === 2) {
@@ -242,6 +261,25 @@ class GitHubStatsWidget {
     }
   }
 
+  // 每个仓库缓存最近一次的统计结果和 ETag，存放在 chrome.storage.local 中
+  statsCacheKey() {
+    const ref = this.currentRepo.refPath ? `@${this.currentRepo.refPath}` : '';
+    return `stats:${this.currentRepo.owner}/${this.currentRepo.repo}${ref}`;
+  }
+
+  async loadCachedStats() {
+    return new Promise((resolve) => {
+      const key = this.statsCacheKey();
+      chrome.storage.local.get([key], (result) => {
+        resolve(result[key] || null);
+      });
+    });
+  }
+
+  saveCachedStats(etag, data) {
+    chrome.storage.local.set({ [this.statsCacheKey()]: { etag, data } });
+  }
+
   async fetchStats() {
     if (!this.serverUrl || !this.currentRepo) {
       this.updateWidgetContent('noServer');
@@ -249,19 +287,43 @@ class GitHubStatsWidget {
     }
 
     try {
+      const cachedStats = await this.loadCachedStats();
+      if (Date.now() < this.retryAfterUntil) {
+        this.showRateLimited(cachedStats);
+        return;
+      }
+      const headers = {
+        'Content-Type': 'application/json',
+      };
+      // 带上上次结果的 ETag，仓库没有新提交时服务器只返回 304
+      if (cachedStats && cachedStats.etag) {
+        headers['If-None-Match'] = cachedStats.etag;
+      }
+
       // 第一次请求
       const response = await fetch(`${this.serverUrl}/api/stats`, {
         method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
+        headers,
         body: JSON.stringify({
           repoUrl: this.currentRepo.url,
           owner: this.currentRepo.owner,
-          repo: this.currentRepo.repo
+          repo: this.currentRepo.repo,
+          refPath: this.currentRepo.refPath
         })
       });
 
+      if (response.status === 304 && cachedStats) {
+        this.updateWidgetContent('success', cachedStats.data);
+        return;
+      }
+
+      if (response.status === 429) {
+        const retryAfter = parseInt(response.headers.get('Retry-After'), 10) || 30;
+        this.retryAfterUntil = Date.now() + retryAfter * 1000;
+        this.showRateLimited(cachedStats);
+        return;
+      }
+
       if (!response.ok) {
         throw new Error(`HTTP ${response.status}`);
       }
@@ -274,6 +336,10 @@ class GitHubStatsWidget {
         this.updateWidgetContent('loading');
         this.pollForStats();
       } else {
+        const etag = response.headers.get('ETag');
+        if (etag) {
+          this.saveCachedStats(etag, data);
+        }
         this.updateWidgetContent('success', data);
       }
       
@@ -283,6 +349,15 @@ class GitHubStatsWidget {
     }
   }
 
+  showRateLimited(cachedStats) {
+    // 被限流时有旧结果就先显示旧结果
+    if (cachedStats) {
+      this.updateWidgetContent('success', cachedStats.data);
+    } else {
+      this.updateWidgetContent('error', this.t('rateLimited'));
+    }
+  }
+
   async pollForStats() {
     if (!this.serverUrl || !this.currentRepo) {
       return;
@@ -343,7 +418,10 @@ class GitHubStatsWidget {
     }
 
     // 构建统计页面URL
-    const statsUrl = `${this.serverUrl}/stats?owner=${this.currentRepo.owner}&repo=${this.currentRepo.repo}`;
+    let statsUrl = `${this.serverUrl}/stats?owner=${this.currentRepo.owner}&repo=${this.currentRepo.repo}`;
+    if (this.currentRepo.refPath) {
+      statsUrl += `&refPath=${encodeURIComponent(this.currentRepo.refPath)}`;
+    }
     window.open(statsUrl, '_blank');
   }
 
@@ -400,7 +478,7 @@ class GitHubStatsWidget {
   isSameRepo(repo1, repo2) {
     if (!repo1 && !repo2) return true;
     if (!repo1 || !repo2) return false;
-    return repo1.fullName === repo2.fullName;
+    return repo1.fullName === repo2.fullName && repo1.refPath === repo2.refPath;
   }
 
   setupMessageListener() {
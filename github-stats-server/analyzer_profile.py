@@ -0,0 +1,41 @@
+# 统计配置的版本
+# 影响统计结果的配置（二进制扩展名和魔数、文本判断阈值、默认排除规则、语言和注释表等）规范化后取哈希，
+# 与手动递增的统计版本一起组成 profile ID。缓存的结果、blob 和子树条目都带有 profile，
+# 配置变化后旧条目自动失效，ETag 也随之变化。
+import hashlib
+import json
+import re
+
+
+def _normalize(value):
+    """转换为可稳定序列化的结构：集合排序，bytes 转十六进制，正则取模式，函数取名称"""
+    if isinstance(value, dict):
+        return {str(key): _normalize(item) for key, item in value.items()}
+    if isinstance(value, (set, frozenset)):
+        return sorted((_normalize(item) for item in value), key=lambda item: json.dumps(item, sort_keys=True))
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value).hex()
+    if isinstance(value, re.Pattern):
+        return _normalize(value.pattern)
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if callable(value):
+        # 函数只记录名称，实现的变化需要递增统计版本
+        return f"{value.__module__}.{value.__qualname__}"
+    return repr(value)
+
+
+class AnalyzerProfile:
+    """一组统计配置及其 ID（"版本.哈希"）"""
+
+    def __init__(self, version, settings):
+        self.version = version
+        self.settings = _normalize(settings)
+        encoded = json.dumps(self.settings, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        self.digest = hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+        self.id = f"{version}.{self.digest[:10]}"
+
+    def describe(self):
+        return {'id': self.id, 'version': self.version, 'settings': sorted(self.settings)}
@@ -1,55 +1,132 @@
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, Response, request, jsonify, render_template, make_response, send_file, redirect
 from flask_cors import CORS
-import subprocess
+import functools
+import hmac
 import os
 import tempfile
 import shutil
 import time
 from collections import defaultdict
 import json
+import hashlib
+import math
+from contextlib import contextmanager
 from pathlib import Path
 import re
+import tarfile
+import uuid
+import zipfile
+from urllib.parse import urlencode
 from i18n import i18n
+from engine import (analyzer_profile, is_valid_ref, probe_git, clone_repository, resolve_remote_sha,
+                    resolve_ref_path, is_binary_name,
+                    analyze_file_content, thaw_stats, add_file_to_stats, finalize_stats,
+                    analyze_repository_limited, analyze_archive_stream, is_cacheable, summarize_stats, save_stats,
+                    MAX_TEXT_FILE_SIZE)
+from exclusions import ExclusionRules
+from languages import sort_languages
+from result_cache import ResultCache, BlobCache, ResponseCache
+from batch import BatchManager, MAX_BATCH_SIZE, STREAM_SECONDS
+from jobstore import JobStore
+from cluster import Cluster
+from mirrors import MirrorStore
+from history import HistoryAnalyzer
+import archive
+import compare
+import export
+from submodules import list_submodules, fetch_submodules
+from static_pages import CachedPage, AssetVersions
+from sandbox import JobLimits, JobBudget, run_limited
+from ratelimit import RateLimiter
+from diskbudget import DiskBudget, DiskArea, child_dirs, bucket_files
+from refresh import StaleRefresher
+import profiling
 
 app = Flask(__name__, static_folder='.', static_url_path='')
 app.secret_key = 'github_stats_secret_key_2023'  # 用于session
-CORS(app)
+# 暴露 ETag 和 Retry-After，插件需要读取它们用于条件请求和限流后的等待
+CORS(app, expose_headers=['ETag', 'Retry-After'])
 
 # 初始化国际化
 i18n.init_app(app)
 
-# 移除缓存机制，每次都重新统计
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 静态页面启动时读入内存，带 ETag / Last-Modified
+static_pages = {name: CachedPage(os.path.join(BASE_DIR, name))
+                for name in ('index.html', 'test.html', 'mobile_test.html')}
+HAS_I18N_INDEX = os.path.exists(os.path.join(BASE_DIR, 'templates', 'index_i18n.html'))
+
+# 静态资源 URL 带内容哈希，可长期缓存
+asset_versions = AssetVersions(os.path.join(BASE_DIR, 'static'))
+app.jinja_env.globals['asset_url'] = asset_versions.url
+
+@app.after_request
+def add_asset_cache_headers(response):
+    return asset_versions.apply_cache_headers(request, response)
+
+# 启动时编译所有模板，请求中不再编译
+for template_name in app.jinja_env.list_templates():
+    app.jinja_env.get_template(template_name)
 
 # 配置
 TEMP_DIR = tempfile.gettempdir()
 REPOS_DIR = os.path.join(TEMP_DIR, 'github_stats_repos')
+CACHE_DIR = os.path.join(TEMP_DIR, 'github_stats_cache')
+MIRRORS_DIR = os.path.join(TEMP_DIR, 'github_stats_mirrors')
+
+# 统计结果按提交SHA缓存，同一提交不会重复统计
+result_cache = ResultCache(CACHE_DIR, analyzer_profile.id)
+# 单个文件按blob SHA缓存，历史趋势等增量计算复用
+blob_cache = BlobCache(os.path.join(CACHE_DIR, 'blobs.sqlite3'), analyzer_profile.id)
+# 热门仓库的 /api/stats 响应在每个 worker 内存中缓存序列化后的字节，命中时不再读盘和序列化
+response_cache = ResponseCache(int(os.environ.get('RESPONSE_CACHE_MB', 64)) * 1024 * 1024)
+# 共享的blobless镜像
+mirror_store = MirrorStore(MIRRORS_DIR)
+# 超过该时间仍未删除的克隆目录视为遗留（worker 崩溃等），直接清理（秒）
+CLONE_ORPHAN_SECONDS = 3600
+# 最近使用过的镜像可能仍在被历史趋势等读取，不淘汰（秒）
+MIRROR_MIN_IDLE_SECONDS = 600
+# 克隆、镜像和结果缓存的磁盘预算，超出时按最近使用淘汰，删除在后台进行
+disk_budget = DiskBudget.from_env([
+    DiskArea('clones', REPOS_DIR, child_dirs(), min_idle=CLONE_ORPHAN_SECONDS, max_idle=CLONE_ORPHAN_SECONDS),
+    DiskArea('mirrors', MIRRORS_DIR, child_dirs('.git'), min_idle=MIRROR_MIN_IDLE_SECONDS, guard=MirrorStore.try_lock),
+    DiskArea('results', CACHE_DIR, bucket_files('.json', companions=('.rows',)))
+], fixed_paths=[blob_cache.db_path, blob_cache.db_path + '-wal'])
+# 每个分析任务的资源上限（文件数、读取字节数、时间、内存）
+job_limits = JobLimits.from_env()
+# 每个客户端的令牌桶和冷分析并发名额，存放在 SQLite 中，所有 worker 共享
+rate_limiter = RateLimiter.from_env(os.path.join(CACHE_DIR, 'ratelimit.sqlite3'))
+# 批量任务、结果和节点心跳的任务库；多节点部署时 JOB_STORE_PATH 指向所有节点共享的路径
+job_store = JobStore(os.environ.get('JOB_STORE_PATH') or os.path.join(CACHE_DIR, 'jobs.sqlite3'))
+# 本节点（NODE_ID / NODE_URL）和在线节点的一致性哈希环，决定仓库由哪个节点处理
+cluster = Cluster.from_env(job_store)
+# 按 owner/repo 转发到负责该仓库的节点的接口（该节点持有镜像和缓存）
+ROUTED_ENDPOINTS = {'analyze_repository', 'get_repository_stats', 'stats_page', 'export_result',
+                    'get_history_trend', 'compare_snapshots'}
+# 只在有反向代理时信任 X-Forwarded-For，否则客户端可以伪造
+TRUST_PROXY = os.environ.get('TRUST_PROXY') in ('1', 'true')
 
-# 二进制文件扩展名和魔数标识
-BINARY_EXTENSIONS = {
-    '.exe', '.dll', '.so', '.dylib', '.a', '.lib', '.obj', '.o',
-    '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.ico', '.webp',
-    '.mp3', '.wav', '.flac', '.aac', '.ogg', '.mp4', '.avi', '.mkv', '.mov',
-    '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx',
-    '.zip', '.tar', '.gz', '.bz2', '.xz', '.7z', '.rar',
-    '.bin', '.dat', '.db', '.sqlite', '.sqlite3',
-    '.ttf', '.otf', '.woff', '.woff2', '.eot',
-    '.pyc', '.pyo', '.class', '.jar', '.war'
+# 令牌消耗：每个请求的基础消耗；结果未缓存、需要克隆统计时额外消耗冷分析的令牌
+COST_REQUEST = 1
+COST_COLD_ANALYSIS = 10
+# 各接口每个请求消耗的令牌，未列出的接口不限流；批量分析按仓库数在接口中扣除
+ENDPOINT_COSTS = {
+    'analyze_repository': COST_REQUEST,
+    'get_repository_stats': COST_REQUEST,
+    'stats_page': COST_REQUEST,
+    'export_result': COST_REQUEST,
+    'get_history_trend': COST_COLD_ANALYSIS,
+    'compare_snapshots': COST_COLD_ANALYSIS,
+    'analyze_archive': COST_COLD_ANALYSIS
 }
+# 冷分析并发名额已满时建议的重试间隔（秒）
+ACTIVE_RETRY_SECONDS = 10
 
-# 常见的二进制文件魔数
-BINARY_SIGNATURES = [
-    b'\x89PNG',  # PNG
-    b'\xff\xd8\xff',  # JPEG
-    b'GIF8',  # GIF
-    b'\x00\x00\x01\x00',  # ICO
-    b'BM',  # BMP
-    b'PK\x03\x04',  # ZIP
-    b'\x1f\x8b',  # GZIP
-    b'\x7fELF',  # ELF
-    b'MZ',  # Windows executable
-    b'\xca\xfe\xba\xbe',  # Java class
-    b'%PDF',  # PDF
-]
+# 管理员令牌，未设置时性能分析等管理功能不可用
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+# 按需性能分析的结果
+profile_store = profiling.ProfileStore(os.path.join(CACHE_DIR, 'profiles'))
 
 def ensure_repos_dir():
     """确保仓库目录存在"""
@@ -100,355 +177,417 @@ def clean_single_repo(repo_path):
     except Exception as e:
         print(f"Failed to clean single repo {repo_path}: {e}")
 
-def clone_repository(repo_url, target_dir):
-    """克隆仓库到指定目录"""
+def require_disk_space():
+    """新的克隆或镜像前检查可用空间，不足时等待后台清理，仍然不足抛出 RuntimeError"""
+    if not disk_budget.admit():
+        raise RuntimeError('服务器磁盘空间不足，请稍后再试')
+
+def store_stats(cache_key, stats):
+    """写入结果缓存（包括逐文件明细）"""
+    save_stats(result_cache, cache_key, stats)
+
+def result_id(owner, repo, sha, stats, variant=None):
+    """结果的导出ID（即缓存键），结果没有缓存时为 None"""
+    if not sha or not is_cacheable(stats):
+        return None
+    return ResultCache.make_key(owner, repo, sha, variant)
+
+def iter_result_rows(cache_key):
+    """缓存结果的逐文件明细行，结果不存在时返回 None
+
+    旧的缓存条目没有明细文件，从完整结果生成一次并补写
+    """
+    if not result_cache.has_rows(cache_key):
+        stats = result_cache.get(cache_key)
+        if stats is None:
+            return None
+        result_cache.put_rows(cache_key, export.FILE_COLUMNS, export.file_rows(stats))
+        if not result_cache.has_rows(cache_key):
+            return export.file_rows(stats)
+    rows = result_cache.iter_rows(cache_key)
+    next(rows, None)  # 列名
+    return rows
+
+def analyze_remote_repository(repo_url, owner, repo, sha=None, include_submodules=False, ref=None,
+                              allow_stale=True, use_cache=True):
+    """克隆并统计远程仓库，同一提交的结果从缓存读取
+
+    ref 为分支、标签或提交SHA，为空时统计默认分支；sha 为空时通过 ls-remote 获取。
+    include_submodules 时拉取子模块并合并到统计中。
+    allow_stale 时缓存中只有旧 profile 的结果则直接返回（带 stale 标记），并排队在后台重新统计。
+    use_cache 为 False 时不读取缓存，重新统计（性能分析时使用），结果仍写入缓存。
+    返回 (stats, sha, cached)，克隆失败时抛出 RuntimeError
+    """
+    if sha is None:
+        sha = resolve_remote_sha(repo_url, ref)
+    variant = 'submodules' if include_submodules else None
+    cache_key = ResultCache.make_key(owner, repo, sha, variant) if sha else None
+    if cache_key and use_cache:
+        stats = result_cache.get(cache_key)
+        if stats is not None:
+            print(f"命中缓存: {cache_key}")
+            return stats, sha, True
+        stats = result_cache.get_stale(cache_key) if allow_stale else None
+        if stats is not None:
+            print(f"返回过期结果并排队重新统计: {cache_key}")
+            stale_refresher.request(cache_key, repo_url, owner, repo, sha, include_submodules, ref)
+            stats['stale'] = True
+            return stats, sha, True
+    
+    if ref and sha is None:
+        # 引用不存在或无法访问仓库时不克隆、不拉取镜像
+        raise RuntimeError(f"无法解析引用: {ref}")
+    
+    require_disk_space()
+    # 不含子模块的结果单独缓存，包含子模块时也可以复用
+    base_key = ResultCache.make_key(owner, repo, sha) if sha else None
+    
+    # 每个任务使用独立目录，允许多个分析并发进行
+    ensure_repos_dir()
+    repo_dir = os.path.join(REPOS_DIR, f"{owner}_{repo}_{uuid.uuid4().hex[:8]}")
     try:
-        print(f"开始克隆仓库: {repo_url} -> {target_dir}")
-        import sys
-        sys.stdout.flush()
-        
-        # 设置环境变量确保Git可用
-        env = os.environ.copy()
-        if '/mingw64/bin' not in env.get('PATH', ''):
-            env['PATH'] = '/mingw64/bin:' + env.get('PATH', '')
-        
-        # 确保目标目录不存在
-        if os.path.exists(target_dir):
-            print(f"删除已存在的目录: {target_dir}")
-            shutil.rmtree(target_dir)
-        
-        # 创建父目录
-        parent_dir = os.path.dirname(target_dir)
-        print(f"创建父目录: {parent_dir}")
-        os.makedirs(parent_dir, exist_ok=True)
-        
-        # 简化Git检查 - 直接尝试使用git
-        git_cmd = 'git'
-        
-        print(f"当前PATH: {env.get('PATH', '无')}")
-        
-        try:
-            print(f"检查Git是否可用...")
-            git_version = subprocess.run([git_cmd, '--version'], 
-                                       capture_output=True, text=True, timeout=10,
-                                       env=env)
-            print(f"Git命令返回码: {git_version.returncode}")
-            
-            if git_version.returncode == 0:
-                print(f"Git版本: {git_version.stdout.strip()}")
-            else:
-                print(f"Git检查失败: {git_version.stderr}")
-                return False, f"Git检查失败: {git_version.stderr}"
-                
-        except Exception as e:
-            print(f"Git检查异常: {e}")
-            return False, f"Git检查异常: {str(e)}"
-        
-        # 使用浅克隆减少下载时间
-        cmd = [git_cmd, 'clone', '--depth', '1', repo_url, target_dir]
-        print(f"执行命令: {' '.join(cmd)}")
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300, 
-                              encoding='utf-8', errors='ignore', env=env)
-        
-        print(f"Git clone 返回码: {result.returncode}")
-        if result.stdout:
-            print(f"Git clone 标准输出: {result.stdout}")
-        if result.stderr:
-            print(f"Git clone 错误输出: {result.stderr}")
-        
-        if result.returncode == 0:
-            print(f"克隆成功，目录大小: {len(os.listdir(target_dir)) if os.path.exists(target_dir) else 0} 项")
-            return True, "克隆成功"
+        success, message = clone_repository(repo_url, repo_dir, ref)
+        if not success:
+            raise RuntimeError(message)
+        # 父仓库和子模块共用一个资源预算
+        budget = JobBudget(job_limits)
+        stats = result_cache.get(base_key) if include_submodules and base_key and use_cache else None
+        if stats is None:
+            # 子模块目录此时还是空的，不会被统计进父仓库
+            stats = analyze_repository_limited(repo_dir, tree_store=blob_cache, budget=budget)
+            if include_submodules and base_key and is_cacheable(stats):
+                store_stats(base_key, stats)
+        if include_submodules:
+            stats = add_submodules_to_stats(thaw_stats(stats), repo_dir, repo_url, budget)
+    finally:
+        # 删除在后台进行，不计入请求耗时
+        if os.path.exists(repo_dir):
+            disk_budget.discard(repo_dir)
+    
+    if cache_key and is_cacheable(stats):
+        store_stats(cache_key, stats)
+    return stats, sha, False
+
+def refresh_stale_result(repo_url, owner, repo, sha, include_submodules, ref):
+    """后台重新统计过期结果（其他 worker 已经更新时直接命中缓存）"""
+    analyze_remote_repository(repo_url, owner, repo, sha=sha, include_submodules=include_submodules,
+                              ref=ref, allow_stale=False)
+
+# 过期结果按请求次数在后台重新统计；线程启动时先清理旧 profile 的 blob 和子树条目
+stale_refresher = StaleRefresher(refresh_stale_result, on_start=blob_cache.purge_stale)
+
+def add_submodules_to_stats(stats, repo_dir, repo_url, budget):
+    """统计子模块并按其路径合并到父仓库的统计中
+
+    子模块结果按 (仓库, 提交) 缓存，只有缓存中没有的子模块才会并行浅拉取；
+    被父仓库排除规则覆盖的子模块（如 third_party/ 下的）不统计。
+    子模块与父仓库共用资源预算 budget，用完后其余子模块不再统计，整个结果标记为 truncated
+    """
+    try:
+        submodules = list_submodules(repo_dir, repo_url)
+    except RuntimeError as e:
+        print(f"读取子模块失败: {e}")
+        return stats
+    rules = ExclusionRules.for_repository(repo_dir)
+    submodules = [sub for sub in submodules if not rules.is_path_excluded(sub.path)]
+    if not submodules:
+        return stats
+    
+    results = {}
+    missing = []
+    # 资源预算用完后没有统计的子模块
+    skipped = set()
+    for sub in submodules:
+        sub_stats = result_cache.get(ResultCache.make_key(sub.owner, sub.repo, sub.sha))
+        if sub_stats is not None:
+            results[sub.path] = (sub_stats, True)
         else:
-            error_msg = result.stderr.strip() if result.stderr.strip() else "未知错误"
-            print(f"克隆失败: {error_msg}")
-            return False, f"克隆失败: {error_msg}"
-            
-    except subprocess.TimeoutExpired:
-        print("克隆超时")
-        return False, "克隆超时"
-    except Exception as e:
-        print(f"克隆异常: {str(e)}")
-        return False, f"克隆异常: {str(e)}"
+            missing.append(sub)
+    
+    if budget.exhausted:
+        skipped.update(sub.path for sub in missing)
+    elif missing:
+        print(f"拉取 {len(missing)} 个子模块（{len(submodules) - len(missing)} 个命中缓存）")
+        try:
+            fetch_submodules(repo_dir, [sub.path for sub in missing])
+        except RuntimeError as e:
+            # 部分子模块可能已经拉取成功，逐个检查
+            print(f"拉取子模块失败: {e}")
+        for sub in missing:
+            if budget.exhausted:
+                skipped.add(sub.path)
+                continue
+            sub_dir = os.path.join(repo_dir, sub.path)
+            if not os.path.exists(os.path.join(sub_dir, '.git')):
+                continue
+            sub_stats = analyze_repository_limited(sub_dir, tree_store=blob_cache, budget=budget)
+            # 截断的结果与父仓库用掉的预算有关，不作为子模块本身的结果缓存
+            if is_cacheable(sub_stats) and not sub_stats.get('truncated'):
+                store_stats(ResultCache.make_key(sub.owner, sub.repo, sub.sha), sub_stats)
+            results[sub.path] = (sub_stats, False)
+    
+    for sub in submodules:
+        summary = {'path': sub.path, 'url': sub.url, 'sha': sub.sha}
+        if sub.path not in results:
+            summary['error'] = '超出资源限制' if sub.path in skipped else '拉取失败'
+            stats['submodules'].append(summary)
+            continue
+        sub_stats, cached = results[sub.path]
+        for relative_path, file_info in sub_stats['file_stats'].items():
+            add_file_to_stats(stats, f"{sub.path}/{relative_path}", file_info)
+        for relative_path, pointer in sub_stats.get('lfs_files', {}).items():
+            stats['lfs_files'][f"{sub.path}/{relative_path}"] = pointer
+        summary.update({
+            'lines': sub_stats['total_lines'],
+            'files': sub_stats['total_files'],
+            'cached': cached,
+            'truncated': sub_stats.get('truncated')
+        })
+        stats['submodules'].append(summary)
+    
+    if budget.exhausted and not stats.get('truncated'):
+        stats['truncated'] = budget.truncation(budget.exhausted)
+    return finalize_stats(stats)
+
+def client_id():
+    """限流和调度使用的客户端标识：优先使用 X-API-Key（只保存哈希），否则使用 IP"""
+    api_key = request.headers.get('X-API-Key')
+    if api_key:
+        return 'key:' + hashlib.sha1(api_key.encode('utf-8')).hexdigest()[:16]
+    address = request.remote_addr or ''
+    if TRUST_PROXY:
+        address = request.headers.get('X-Forwarded-For', '').split(',')[0].strip() or address
+    return 'ip:' + address
+
+def too_many_requests(wait):
+    response = jsonify({'error': '请求过于频繁，请稍后再试', 'retryAfter': math.ceil(wait)})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(math.ceil(wait))
+    return response
 
-def is_text_file(file_path):
+def request_repository():
+    """当前请求针对的仓库 (owner, repo)，无法确定时返回 None；对比两个仓库时按 head"""
+    view_args = request.view_args or {}
+    if view_args.get('owner') and view_args.get('repo'):
+        return view_args['owner'], view_args['repo']
+    if request.endpoint == 'export_result':
+        match = re.match(r'([^/@]+)/([^/@]+)@', view_args.get('result_id', ''))
+        return match.groups() if match else None
+    data = request.args if request.method == 'GET' else request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return None
+    if request.endpoint == 'compare_snapshots':
+        head = parse_repo_entry(data.get('head'))
+        return (head['owner'], head['repo']) if head else None
+    owner, repo = data.get('owner'), data.get('repo')
+    return (owner, repo) if owner and repo else None
+
+@app.before_request
+def route_to_owner_node():
+    """启动本进程的批量执行线程和节点心跳；仓库由其他节点负责时 307 重定向过去（保留方法和请求体）
+
+    重定向地址带 routed=1，目标节点直接处理、不再转发（各节点的在线列表可能短暂不一致）。
+    在限流之前执行，转发的请求只在目标节点扣除令牌
     """
-    使用多种方法智能判断文件是否为文本文件
-    包括扩展名、魔数、字符编码等检测方法
+    batch_manager.start()
+    if request.endpoint not in ROUTED_ENDPOINTS or request.method == 'OPTIONS' or request.args.get('routed'):
+        return None
+    identity = request_repository()
+    target = cluster.route(*identity) if identity else None
+    if not target:
+        return None
+    query = request.args.to_dict(flat=False)
+    query['routed'] = ['1']
+    return redirect(f"{target}{request.path}?{urlencode(query, doseq=True)}", code=307)
+
+@app.before_request
+def limit_request_rate():
+    cost = ENDPOINT_COSTS.get(request.endpoint)
+    if not cost or request.method == 'OPTIONS':
+        return None
+    wait = rate_limiter.take(client_id(), cost)
+    return too_many_requests(wait) if wait else None
+
+@contextmanager
+def admit_analysis(cache_key):
+    """结果未缓存、需要克隆统计时额外扣除冷分析的令牌，并占用客户端的一个并发名额
+
+    产出 None 表示可以继续；否则产出应直接返回的 429 响应。结果已缓存时直接放行
     """
+    if cache_key and result_cache.contains(cache_key):
+        yield None
+        return
+    client = client_id()
+    wait = rate_limiter.take(client, COST_COLD_ANALYSIS)
+    if wait:
+        yield too_many_requests(wait)
+        return
+    slot = rate_limiter.acquire(client)
+    if slot is None:
+        print(f"冷分析并发已满: {client}")
+        yield too_many_requests(ACTIVE_RETRY_SECONDS)
+        return
     try:
-        print(f"[DEBUG] Checking file: {file_path}")
-        # 快速检查：文件大小限制
-        file_size = os.path.getsize(file_path)
-        if file_size == 0:  # 空文件
-            print(f"[DEBUG] {file_path}: Skipped - empty file")
-            return False
-        if file_size > 10 * 1024 * 1024:  # 超过10MB跳过
-            print(f"[DEBUG] {file_path}: Skipped - too large ({file_size} bytes)")
-            return False
-            
-        # 快速检查：扩展名黑名单
-        _, ext = os.path.splitext(file_path)
-        if ext.lower() in BINARY_EXTENSIONS:
-            print(f"[DEBUG] {file_path}: Skipped - binary extension ({ext})")
-            return False
-        
-        # 读取文件内容进行深度检测
-        sample_size = min(8192, file_size)  # 读取8KB或整个文件
-        with open(file_path, 'rb') as f:
-            chunk = f.read(sample_size)
-            
-            # 1. 检查二进制文件魔数标识
-            for signature in BINARY_SIGNATURES:
-                if chunk.startswith(signature):
-                    return False
-            
-            # 2. 检查NULL字节（二进制文件的明显特征）
-            null_count = chunk.count(b'\x00')
-            if null_count > 0:
-                # 允许少量NULL字节（有些文本文件可能包含）
-                null_ratio = null_count / len(chunk)
-                if null_ratio > 0.01:  # 超过1%的NULL字节就认为是二进制
-                    return False
-            
-            # 3. 检查不可打印控制字符（除了常见的换行符等）
-            control_chars = 0
-            printable_controls = {0x09, 0x0A, 0x0D}  # Tab, LF, CR
-            for byte in chunk:
-                if byte < 32 and byte not in printable_controls:
-                    control_chars += 1
-            
-            if len(chunk) > 0 and control_chars / len(chunk) > 0.02:  # 超过2%控制字符
-                return False
-            
-            # 4. 尝试使用常见编码解码文件
-            text_encodings = ['utf-8', 'gbk', 'gb2312', 'latin-1', 'cp1252']
-            decoded_successfully = False
-            
-            for encoding in text_encodings:
-                try:
-                    decoded_text = chunk.decode(encoding)
-                    
-                    # 检查解码后的文本质量
-                    if _is_reasonable_text(decoded_text):
-                        decoded_successfully = True
-                        break
-                        
-                except (UnicodeDecodeError, UnicodeError):
-                    continue
-            
-            result = decoded_successfully
-            print(f"[DEBUG] {file_path}: Final result = {result}")
-            return result
-            
-    except Exception as e:
-        print(f"[DEBUG] {file_path}: Exception occurred - {e}")
-        return False
+        yield None
+    finally:
+        rate_limiter.release(slot)
+
+def is_admin():
+    """请求带有正确的管理员令牌（只接受请求头 X-Admin-Token，URL 参数会出现在访问日志和浏览器历史中）"""
+    token = request.headers.get('X-Admin-Token') or ''
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8'))
 
-def _is_reasonable_text(text):
+def profiled(view):
+    """管理员请求带上 X-Profile: cprofile|sample（或参数 profile）时，在分析器下执行该请求
+
+    分析时不读取缓存，重新克隆和统计；响应头 X-Profile-Id 为分析结果的ID，通过 /api/profiles/<id> 下载
     """
-    检查解码后的文本是否合理
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        mode = request.headers.get('X-Profile') or request.args.get('profile')
+        if mode not in profiling.PROFILE_MODES or not is_admin():
+            return view(*args, **kwargs)
+        data = request.get_json(silent=True) or {}
+        label = f"{request.method} {request.path} {data.get('repoUrl') or data.get('repo_url') or ''}"
+        with profiling.session(mode, profile_store, label) as session:
+            response = make_response(view(*args, **kwargs))
+        response.headers['X-Profile-Id'] = session.profile_id
+        return response
+    return wrapper
+
+def stats_etag(sha, *variants):
+    """统计结果的 ETag：同一提交、同一统计版本的结果不变，variants 区分同一提交的不同响应"""
+    return '-'.join([sha, analyzer_profile.id] + [v for v in variants if v])
+
+def not_modified(etag):
+    """客户端 If-None-Match 与当前 ETag 一致时返回 304 响应，否则返回 None"""
+    if etag and request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+def cached_json_response(entry):
+    """由缓存的序列化字节直接构造 JSON 响应，客户端支持时返回预先压缩的内容"""
+    if 'gzip' in request.accept_encodings:
+        response = Response(entry.gzipped, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(entry.body, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    return response
+
+def build_folder_listing(stats):
+    """按目录分组文件和子目录，并按名称排序，供统计页面直接渲染
+
+    返回 {目录: {'d': [[名称, 行数, 占比, 文件数]], 'f': [[名称, 行数, 占比]]}}，根目录为 ''
     """
-    if not text:
-        return False
+    listing = defaultdict(lambda: {'d': [], 'f': []})
     
-    # 检查文本中可打印字符的比例
-    printable_chars = 0
-    for char in text:
-        # 字母、数字、标点、空格、换行符等
-        if char.isprintable() or char in '\t\n\r\f\v':
-            printable_chars += 1
+    for folder_path, folder_info in stats['folder_stats'].items():
+        if folder_path == '.':
+            continue
+        parent, _, name = folder_path.rpartition('/')
+        listing[parent]['d'].append([name, folder_info['lines'],
+                                     round(folder_info.get('percentage', 0), 2), folder_info['files']])
     
-    printable_ratio = printable_chars / len(text)
+    for file_path, file_info in stats['file_stats'].items():
+        parent, _, name = file_path.rpartition('/')
+        listing[parent]['f'].append([name, file_info['lines'], round(file_info.get('percentage', 0), 2)])
     
-    # 要求至少85%的字符是可打印的
-    return printable_ratio >= 0.85
+    for entry in listing.values():
+        entry['d'].sort(key=lambda item: item[0].lower())
+        entry['f'].sort(key=lambda item: item[0].lower())
+    return dict(listing)
 
-def count_lines_in_file(file_path):
-    """统计单个文件的行数"""
-    try:
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            return len(f.readlines())
-    except:
-        try:
-            with open(file_path, 'r', encoding='gbk', errors='ignore') as f:
-                return len(f.readlines())
-        except:
-            try:
-                with open(file_path, 'r', encoding='latin-1', errors='ignore') as f:
-                    return len(f.readlines())
-            except:
-                return 0
-
-def analyze_repository_stats(repo_path):
-    """分析仓库结构和代码行数"""
-    stats = {
-        'total_lines': 0,
-        'total_files': 0,
-        'file_stats': {},
-        'folder_stats': {},
-        'file_type_stats': defaultdict(int)
-    }
-    
-    for root, dirs, files in os.walk(repo_path):
-        # 跳过 .git 目录和常见的非代码目录，但保留其他隐藏目录
-        dirs[:] = [d for d in dirs if d != '.git' and 
-                  d not in ['node_modules', '__pycache__', 'build', 'dist', 'target']]
-        
-        for file in files:
-            file_path = os.path.join(root, file)
-            relative_path = os.path.relpath(file_path, repo_path).replace('\\', '/')
-            
-            # 不再跳过隐藏文件，允许统计 .开头的文件
-            
-            # 只统计文本文件
-            if is_text_file(file_path):
-                lines = count_lines_in_file(file_path)
-                if lines > 0:  # 只统计非空文件
-                    stats['total_lines'] += lines
-                    stats['total_files'] += 1
-                    
-                    # 获取文件扩展名用于分类显示
-                    _, ext = os.path.splitext(file)
-                    file_type = ext if ext else '无扩展名'
-                    
-                    # 记录文件统计
-                    stats['file_stats'][relative_path] = {
-                        'lines': lines,
-                        'file_type': file_type,
-                        'size': os.path.getsize(file_path) if os.path.exists(file_path) else 0
-                    }
-                    
-                    # 文件类型统计（用于显示分布）
-                    stats['file_type_stats'][file_type] += lines
-                    
-                    # 文件夹统计 - 累加到所有父级文件夹
-                    folder = os.path.dirname(relative_path) or '.'
-                    
-                    # 创建所有父级文件夹的路径列表
-                    folder_paths = []
-                    current_path = folder
-                    while current_path and current_path != '.':
-                        folder_paths.append(current_path)
-                        parent = os.path.dirname(current_path)
-                        if parent == current_path:  # 到达根目录
-                            break
-                        current_path = parent
-                    
-                    # 添加根目录
-                    folder_paths.append('.')
-                    
-                    # 将文件统计累加到所有父级文件夹
-                    for folder_path in folder_paths:
-                        if folder_path not in stats['folder_stats']:
-                            stats['folder_stats'][folder_path] = {'lines': 0, 'files': 0}
-                        stats['folder_stats'][folder_path]['lines'] += lines
-                        stats['folder_stats'][folder_path]['files'] += 1
+def requested_ref(args, repo_url):
+    """请求中的引用，返回 (引用, 错误信息)
+
+    ref 为准确的分支、标签或提交SHA；refPath 为插件发送的页面路径（tree/ 或 blob/ 之后的全部内容），
+    分支名可能含 /，由服务器从中找出最长的已有分支或标签。两者都为空时统计默认分支
+    """
+    ref = args.get('ref') or None
+    ref_path = args.get('refPath') or None
+    if ref is None and ref_path:
+        ref = resolve_ref_path(repo_url, ref_path)
+        if ref is None:
+            return None, '引用不存在'
+    if ref and not is_valid_ref(ref):
+        return None, '无效的引用'
+    return ref, None
+
+def _admit_batch_job(client, repo_info):
+    """批量任务执行前扣除令牌，返回需要等待的秒数：与单个请求相同，
+    结果已缓存时只扣请求的令牌，需要克隆统计时再加上冷分析的令牌。解析出的提交SHA记入 repo_info"""
+    sha = resolve_remote_sha(repo_info['repoUrl'], repo_info.get('ref'))
+    repo_info['sha'] = sha
+    cache_key = ResultCache.make_key(repo_info['owner'], repo_info['repo'], sha) if sha else None
+    cost = COST_REQUEST if cache_key and result_cache.contains(cache_key) else COST_REQUEST + COST_COLD_ANALYSIS
+    return rate_limiter.take(client, cost)
+
+def _analyze_for_batch(repo_info):
+    """批量分析中的单个仓库"""
+    owner = repo_info['owner']
+    repo = repo_info['repo']
+    stats, sha, cached = analyze_remote_repository(repo_info['repoUrl'], owner, repo, sha=repo_info.get('sha'),
+                                                   ref=repo_info.get('ref'))
+    result = summarize_stats(stats)
+    result.update({
+        'sha': sha,
+        'resultId': result_id(owner, repo, sha, stats),
+        'cached': cached,
+        'languages': sort_languages(stats['language_stats'])
+    })
+    return result
+
+batch_manager = BatchManager(_analyze_for_batch, job_store, cluster,
+                             max_workers=int(os.environ.get('BATCH_MAX_WORKERS', 4)),
+                             admit_func=_admit_batch_job)
+
+history_analyzer = HistoryAnalyzer(mirror_store, blob_cache, analyze_file_content,
+                                   lambda file_name: not is_binary_name(file_name),
+                                   max_blob_size=MAX_TEXT_FILE_SIZE)
+
+def run_mirror_limited(func, *args):
+    """在资源受限的子进程中执行镜像上的统计 func(*args, budget=...)（历史趋势、同仓库对比），
+    与 /api/stats 使用相同的 job_limits。返回 (结果, truncated)，未超出限制时 truncated 为 None；
+    子进程被终止（内存、CPU 时间）时没有结果，返回 (None, truncated)
+    """
+    budget = JobBudget(job_limits)
     
-    # 计算百分比
-    if stats['total_lines'] > 0:
-        for file_path, file_info in stats['file_stats'].items():
-            file_info['percentage'] = (file_info['lines'] / stats['total_lines']) * 100
-        
-        for folder_path, folder_info in stats['folder_stats'].items():
-            folder_info['percentage'] = (folder_info['lines'] / stats['total_lines']) * 100
+    def run_in_child(*child_args):
+        result = func(*child_args, budget=budget)
+        return result, budget.truncation(budget.exhausted) if budget.exhausted else None
     
-    return stats
-
-def convert_file_types_to_languages(file_type_stats):
-    """将文件扩展名统计转换为编程语言统计"""
-    language_mapping = {
-        '.py': 'Python',
-        '.js': 'JavaScript',
-        '.ts': 'TypeScript',
-        '.jsx': 'React JSX',
-        '.tsx': 'React TSX',
-        '.java': 'Java',
-        '.c': 'C',
-        '.cpp': 'C++',
-        '.cc': 'C++',
-        '.cxx': 'C++',
-        '.h': 'C/C++ Header',
-        '.hpp': 'C++ Header',
-        '.cs': 'C#',
-        '.php': 'PHP',
-        '.rb': 'Ruby',
-        '.go': 'Go',
-        '.rs': 'Rust',
-        '.swift': 'Swift',
-        '.kt': 'Kotlin',
-        '.scala': 'Scala',
-        '.html': 'HTML',
-        '.htm': 'HTML',
-        '.css': 'CSS',
-        '.scss': 'SCSS',
-        '.sass': 'Sass',
-        '.less': 'Less',
-        '.vue': 'Vue',
-        '.xml': 'XML',
-        '.json': 'JSON',
-        '.yml': 'YAML',
-        '.yaml': 'YAML',
-        '.toml': 'TOML',
-        '.ini': 'INI',
-        '.cfg': 'Config',
-        '.conf': 'Config',
-        '.sh': 'Shell',
-        '.bash': 'Bash',
-        '.ps1': 'PowerShell',
-        '.sql': 'SQL',
-        '.r': 'R',
-        '.R': 'R',
-        '.m': 'Objective-C/MATLAB',
-        '.pl': 'Perl',
-        '.lua': 'Lua',
-        '.dart': 'Dart',
-        '.elm': 'Elm',
-        '.ex': 'Elixir',
-        '.exs': 'Elixir',
-        '.clj': 'Clojure',
-        '.hs': 'Haskell',
-        '.fs': 'F#',
-        '.ml': 'OCaml',
-        '.jl': 'Julia',
-        '.nim': 'Nim',
-        '.zig': 'Zig',
-        '.md': 'Markdown',
-        '.txt': 'Text',
-        '.log': 'Log',
-        '.gitignore': 'Git',
-        '.dockerignore': 'Docker',
-        '.dockerfile': 'Docker',
-        '无扩展名': 'Unknown'
-    }
+    def on_memory_error():
+        return None, budget.truncation('memory')
     
-    languages = {}
-    for ext, lines in file_type_stats.items():
-        language = language_mapping.get(ext, f"Other ({ext})")
-        if language in languages:
-            languages[language] += lines
-        else:
-            languages[language] = lines
+    def on_killed(reason, progress):
+        return None, budget.truncation(reason)
     
-    # 按行数排序
-    return dict(sorted(languages.items(), key=lambda x: x[1], reverse=True))
+    return run_limited(run_in_child, args, budget.remaining_limits(), on_memory_error, on_killed)
 
 @app.route('/health')
 def health_check():
     """健康检查接口"""
-    return jsonify({'status': 'ok', 'message': 'GitHub Stats Server is running'})
+    return jsonify({'status': 'ok', 'message': 'GitHub Stats Server is running',
+                    'responseCache': response_cache.stats(),
+                    'batchQueue': batch_manager.queued(),
+                    'cluster': cluster.stats(),
+                    'disk': disk_budget.stats(),
+                    'analyzer': dict(analyzer_profile.describe(), refresh=stale_refresher.stats())})
 
 @app.route('/reload-translations')
 def reload_translations():
-    """重新加载翻译文件"""
+    """重新加载翻译文件（所有 worker 都会在下一个请求时重新加载）"""
     try:
-        i18n.load_translations()
+        i18n.reload_all_workers()
         return jsonify({'status': 'ok', 'message': 'Translations reloaded successfully'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 @app.route('/analyze', methods=['POST'])
+@profiled
 def analyze_repository():
     """分析仓库接口 - 适配新的前端格式"""
     try:
@@ -464,56 +603,70 @@ def analyze_repository():
         
         if not repo_url or not owner or not repo:
             return jsonify({'error': i18n.t('error_invalid_url')}), 400
+        include_submodules = bool(data.get('submodules'))
+        ref, ref_error = requested_ref(data, repo_url)
+        if ref_error:
+            return jsonify({'error': ref_error}), 400
         
         # 生成任务ID
         task_id = f"{owner}_{repo}_{int(time.time())}"
         
-        # 调用现有的分析逻辑，构造和 /api/stats 相同的数据格式
-        analyze_data = {
-            'repoUrl': repo_url,
-            'owner': owner,
-            'repo': repo
-        }
-        
         # 使用更简单的方式：直接在当前请求中处理，但设置超时
         try:
-            # 清理旧仓库（更温和的方式）
-            print("开始清理旧仓库...")
-            clean_all_repos()
-            ensure_repos_dir()
+            # 响应中的提示信息随语言变化，ETag 中包含语言
+            sha = resolve_remote_sha(repo_url, ref)
+            etag = stats_etag(sha, i18n.get_locale(), include_submodules and 'submodules') if sha else None
+            unchanged = None if profiling.active() else not_modified(etag)
+            if unchanged is not None:
+                print(f"未变化: {owner}/{repo}@{sha}")
+                return unchanged
             
-            # 构建目标目录
-            target_dir = os.path.join(REPOS_DIR, f"{owner}_{repo}")
-            
-            print(f"准备克隆到: {target_dir}")
-            
-            # 克隆仓库
-            success = clone_repository(repo_url, target_dir)
-            if not success:
-                print(f"克隆仓库失败: {repo_url}")
-                return jsonify({'error': i18n.t('error_repo_not_found')}), 404
-            
-            print("克隆成功，开始分析...")
+            # 克隆并统计（同一提交命中缓存时不再克隆）
+            cache_key = ResultCache.make_key(owner, repo, sha, include_submodules and 'submodules' or None) if sha else None
+            with admit_analysis(cache_key) as limited:
+                if limited is not None:
+                    return limited
+                try:
+                    stats, sha, cached = analyze_remote_repository(repo_url, owner, repo, sha=sha,
+                                                                   include_submodules=include_submodules, ref=ref,
+                                                                   use_cache=not profiling.active())
+                except RuntimeError as e:
+                    print(f"克隆仓库失败: {repo_url} - {e}")
+                    return jsonify({'error': i18n.t('error_repo_not_found')}), 404
             
-            # 统计代码
-            stats = analyze_repository_stats(target_dir)
-            print(f"统计完成: {stats}")
+            print(f"统计完成: {stats['total_lines']} 行, {stats['total_files']} 个文件 (cached={cached})")
             
-            # 生成语言统计（从文件类型统计转换）
-            languages = convert_file_types_to_languages(stats['file_type_stats'])
+            # 语言统计已在遍历时累加，这里只排序
+            languages = sort_languages(stats['language_stats'])
             
             # 直接返回结果，包含完整数据
-            return jsonify({
+            response = jsonify({
                 'task_id': task_id,
                 'ready': True,
                 'totalLines': stats['total_lines'],
                 'totalFiles': stats['total_files'],
+                'codeLines': stats['code_lines'],
+                'commentLines': stats['comment_lines'],
+                'blankLines': stats['blank_lines'],
                 'languages': languages,
+                'languageLineStats': stats['language_line_stats'],
                 'fileStats': stats['file_stats'],
                 'folderStats': stats['folder_stats'],
                 'fileTypeStats': dict(stats['file_type_stats']),
+                'lfsFiles': stats.get('lfs_files', {}),
+                'submodules': stats.get('submodules', []),
+                'truncated': stats.get('truncated'),
+                'stale': bool(stats.get('stale')),
+                'slowestFiles': stats.get('slowest_files', []),
+                'ref': ref,
+                'sha': sha,
+                'resultId': result_id(owner, repo, sha, stats, include_submodules and 'submodules' or None),
+                'cached': cached,
                 'message': i18n.t('analysis_complete')
             })
+            if etag and is_cacheable(stats):
+                response.set_etag(etag)
+            return response
             
         except Exception as e:
             print(f"分析过程出错: {e}")
@@ -523,37 +676,74 @@ def analyze_repository():
         print(f"分析请求处理错误: {e}")
         return jsonify({'error': i18n.t('error_analysis_failed')}), 500
 
+@app.route('/api/analyze-archive', methods=['POST'])
+def analyze_archive():
+    """统计上传的压缩包（.tar.gz/.tgz/.tar/.zip），不需要git克隆
+
+    支持 multipart 表单字段 file，或直接以请求体上传（通过 ?format= 或 Content-Type 指定格式）
+    """
+    upload = request.files.get('file')
+    if upload is not None:
+        stream = upload.stream
+        file_name = upload.filename
+        content_type = upload.mimetype
+    else:
+        stream = request.stream
+        file_name = request.args.get('filename')
+        content_type = request.mimetype
+    
+    archive_format = archive.detect_format(file_name, content_type, request.args.get('format'))
+    if archive_format is None:
+        return jsonify({'error': '无法识别压缩包格式，请使用 .tar.gz 或 .zip'}), 400
+    
+    try:
+        started = time.time()
+        stats = analyze_archive_stream(stream, archive_format)
+        print(f"压缩包统计完成: {stats['total_lines']} 行, {stats['total_files']} 个文件, 耗时 {time.time() - started:.1f}s")
+    except archive.ArchiveLimitError as e:
+        return jsonify({'error': str(e)}), 413
+    except (tarfile.TarError, zipfile.BadZipFile, EOFError, OSError) as e:
+        print(f"压缩包读取失败: {e}")
+        return jsonify({'error': f'压缩包读取失败: {e}'}), 400
+    
+    return jsonify({
+        'ready': True,
+        'totalLines': stats['total_lines'],
+        'totalFiles': stats['total_files'],
+        'codeLines': stats['code_lines'],
+        'commentLines': stats['comment_lines'],
+        'blankLines': stats['blank_lines'],
+        'languages': sort_languages(stats['language_stats']),
+        'languageLineStats': stats['language_line_stats'],
+        'fileStats': stats['file_stats'],
+        'folderStats': stats['folder_stats'],
+        'fileTypeStats': dict(stats['file_type_stats']),
+        'message': i18n.t('analysis_complete')
+    })
+
 @app.route('/')
 def index():
     """主页"""
-    # 检查是否存在国际化模板
-    template_path = os.path.join(os.path.dirname(__file__), 'templates', 'index_i18n.html')
-    if os.path.exists(template_path):
-        # 使用国际化模板
-        from flask import render_template
+    if HAS_I18N_INDEX:
+        # 使用国际化模板（启动时已编译）
         return render_template('index_i18n.html')
-    else:
-        # 回退到原始index.html
-        with open(os.path.join(os.path.dirname(__file__), 'index.html'), 'r', encoding='utf-8') as f:
-            return f.read()
+    # 回退到原始index.html
+    return static_pages['index.html'].response(request)
 
 @app.route('/test.html')
 def test_page():
     """测试页面"""
-    import os
-    with open(os.path.join(os.path.dirname(__file__), 'test.html'), 'r', encoding='utf-8') as f:
-        return f.read()
+    return static_pages['test.html'].response(request)
 
 @app.route('/mobile_test.html')
 def mobile_test_page():
     """移动端优化测试页面"""
-    import os
-    with open(os.path.join(os.path.dirname(__file__), 'mobile_test.html'), 'r', encoding='utf-8') as f:
-        return f.read()
+    return static_pages['mobile_test.html'].response(request)
 
 @app.route('/api/stats', methods=['POST'])
+@profiled
 def get_repository_stats():
-    """获取仓库统计信息 - 每次都重新统计"""
+    """获取仓库统计信息 - 按提交SHA缓存"""
     print("=== API /api/stats 被调用 ===")
     
     try:
@@ -574,46 +764,60 @@ def get_repository_stats():
             print("错误: 缺少仓库信息")
             return jsonify({'error': '缺少仓库信息'}), 400
         
-        print("开始处理仓库统计...")
-        
-        # 每次都清理所有旧仓库
-        print("清理旧仓库...")
-        clean_all_repos()
-        ensure_repos_dir()
-        
-        # 创建临时目录
-        repo_dir = os.path.join(REPOS_DIR, f"{owner}_{repo}_{int(time.time())}")
-        print(f"临时目录: {repo_dir}")
-        
-        # 克隆仓库
-        print("开始克隆仓库...")
-        success, message = clone_repository(repo_url, repo_dir)
-        if not success:
-            print(f"克隆失败: {message}")
-            return jsonify({'error': f'克隆失败: {message}'}), 500
+        # 可选：拉取子模块并合并统计
+        variant = 'submodules' if data.get('submodules') else None
+        ref, ref_error = requested_ref(data, repo_url)
+        if ref_error:
+            return jsonify({'error': ref_error}), 400
         
-        # 分析代码
-        print("开始分析代码...")
-        stats = analyze_repository_stats(repo_dir)
-        print(f"分析完成: {stats['total_lines']} 行代码, {stats['total_files']} 个文件")
+        print("开始处理仓库统计...")
+        sha = resolve_remote_sha(repo_url, ref)
+        cache_key = ResultCache.make_key(owner, repo, sha, variant) if sha else None
+        # 响应中带有请求的引用名，不同引用指向同一提交时响应也不同
+        response_key = f"{cache_key}#{ref or ''}" if cache_key else None
+        etag = stats_etag(sha, variant) if sha else None
+        # 客户端已有该提交的结果：只做了一次 ls-remote（性能分析时总是重新统计）
+        unchanged = None if profiling.active() else not_modified(etag)
+        if unchanged is not None:
+            print(f"未变化: {cache_key}")
+            return unchanged
+        if response_key and not profiling.active():
+            entry = response_cache.get(response_key)
+            if entry is not None:
+                print(f"命中内存缓存: {response_key}")
+                response = cached_json_response(entry)
+                response.set_etag(etag)
+                return response
         
-        # 立即清理临时文件
-        if os.path.exists(repo_dir):
+        with admit_analysis(cache_key) as limited:
+            if limited is not None:
+                return limited
             try:
-                print("清理临时文件...")
-                shutil.rmtree(repo_dir)
-            except Exception as cleanup_e:
-                print(f"清理临时文件失败: {cleanup_e}")
+                stats, sha, cached = analyze_remote_repository(repo_url, owner, repo, sha=sha,
+                                                               include_submodules=bool(variant), ref=ref,
+                                                               use_cache=not profiling.active())
+            except RuntimeError as e:
+                print(f"克隆失败: {e}")
+                return jsonify({'error': f'克隆失败: {e}'}), 500
+        print(f"分析完成: {stats['total_lines']} 行代码, {stats['total_files']} 个文件")
         
         # 返回统计结果
-        result = {
-            'totalLines': stats['total_lines'],
-            'totalFiles': stats['total_files'],
+        result = summarize_stats(stats)
+        result.update({
+            'ref': ref,
+            'sha': sha,
+            'resultId': result_id(owner, repo, sha, stats, variant),
             'processing': False,
-            'cached': False
-        }
+            'cached': cached
+        })
         print(f"返回结果: {result}")
-        return jsonify(result)
+        response = jsonify(result)
+        if cache_key and is_cacheable(stats):
+            # 之后的命中都来自缓存，缓存的响应标记为 cached
+            response_cache.put(response_key, json.dumps(dict(result, cached=True), separators=(',', ':')).encode('utf-8'),
+                               slot=f"{owner}/{repo}:{ref or ''}+{variant or ''}")
+            response.set_etag(etag)
+        return response
         
     except Exception as e:
         print(f"统计异常: {str(e)}")
@@ -626,9 +830,250 @@ def get_stats_status(owner, repo):
     """检查统计状态 - 不再使用缓存"""
     return jsonify({'ready': False, 'message': '请直接调用 /api/stats 接口获取最新统计'})
 
+def parse_repo_entry(entry):
+    """解析批量请求中的单个仓库：支持URL字符串或 {repoUrl, owner, repo} 字典"""
+    if isinstance(entry, str):
+        entry = {'repoUrl': entry}
+    if not isinstance(entry, dict) or not entry.get('repoUrl'):
+        return None
+    repo_url = entry['repoUrl']
+    owner = entry.get('owner')
+    repo = entry.get('repo')
+    if not owner or not repo:
+        match = re.search(r'github\.com[/:]([^/]+)/([^/?#]+?)(?:\.git)?/?$', repo_url)
+        if not match:
+            return None
+        owner, repo = match.group(1), match.group(2)
+    ref = entry.get('ref') or None
+    if ref and not is_valid_ref(ref):
+        return None
+    return {'repoUrl': repo_url, 'owner': owner, 'repo': repo, 'ref': ref}
+
+@app.route('/api/batch', methods=['POST'])
+def create_batch():
+    """提交批量分析任务，返回批次ID"""
+    data = request.get_json(silent=True) or {}
+    entries = data.get('repos')
+    if not isinstance(entries, list) or not entries:
+        return jsonify({'error': '缺少仓库列表'}), 400
+    if len(entries) > MAX_BATCH_SIZE:
+        return jsonify({'error': f"单批最多 {MAX_BATCH_SIZE} 个仓库"}), 400
+    
+    repos = []
+    for entry in entries:
+        parsed = parse_repo_entry(entry)
+        if parsed is None:
+            return jsonify({'error': f'无效的仓库: {entry}'}), 400
+        repos.append(parsed)
+    
+    # 提交只扣一次请求的令牌；每个仓库在执行前按是否命中缓存扣除（_admit_batch_job），
+    # 排队后由公平调度按客户端轮流执行
+    client = client_id()
+    wait = rate_limiter.take(client, COST_REQUEST)
+    if wait:
+        return too_many_requests(wait)
+    try:
+        batch_id = batch_manager.submit(repos, client=client)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    print(f"批量任务已提交: {batch_id} ({len(repos)} 个仓库)")
+    return jsonify({'batchId': batch_id, 'total': len(repos)}), 202
+
+@app.route('/api/batch/<batch_id>')
+def get_batch_status(batch_id):
+    """查询批量任务进度"""
+    batch = batch_manager.get(batch_id)
+    if batch is None:
+        return jsonify({'error': '批次不存在'}), 404
+    return jsonify(batch.summary())
+
+@app.route('/api/batch/<batch_id>/results')
+def stream_batch_results(batch_id):
+    """以NDJSON格式按完成顺序流式返回每个仓库的结果
+
+    每行带有结果的序号 seq；一次请求最长 STREAM_SECONDS 秒（小于 worker 超时），
+    批次未完成时最后一行为 {"status": "pending", "after": 序号}，客户端带 ?after=序号 继续读取
+    """
+    batch = batch_manager.get(batch_id)
+    if batch is None:
+        return jsonify({'error': '批次不存在'}), 404
+    after = request.args.get('after', 0, type=int)
+    
+    def generate():
+        seq = after
+        for seq, result in batch.iter_results(after, STREAM_SECONDS):
+            yield json.dumps(dict(result, seq=seq), ensure_ascii=False) + '\n'
+        if not batch.summary()['done']:
+            yield json.dumps({'status': 'pending', 'after': seq}) + '\n'
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+def batch_export_rows(batch):
+    """批次中每个仓库的逐文件明细依次拼接，按完成顺序产出（只在批次完成后导出）"""
+    for _, result in batch.iter_results(max_seconds=0):
+        rows = iter_result_rows(result['resultId']) if result.get('resultId') else None
+        if rows is None:
+            continue
+        prefix = [result['owner'], result['repo'], result['sha']]
+        for row in rows:
+            yield prefix + row
+
+@app.route('/api/results/<path:result_id>/export')
+def export_result(result_id):
+    """流式导出单个结果（resultId）或整个批次（batchId）的逐文件明细
+
+    format 为 csv、jsonl 或 columnar（按行组分列的 JSON Lines），默认 csv
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in export.FORMATS:
+        return jsonify({'error': f'不支持的格式: {export_format}'}), 400
+    
+    batch = batch_manager.get(result_id)
+    if batch is not None:
+        # 等待未完成的仓库会超过 worker 超时，批次完成后再导出
+        summary = batch.summary()
+        if not summary['done']:
+            return jsonify(dict(summary, error='批次尚未完成')), 409
+        columns = ['owner', 'repo', 'sha'] + export.FILE_COLUMNS
+        rows = batch_export_rows(batch)
+        file_name = f"batch-{result_id}"
+    else:
+        columns = export.FILE_COLUMNS
+        rows = iter_result_rows(result_id)
+        if rows is None:
+            return jsonify({'error': '结果不存在'}), 404
+        file_name = re.sub(r'[^\w.+-]+', '_', result_id)
+    
+    mimetype, extension = export.FORMATS[export_format]
+    return Response(export.stream(export_format, columns, rows), content_type=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{file_name}.{extension}"'})
+
+@app.route('/api/profiles/<profile_id>')
+def download_profile(profile_id):
+    """下载性能分析结果（需要管理员令牌）
+
+    format 为 txt（文本报告，默认）、prof（cProfile 原始数据，可用 pstats / snakeviz 打开）或 folded（采样的折叠栈）
+    """
+    if not is_admin():
+        return jsonify({'error': '需要管理员令牌'}), 403
+    file_format = request.args.get('format', 'txt')
+    if file_format not in ('txt', 'prof', 'folded'):
+        return jsonify({'error': f'不支持的格式: {file_format}'}), 400
+    path = profile_store.find(profile_id, file_format)
+    if path is None:
+        return jsonify({'error': '分析结果不存在'}), 404
+    if file_format == 'txt':
+        return send_file(path, mimetype='text/plain; charset=utf-8')
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f"{profile_id}.{file_format}")
+
+@app.route('/api/history/<owner>/<repo>')
+def get_history_trend(owner, repo):
+    """历史统计趋势：均匀采样 points 个提交，增量计算每个提交的统计"""
+    repo_url = request.args.get('repo_url') or f"https://github.com/{owner}/{repo}.git"
+    try:
+        points = int(request.args.get('points', 20))
+    except ValueError:
+        return jsonify({'error': 'points 必须是整数'}), 400
+    if points < 1:
+        return jsonify({'error': 'points 必须大于0'}), 400
+    
+    try:
+        require_disk_space()
+        mirror = mirror_store.ensure(repo_url, owner, repo)
+        head_sha = mirror_store.rev_parse(mirror)
+        cache_key = f"history:{ResultCache.make_key(owner, repo, head_sha)}:{points}"
+        trend = result_cache.get(cache_key)
+        cached = trend is not None
+        truncated = None
+        if not cached:
+            started = time.time()
+            trend, truncated = run_mirror_limited(history_analyzer.trend, repo_url, owner, repo, points)
+            if trend is None:
+                return jsonify({'error': f"超出资源限制: {truncated['reason']}", 'truncated': truncated}), 413
+            print(f"历史趋势计算完成: {owner}/{repo} {len(trend)} 个采样点, 耗时 {time.time() - started:.1f}s")
+            # 超出限制时只有前面一部分采样点，不缓存
+            if truncated is None:
+                result_cache.put(cache_key, trend)
+    except RuntimeError as e:
+        print(f"历史趋势计算失败: {e}")
+        return jsonify({'error': str(e)}), 500
+    
+    return jsonify({
+        'owner': owner,
+        'repo': repo,
+        'sha': head_sha,
+        'cached': cached,
+        'truncated': truncated,
+        'points': trend
+    })
+
+@app.route('/api/compare', methods=['POST'])
+def compare_snapshots():
+    """比较两个仓库或同一仓库的两个引用，返回按目录和语言的增量（head - base）
+
+    同一仓库的两个引用在共享镜像中比较树，只统计发生变化的文件；不同仓库分别统计后相减
+    """
+    data = request.get_json(silent=True) or {}
+    base = parse_repo_entry(data.get('base'))
+    head = parse_repo_entry(data.get('head'))
+    if base is None or head is None:
+        return jsonify({'error': '需要 base 和 head 两个仓库'}), 400
+    
+    same_repo = (base['owner'].lower(), base['repo'].lower()) == (head['owner'].lower(), head['repo'].lower())
+    try:
+        started = time.time()
+        if same_repo:
+            base_sha = resolve_remote_sha(base['repoUrl'], base['ref'])
+            head_sha = resolve_remote_sha(head['repoUrl'], head['ref'])
+            if base_sha is None or head_sha is None:
+                return jsonify({'error': '无法解析引用'}), 400
+            require_disk_space()
+            mirror, base_sha = mirror_store.fetch_ref(base['repoUrl'], base['owner'], base['repo'],
+                                                      base['ref'] or 'HEAD', base_sha)
+            _, head_sha = mirror_store.fetch_ref(head['repoUrl'], head['owner'], head['repo'],
+                                                 head['ref'] or 'HEAD', head_sha)
+            method = 'tree-diff'
+        else:
+            base_stats, base_sha, _ = analyze_remote_repository(base['repoUrl'], base['owner'], base['repo'], ref=base['ref'])
+            head_stats, head_sha, _ = analyze_remote_repository(head['repoUrl'], head['owner'], head['repo'], ref=head['ref'])
+            method = 'full'
+        
+        cache_key = (f"compare:{ResultCache.make_key(base['owner'], base['repo'], base_sha)}:"
+                     f"{ResultCache.make_key(head['owner'], head['repo'], head_sha)}")
+        delta = result_cache.get(cache_key)
+        cached = delta is not None
+        if not cached:
+            if same_repo:
+                # 与 /api/stats 相同的资源限制；超出时只包含已统计的文件，增量标记 truncated
+                changed, truncated = run_mirror_limited(history_analyzer.changed_files, mirror, base_sha, head_sha)
+                if changed is None:
+                    return jsonify({'error': f"超出资源限制: {truncated['reason']}", 'truncated': truncated}), 413
+                delta = compare.diff_changed_files(*changed)
+                delta['truncated'] = truncated
+            else:
+                delta = compare.diff_stats(base_stats, head_stats)
+            # 由过期结果或截断的统计算出的增量不缓存
+            if not delta.get('truncated') and (same_repo or not (base_stats.get('stale') or head_stats.get('stale'))):
+                result_cache.put(cache_key, delta)
+        print(f"对比完成: {cache_key} ({method}), 耗时 {time.time() - started:.1f}s")
+    except RuntimeError as e:
+        print(f"对比失败: {e}")
+        return jsonify({'error': str(e)}), 500
+    
+    result = {
+        'base': {'owner': base['owner'], 'repo': base['repo'], 'ref': base['ref'], 'sha': base_sha},
+        'head': {'owner': head['owner'], 'repo': head['repo'], 'ref': head['ref'], 'sha': head_sha},
+        'method': method,
+        'cached': cached
+    }
+    result.update(delta)
+    return jsonify(result)
+
 @app.route('/stats')
 def stats_page():
-    """统计详情页面 - 实时重新统计"""
+    """统计详情页面 - 按提交SHA缓存"""
     owner = request.args.get('owner')
     repo = request.args.get('repo')
     repo_url = request.args.get('repo_url')
@@ -638,463 +1083,50 @@ def stats_page():
     
     if not repo_url:
         repo_url = f"https://github.com/{owner}/{repo}.git"
+    include_submodules = request.args.get('submodules') in ('1', 'true')
+    ref, ref_error = requested_ref(request.args, repo_url)
+    if ref_error:
+        return ref_error, 400
     
     try:
-        # 每次都重新统计
-        clean_all_repos()
-        ensure_repos_dir()
-        
-        # 创建临时目录
-        repo_dir = os.path.join(REPOS_DIR, f"{owner}_{repo}_{int(time.time())}")
-        
-        # 克隆仓库
-        success, message = clone_repository(repo_url, repo_dir)
-        if not success:
-            return render_template_string(ERROR_TEMPLATE, 
-                                        owner=owner, repo=repo, error=message)
-        
-        # 分析代码
-        stats = analyze_repository_stats(repo_dir)
-        
-        # 立即清理临时文件
-        if os.path.exists(repo_dir):
+        sha = resolve_remote_sha(repo_url, ref)
+        cache_key = ResultCache.make_key(owner, repo, sha, include_submodules and 'submodules' or None) if sha else None
+        with admit_analysis(cache_key) as limited:
+            if limited is not None:
+                return limited
             try:
-                shutil.rmtree(repo_dir)
-            except:
-                pass
+                stats, sha, cached = analyze_remote_repository(repo_url, owner, repo, sha=sha,
+                                                               include_submodules=include_submodules, ref=ref)
+            except RuntimeError as e:
+                return render_template('error.html', 
+                                            owner=owner, repo=repo, error=str(e))
         
-        # 将stats转换为Base64编码的JSON，避免转义问题
-        import json
+        # 目录列表在服务器端分组排序，转换为Base64编码的JSON，避免转义问题
         import base64
-        stats_json = json.dumps(stats, ensure_ascii=True, separators=(',', ':'))
-        stats_b64 = base64.b64encode(stats_json.encode('utf-8')).decode('ascii')
+        listing_json = json.dumps(build_folder_listing(stats), ensure_ascii=True, separators=(',', ':'))
+        listing_b64 = base64.b64encode(listing_json.encode('utf-8')).decode('ascii')
         
-        return render_template_string(STATS_TEMPLATE, 
-                                    owner=owner, repo=repo, stats=stats, stats_b64=stats_b64)
+        return render_template('stats.html', 
+                                    owner=owner, repo=repo, ref=ref, stats=stats, listing_b64=listing_b64)
                                     
     except Exception as e:
-        return render_template_string(ERROR_TEMPLATE, 
+        return render_template('error.html', 
                                     owner=owner, repo=repo, error=str(e))
 
-# HTML模板
-LOADING_TEMPLATE = '''
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="utf-8">
-    <title>{{ owner }}/{{ repo }} - 代码统计</title>
-    <style>
-        body { font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Helvetica, Arial, sans-serif; margin: 40px; background: #f6f8fa; }
-        .container { max-width: 1200px; margin: 0 auto; background: white; padding: 40px; border-radius: 8px; box-shadow: 0 1px 3px rgba(0,0,0,0.1); }
-        .header { text-align: center; margin-bottom: 40px; }
-        .loading { text-align: center; padding: 60px; color: #666; }
-        .spinner { display: inline-block; width: 40px; height: 40px; border: 4px solid #f3f3f3; border-top: 4px solid #0969da; border-radius: 50%; animation: spin 1s linear infinite; margin-bottom: 20px; }
-        @keyframes spin { 0% { transform: rotate(0deg); } 100% { transform: rotate(360deg); } }
-    </style>
-    <script>
-        setTimeout(() => { location.reload(); }, 5000);
-    </script>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>{{ owner }}/{{ repo }}</h1>
-            <p>代码统计分析</p>
-        </div>
-        <div class="loading">
-            <div class="spinner"></div>
-            <p>正在分析仓库代码，请稍候...</p>
-            <p>页面将自动刷新</p>
-        </div>
-    </div>
-</body>
-</html>
-'''
-
-ERROR_TEMPLATE = '''
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="utf-8">
-    <title>{{ owner }}/{{ repo }} - 统计失败</title>
-    <style>
-        body { font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Helvetica, Arial, sans-serif; margin: 40px; background: #f6f8fa; }
-        .container { max-width: 1200px; margin: 0 auto; background: white; padding: 40px; border-radius: 8px; box-shadow: 0 1px 3px rgba(0,0,0,0.1); }
-        .error { text-align: center; padding: 60px; color: #d73a49; }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="error">
-            <h1>统计失败</h1>
-            <p>{{ error }}</p>
-            <button onclick="location.reload()">重试</button>
-        </div>
-    </div>
-</body>
-</html>
-'''
-
-STATS_TEMPLATE = '''
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="utf-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{{ owner }}/{{ repo }} - 代码统计</title>
-    <style>
-        * { box-sizing: border-box; }
-        body { font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Helvetica, Arial, sans-serif; margin: 0; background: #f6f8fa; }
-        .container { max-width: 1200px; margin: 0 auto; padding: 20px; }
-        .header { background: white; padding: 30px; border-radius: 8px; margin-bottom: 20px; box-shadow: 0 1px 3px rgba(0,0,0,0.1); }
-        .header h1 { margin: 0 0 10px 0; color: #24292f; }
-        .header .subtitle { color: #656d76; margin: 0; }
-        .stats-grid { display: grid; grid-template-columns: repeat(auto-fit, minmax(250px, 1fr)); gap: 20px; margin-bottom: 30px; }
-        .stat-card { background: white; padding: 25px; border-radius: 8px; box-shadow: 0 1px 3px rgba(0,0,0,0.1); text-align: center; }
-        .stat-card .number { font-size: 36px; font-weight: bold; color: #0969da; margin-bottom: 5px; }
-        .stat-card .label { color: #656d76; font-size: 14px; }
-        .section { background: white; border-radius: 8px; box-shadow: 0 1px 3px rgba(0,0,0,0.1); margin-bottom: 20px; overflow: hidden; }
-        .section-header { padding: 20px; border-bottom: 1px solid #e1e4e8; background: #f6f8fa; }
-        .section-header h2 { margin: 0; color: #24292f; font-size: 18px; }
-        .section-content { padding: 0; }
-        .folder-item, .file-item { padding: 15px 20px; border-bottom: 1px solid #e1e4e8; display: flex; justify-content: space-between; align-items: center; cursor: pointer; transition: background 0.2s; }
-        .folder-item:hover, .file-item:hover { background: #f6f8fa; }
-        .folder-item:last-child, .file-item:last-child { border-bottom: none; }
-        .item-name { flex-grow: 1; display: flex; align-items: center; gap: 8px; font-family: 'SFMono-Regular', Consolas, 'Liberation Mono', Menlo, monospace; }
-        .item-stats { display: flex; gap: 20px; align-items: center; font-size: 14px; }
-        .lines-count { font-weight: 600; color: #0969da; }
-        .percentage { color: #656d76; }
-        .folder-icon, .file-icon { width: 16px; height: 16px; }
-        .folder-icon::before { content: "📁"; }
-        .file-icon::before { content: "📄"; }
-        .breadcrumb { padding: 15px 20px; background: #f6f8fa; border-bottom: 1px solid #e1e4e8; font-family: 'SFMono-Regular', Consolas, 'Liberation Mono', Menlo, monospace; overflow-x: auto; white-space: nowrap; }
-        .breadcrumb a { color: #0969da; text-decoration: none; cursor: pointer; }
-        .breadcrumb a:hover { text-decoration: underline; }
-        .breadcrumb span { color: #656d76; margin: 0 5px; }
-        .file-list { min-height: 400px; }
-        .back-button { padding: 15px 20px; border-bottom: 1px solid #e1e4e8; background: #f6f8fa; cursor: pointer; transition: background 0.2s; }
-        .back-button:hover { background: #e1e4e8; }
-        .back-button .item-name { color: #0969da; font-weight: 500; }
-        .progress-bar { width: 100px; height: 6px; background: #e1e4e8; border-radius: 3px; overflow: hidden; }
-        .progress-fill { height: 100%; background: linear-gradient(90deg, #0969da, #54aeff); border-radius: 3px; transition: width 0.3s; }
-        .language-stats { display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 15px; padding: 20px; }
-        .language-item { display: flex; justify-content: space-between; align-items: center; }
-        
-        /* 移动端优化 */
-        @media (max-width: 768px) {
-            .container { padding: 15px; }
-            .header { padding: 20px; }
-            .header h1 { font-size: 24px; }
-            .stats-grid { grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 15px; margin-bottom: 20px; }
-            .stat-card { padding: 20px; }
-            .stat-card .number { font-size: 28px; }
-            .section-header { padding: 15px; }
-            .section-header h2 { font-size: 16px; }
-            .folder-item, .file-item { padding: 12px 15px; }
-            .item-stats { gap: 15px; font-size: 13px; }
-            .breadcrumb { padding: 12px 15px; font-size: 14px; }
-            .back-button { padding: 12px 15px; }
-            .language-stats { grid-template-columns: 1fr; gap: 10px; padding: 15px; }
-            .progress-bar { width: 80px; }
-        }
-        
-        @media (max-width: 480px) {
-            .container { padding: 10px; }
-            .header { padding: 15px; margin-bottom: 15px; }
-            .header h1 { font-size: 20px; }
-            .header .subtitle { font-size: 14px; }
-            .stats-grid { grid-template-columns: repeat(2, 1fr); gap: 10px; margin-bottom: 15px; }
-            .stat-card { padding: 15px; }
-            .stat-card .number { font-size: 24px; }
-            .stat-card .label { font-size: 13px; }
-            .section { margin-bottom: 15px; }
-            .section-header { padding: 12px; }
-            .section-header h2 { font-size: 15px; }
-            .folder-item, .file-item { padding: 10px 12px; flex-wrap: wrap; }
-            .item-name { font-size: 14px; min-width: 0; }
-            .item-name span { overflow: hidden; text-overflow: ellipsis; }
-            .item-stats { gap: 10px; font-size: 12px; margin-top: 5px; width: 100%; justify-content: space-between; }
-            .breadcrumb { padding: 10px 12px; font-size: 13px; }
-            .back-button { padding: 10px 12px; }
-            .language-stats { padding: 12px; }
-            .language-item { font-size: 14px; }
-            .progress-bar { width: 60px; height: 4px; }
-            .file-list { min-height: 300px; }
-            
-            /* 触摸优化 */
-            .folder-item, .file-item, .back-button { 
-                min-height: 44px; 
-                -webkit-tap-highlight-color: rgba(0,0,0,0.1);
-            }
-            .breadcrumb a {
-                padding: 2px 4px;
-                margin: -2px -4px;
-                border-radius: 3px;
-            }
-        }
-        
-        @media (max-width: 320px) {
-            .stats-grid { grid-template-columns: 1fr; }
-            .stat-card .number { font-size: 20px; }
-            .stat-card .label { font-size: 12px; }
-            .item-name { font-size: 13px; }
-            .item-stats { font-size: 11px; }
-            .breadcrumb { font-size: 12px; }
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>{{ owner }}/{{ repo }}</h1>
-            <p class="subtitle">代码统计分析结果</p>
-        </div>
-        
-        <div class="stats-grid">
-            <div class="stat-card">
-                <div class="number">{{ "{:,}".format(stats.total_lines) }}</div>
-                <div class="label">总代码行数</div>
-            </div>
-            <div class="stat-card">
-                <div class="number">{{ "{:,}".format(stats.total_files) }}</div>
-                <div class="label">代码文件数</div>
-            </div>
-            <div class="stat-card">
-                <div class="number">{{ stats.file_type_stats|length }}</div>
-                <div class="label">文件类型</div>
-            </div>
-            <div class="stat-card">
-                <div class="number">{{ stats.folder_stats|length }}</div>
-                <div class="label">目录数量</div>
-            </div>
-        </div>
-
-        {% if stats.file_type_stats %}
-        <div class="section">
-            <div class="section-header">
-                <h2>文件类型分布</h2>
-            </div>
-            <div class="language-stats">
-                {% for file_type, lines in stats.file_type_stats.items() %}
-                <div class="language-item">
-                    <span>{{ file_type }}</span>
-                    <span class="lines-count">{{ "{:,}".format(lines) }} 行</span>
-                </div>
-                {% endfor %}
-            </div>
-        </div>
-        {% endif %}
-
-        <div class="section">
-            <div class="section-header">
-                <h2>文件浏览器</h2>
-            </div>
-            <div class="section-content">
-                <div class="breadcrumb" id="breadcrumb">
-                    <a onclick="navigateToFolder('')">根目录</a>
-                </div>
-                <div class="file-list" id="fileList">
-                    <!-- 文件列表将通过JavaScript动态生成 -->
-                </div>
-            </div>
-        </div>
-    </div>
-    
-    <!-- 数据传递 - 使用Base64编码避免转义问题 -->
-    <script type="text/plain" id="stats-data">{{ stats_b64 }}</script>
-
-    <script>
-        // 全局变量
-        let currentFolder = '';
-        let fileData = {};
-        let folderData = {};
-        
-        // 初始化数据 - 从Base64解码
-        let stats;
-        try {
-            const statsElement = document.getElementById('stats-data');
-            if (!statsElement) {
-                throw new Error('找不到stats-data元素');
-            }
-            const statsB64 = statsElement.textContent.trim();
-            if (!statsB64) {
-                throw new Error('stats-data为空');
-            }
-            // Base64解码
-            const statsJson = atob(statsB64);
-            stats = JSON.parse(statsJson);
-            console.log('Base64数据解析成功:', stats);
-        } catch (error) {
-            console.error('数据解析失败:', error);
-            // 设置默认空数据
-            stats = { file_stats: {}, folder_stats: {}, file_type_stats: {} };
-        }
-        
-        // 组织文件和文件夹数据
-        function initializeData() {
-            console.log('初始化数据', stats);
-            
-            // 处理文件数据
-            for (const [filePath, fileInfo] of Object.entries(stats.file_stats || {})) {
-                const pathParts = filePath.split('/');
-                const fileName = pathParts[pathParts.length - 1];
-                const dirPath = pathParts.length > 1 ? pathParts.slice(0, -1).join('/') : '';
-                
-                if (!fileData[dirPath]) {
-                    fileData[dirPath] = [];
-                }
-                
-                fileData[dirPath].push({
-                    name: fileName,
-                    path: filePath,
-                    lines: fileInfo.lines,
-                    percentage: fileInfo.percentage,
-                    type: 'file'
-                });
-            }
-            
-            // 处理文件夹数据 - 创建层级结构
-            const allFolders = new Set();
-            
-            // 先收集所有可能的文件夹路径
-            for (const [filePath, fileInfo] of Object.entries(stats.file_stats || {})) {
-                const pathParts = filePath.split('/');
-                if (pathParts.length > 1) {
-                    // 为文件路径创建所有父级目录
-                    for (let i = 1; i < pathParts.length; i++) {
-                        const folderPath = pathParts.slice(0, i).join('/');
-                        allFolders.add(folderPath);
-                    }
-                }
-            }
-            
-            // 处理已有的文件夹统计数据
-            for (const [folderPath, folderInfo] of Object.entries(stats.folder_stats || {})) {
-                if (folderPath === '.') {
-                    // 处理根目录的文件
-                    continue;
-                }
-                allFolders.add(folderPath);
-            }
-            
-            // 为每个文件夹创建条目
-            for (const folderPath of allFolders) {
-                const pathParts = folderPath.split('/');
-                const folderName = pathParts[pathParts.length - 1];
-                const parentPath = pathParts.length > 1 ? pathParts.slice(0, -1).join('/') : '';
-                
-                if (!folderData[parentPath]) {
-                    folderData[parentPath] = [];
-                }
-                
-                // 使用统计数据或默认值
-                const folderInfo = stats.folder_stats[folderPath] || { lines: 0, files: 0, percentage: 0 };
-                
-                folderData[parentPath].push({
-                    name: folderName,
-                    path: folderPath,
-                    lines: folderInfo.lines || 0,
-                    percentage: folderInfo.percentage || 0,
-                    files: folderInfo.files || 0,
-                    type: 'folder'
-                });
-            }
-            
-            // 对所有数据按名称排序，文件夹在前
-            for (const path in folderData) {
-                folderData[path].sort((a, b) => a.name.localeCompare(b.name));
-            }
-            for (const path in fileData) {
-                fileData[path].sort((a, b) => a.name.localeCompare(b.name));
-            }
-            
-            console.log('文件数据:', fileData);
-            console.log('文件夹数据:', folderData);
-        }
-        
-        // 导航到指定文件夹
-        function navigateToFolder(folderPath) {
-            currentFolder = folderPath;
-            updateBreadcrumb();
-            renderFileList();
-        }
-        
-        // 更新面包屑导航
-        function updateBreadcrumb() {
-            const breadcrumb = document.getElementById('breadcrumb');
-            let html = '<a onclick="navigateToFolder(\\'\\')">根目录</a>';
-            
-            if (currentFolder) {
-                const pathParts = currentFolder.split('/');
-                let currentPath = '';
-                
-                for (let i = 0; i < pathParts.length; i++) {
-                    currentPath += (i > 0 ? '/' : '') + pathParts[i];
-                    html += ' <span>/</span> ';
-                    html += '<a onclick="navigateToFolder(\\'' + currentPath + '\\')">' + pathParts[i] + '</a>';
-                }
-            }
-            
-            breadcrumb.innerHTML = html;
-        }
-        
-        // 渲染文件列表
-        function renderFileList() {
-            const fileList = document.getElementById('fileList');
-            let html = '';
-            
-            // 添加返回上级目录按钮（如果不在根目录）
-            if (currentFolder) {
-                const parentFolder = currentFolder.includes('/') 
-                    ? currentFolder.substring(0, currentFolder.lastIndexOf('/'))
-                    : '';
-                    
-                html += '<div class="back-button" onclick="navigateToFolder(\\'' + parentFolder + '\\')"><div class="item-name"><span>🔙</span><span>返回上级目录</span></div></div>';
-            }
-            
-            // 显示当前目录下的文件夹
-            const currentFolders = folderData[currentFolder] || [];
-            for (const folder of currentFolders) {
-                html += '<div class="folder-item" onclick="navigateToFolder(\\'' + folder.path + '\\')"><div class="item-name"><span class="folder-icon"></span><span>' + folder.name + '</span></div><div class="item-stats"><span class="lines-count">' + folder.lines.toLocaleString() + ' 行</span><span class="percentage">' + folder.percentage.toFixed(1) + '%</span><div class="progress-bar"><div class="progress-fill" style="width: ' + folder.percentage + '%"></div></div></div></div>';
-            }
-            
-            // 显示当前目录下的文件
-            const currentFiles = fileData[currentFolder] || [];
-            for (const file of currentFiles) {
-                html += '<div class="file-item"><div class="item-name"><span class="file-icon"></span><span>' + file.name + '</span></div><div class="item-stats"><span class="lines-count">' + file.lines.toLocaleString() + ' 行</span><span class="percentage">' + file.percentage.toFixed(1) + '%</span><div class="progress-bar"><div class="progress-fill" style="width: ' + file.percentage + '%"></div></div></div></div>';
-            }
-            
-            // 如果目录为空
-            if (currentFolders.length === 0 && currentFiles.length === 0) {
-                html += '<div class="file-item"><div class="item-name" style="color: #656d76; font-style: italic;"><span>📭</span><span>此目录为空</span></div></div>';
-            }
-            
-            fileList.innerHTML = html;
-        }
-        
-        // 页面加载完成后初始化
-        function initializePage() {
-            console.log('开始初始化页面...');
-            try {
-                initializeData();
-                navigateToFolder('');
-                console.log('页面初始化完成');
-            } catch (error) {
-                console.error('初始化出错:', error);
-            }
-        }
-        
-        // 确保在页面加载完成后执行
-        if (document.readyState === 'loading') {
-            document.addEventListener('DOMContentLoaded', initializePage);
-        } else {
-            // DOM已经加载完成，立即执行
-            initializePage();
-        }
-    </script>
-</body>
-</html>
-'''
+def warm_startup():
+    """启动预热：在 gunicorn master 中执行一次（preload_app），worker fork 后通过写时复制共享
+
+    翻译、模板和静态页面在导入时已加载，这里再完成 Git 检查和缓存目录、索引的初始化
+    """
+    started = time.time()
+    probe_git()
+    result_cache.warm()
+    blob_cache.warm()
+    rate_limiter.warm()
+    job_store.warm()
+    print(f"启动预热完成，耗时 {time.time() - started:.3f}s")
+
+warm_startup()
 
 if __name__ == '__main__':
     print("GitHub Stats Server starting...")
@@ -0,0 +1,159 @@
+# 压缩包统计
+# 直接从上传的 .tar.gz / .zip 中逐个读取成员进行统计，不解压到磁盘。
+# tar 以流的方式边接收边处理；zip 的目录位于文件末尾，需要先缓存到有上限的临时文件中。
+import shutil
+import tarfile
+import tempfile
+import zipfile
+
+# 上传大小上限
+MAX_UPLOAD_BYTES = 512 * 1024 * 1024
+# 所有成员解压后的总大小上限
+MAX_UNCOMPRESSED_BYTES = 2 * 1024 * 1024 * 1024
+# 成员数量上限
+MAX_MEMBERS = 200000
+# 单个文件的大小上限（与 is_text_file 一致，更大的文件不读取）
+MAX_MEMBER_BYTES = 10 * 1024 * 1024
+# zip 缓存时超过该大小才写入临时文件
+SPOOL_MEMORY_BYTES = 16 * 1024 * 1024
+
+
+class ArchiveLimitError(Exception):
+    """压缩包超出大小或成员数量限制"""
+
+
+def detect_format(file_name=None, content_type=None, format_hint=None):
+    """根据参数、文件名或 Content-Type 判断压缩包格式，无法判断返回 None"""
+    if format_hint:
+        hint = format_hint.lower()
+        if hint in ('zip',):
+            return 'zip'
+        if hint in ('tar', 'tgz', 'tar.gz', 'gz', 'tar.bz2', 'tar.xz'):
+            return 'tar'
+    name = (file_name or '').lower()
+    if name.endswith('.zip'):
+        return 'zip'
+    if name.endswith(('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')):
+        return 'tar'
+    content_type = (content_type or '').lower()
+    if 'zip' in content_type:
+        return 'zip'
+    if any(t in content_type for t in ('gzip', 'x-tar', 'x-gtar')):
+        return 'tar'
+    return None
+
+
+class _Budget:
+    """累计成员数量和解压大小"""
+
+    def __init__(self):
+        self.members = 0
+        self.uncompressed = 0
+
+    def add_member(self):
+        self.members += 1
+        if self.members > MAX_MEMBERS:
+            raise ArchiveLimitError(f"压缩包成员数量超过上限 {MAX_MEMBERS}")
+
+    def add_bytes(self, size):
+        self.uncompressed += size
+        if self.uncompressed > MAX_UNCOMPRESSED_BYTES:
+            raise ArchiveLimitError(f"压缩包解压后大小超过上限 {MAX_UNCOMPRESSED_BYTES} 字节")
+
+
+class _LimitedReader:
+    """限制读取总量的流包装，超出时抛出 ArchiveLimitError"""
+
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.limit = limit
+        self.read_bytes = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.read_bytes += len(data)
+        if self.read_bytes > self.limit:
+            raise ArchiveLimitError(f"上传大小超过上限 {self.limit} 字节")
+        return data
+
+
+def iter_members(stream, archive_format, wanted=None):
+    """逐个产出压缩包中的普通文件 (路径, 内容)
+
+    wanted(path, size) 返回 False 的成员不读取内容；超过 MAX_MEMBER_BYTES 的成员产出 None 内容
+    """
+    stream = _LimitedReader(stream, MAX_UPLOAD_BYTES)
+    if archive_format == 'zip':
+        yield from _iter_zip(stream, wanted)
+    else:
+        yield from _iter_tar(stream, wanted)
+
+
+def _clean_path(path):
+    """统一为不带 ./ 前缀的相对路径"""
+    path = path.replace('\\', '/')
+    while path.startswith('./'):
+        path = path[2:]
+    return path.lstrip('/')
+
+
+def _read_member(file_obj, size, budget):
+    if size > MAX_MEMBER_BYTES:
+        budget.add_bytes(size)
+        return None
+    # 声明的大小不可信（压缩炸弹），最多多读一个字节来判断
+    data = file_obj.read(MAX_MEMBER_BYTES + 1)
+    budget.add_bytes(len(data))
+    if len(data) > MAX_MEMBER_BYTES:
+        return None
+    return data
+
+
+def _iter_tar(stream, wanted):
+    budget = _Budget()
+    # r|* 为流模式，自动识别 gzip/bz2/xz 压缩，只能顺序读取
+    with tarfile.open(fileobj=stream, mode='r|*') as tar:
+        for member in tar:
+            budget.add_member()
+            if not member.isfile():
+                continue
+            path = _clean_path(member.name)
+            if wanted is not None and not wanted(path, member.size):
+                budget.add_bytes(member.size)
+                continue
+            file_obj = tar.extractfile(member)
+            if file_obj is None:
+                continue
+            yield path, _read_member(file_obj, member.size, budget)
+
+
+def _iter_zip(stream, wanted):
+    budget = _Budget()
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES) as spool:
+        shutil.copyfileobj(stream, spool, 1024 * 1024)
+        spool.seek(0)
+        with zipfile.ZipFile(spool) as archive:
+            for info in archive.infolist():
+                budget.add_member()
+                if info.is_dir():
+                    continue
+                path = _clean_path(info.filename)
+                if wanted is not None and not wanted(path, info.file_size):
+                    budget.add_bytes(info.file_size)
+                    continue
+                with archive.open(info) as file_obj:
+                    yield path, _read_member(file_obj, info.file_size, budget)
+
+
+def common_root(paths):
+    """压缩包通常包一层顶级目录（如 GitHub 的 repo-sha/），返回该目录前缀，没有则返回空字符串"""
+    root = None
+    for path in paths:
+        if '/' not in path:
+            return ''
+        first = path.split('/', 1)[0]
+        if root is None:
+            root = first
+        elif first != root:
+            return ''
+    return root + '/' if root else ''
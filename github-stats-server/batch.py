@@ -0,0 +1,188 @@
+# 批量分析
+# 一次提交多个仓库，结果按完成顺序逐条返回。任务和结果保存在共享任务库（jobstore.py）中，
+# 多个服务器节点共同处理：每个仓库按 owner/repo 的一致性哈希分配给持有其镜像的节点，
+# 节点以租约领取任务并在心跳中续约，节点失联后租约过期，任务重新排队由其他节点执行。
+# 同样条件下优先领取正在运行任务最少的客户端的任务，一个客户端提交的大批次不会让其他客户端一直排在后面。
+import os
+import threading
+import time
+import uuid
+
+# 每个节点的并发数（节点上所有 gunicorn worker 合计）和单批最大仓库数
+DEFAULT_MAX_WORKERS = 4
+MAX_BATCH_SIZE = 500
+# 已完成的批次在任务库中保留的时间（秒）
+BATCH_RETENTION = 3600
+# 任务租约的时长（秒），在心跳中续约
+LEASE_SECONDS = 60
+# 分配给其他在线节点的任务排队超过该时间后，空闲节点也可以领取（秒）
+STEAL_AFTER = 60
+# 没有任务时轮询任务库的间隔（秒）
+POLL_INTERVAL = 1.0
+# 一次流式读取结果的最长时间（秒），小于 gunicorn 的 worker 超时；未完成时客户端带 after 参数继续读取
+STREAM_SECONDS = 60
+
+
+class Batch:
+    """一个批量分析任务（任务库中批次的视图，任意节点都可以查询）"""
+
+    def __init__(self, store, batch_id, total):
+        self.store = store
+        self.batch_id = batch_id
+        self.total = total
+
+    def summary(self):
+        """批次状态摘要"""
+        completed, failed = self.store.batch_progress(self.batch_id)
+        return {
+            'batchId': self.batch_id,
+            'total': self.total,
+            'completed': completed,
+            'failed': failed,
+            'done': completed >= self.total
+        }
+
+    def iter_results(self, after=0, max_seconds=None):
+        """按完成顺序逐条产出序号大于 after 的 (序号, 结果)，直到全部完成
+
+        max_seconds 秒后提前结束（None 为一直等待，0 为只返回已完成的结果）
+        """
+        seq = after
+        deadline = None if max_seconds is None else time.monotonic() + max_seconds
+        while True:
+            results = self.store.results_after(self.batch_id, seq)
+            for seq, result in results:
+                yield seq, result
+            if results:
+                continue
+            if self.store.batch_progress(self.batch_id)[0] >= self.total:
+                return
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            time.sleep(POLL_INTERVAL)
+
+
+class BatchManager:
+    """批量分析管理器
+
+    analyze_func(repo_info) 返回单个仓库的结果字典，抛出异常表示失败。
+    每个仓库的失败相互隔离，不影响同批次的其他仓库；只有节点失联才重试。
+    admit_func(client, repo_info) 在每个任务执行前调用（限流），返回需要等待的秒数，0 为立即执行；
+    需要等待时任务退回队列，该客户端的任务推迟到令牌补足后再领取，其他客户端不受影响。
+    """
+
+    def __init__(self, analyze_func, store, cluster, max_workers=DEFAULT_MAX_WORKERS, admit_func=None):
+        self.analyze_func = analyze_func
+        self.admit_func = admit_func
+        self.store = store
+        self.cluster = cluster
+        self.max_workers = max_workers
+        self._wake = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+        cluster.add_task(self._maintain)
+
+    @property
+    def lease_owner(self):
+        # 租约按进程区分：worker 进程退出后它的任务过期重试，即使节点仍然在线；
+        # 以 "节点ID/" 开头，领取时据此统计本节点正在执行的任务数
+        return f"{self.cluster.node_id}/{os.getpid()}"
+
+    def start(self):
+        """在当前进程中启动执行线程和节点心跳（gunicorn 预加载时 master 中的线程不会带到 worker）
+
+        每个 worker 进程都启动 max_workers 个线程，领取任务时按节点限制总数，空闲的线程只轮询任务库
+        """
+        self.cluster.start()
+        with self._lock:
+            if self._pid == os.getpid() and all(thread.is_alive() for thread in self._threads):
+                return
+            self._pid = os.getpid()
+            self._wake = threading.Event()
+            self._threads = [threading.Thread(target=self._work, name=f'batch-{i}', daemon=True)
+                             for i in range(self.max_workers)]
+            for thread in self._threads:
+                thread.start()
+
+    def submit(self, repos, client=None):
+        """提交一批仓库，返回批次ID
+
+        repos 为 {'repoUrl', 'owner', 'repo', 'ref'} 字典列表，client 为提交者（用于公平调度）
+        """
+        if len(repos) > MAX_BATCH_SIZE:
+            raise ValueError(f"单批最多 {MAX_BATCH_SIZE} 个仓库")
+
+        batch_id = uuid.uuid4().hex
+        jobs = [(self.cluster.owner(repo_info['owner'], repo_info['repo']), repo_info) for repo_info in repos]
+        self.store.create_batch(batch_id, jobs, client)
+        self.start()
+        self._wake.set()
+        return batch_id
+
+    def get(self, batch_id):
+        total = self.store.batch_total(batch_id)
+        return Batch(self.store, batch_id, total) if total is not None else None
+
+    def queued(self):
+        """等待中的客户端数量和仓库数量，以及正在运行的仓库数量"""
+        return self.store.queue_summary()
+
+    def _work(self):
+        while True:
+            now = time.time()
+            try:
+                job = self.store.claim(self.cluster.node_id, self.lease_owner, LEASE_SECONDS,
+                                       alive_after=self.cluster.alive_after(), steal_before=now - STEAL_AFTER,
+                                       max_running=self.max_workers)
+            except Exception as e:
+                print(f"领取批量任务失败: {e}")
+                job = None
+            if job is None:
+                self._wake.wait(POLL_INTERVAL)
+                self._wake.clear()
+                continue
+            self._run_one(*job)
+
+    def _run_one(self, job_id, batch_id, index, repo_info, client):
+        owner = repo_info['owner']
+        repo = repo_info['repo']
+        if self.admit_func is not None:
+            try:
+                wait = self.admit_func(client, repo_info)
+            except Exception as e:
+                print(f"批量任务限流检查失败 {owner}/{repo}: {e}")
+                wait = 0
+            if wait:
+                print(f"批量任务限流，{wait:.0f} 秒后再执行: {client} {owner}/{repo}")
+                self.store.defer(job_id, self.lease_owner, client, time.time() + wait)
+                return
+        started = time.time()
+        try:
+            result = self.analyze_func(repo_info)
+            entry = {'status': 'ok', **result}
+        except Exception as e:
+            print(f"批量分析失败 {owner}/{repo}: {e}")
+            entry = {'status': 'error', 'error': str(e)}
+        entry.update({
+            'index': index,
+            'owner': owner,
+            'repo': repo,
+            'elapsed': round(time.time() - started, 3)
+        })
+        if not self.store.finish(job_id, self.lease_owner, entry['status'], entry):
+            print(f"批量任务租约已过期，结果丢弃: {batch_id} {owner}/{repo}")
+
+    @staticmethod
+    def _lost_result(repo_info, index):
+        return {'status': 'error', 'error': '执行任务的节点失联，重试次数已用完',
+                'index': index, 'owner': repo_info['owner'], 'repo': repo_info['repo'], 'elapsed': None}
+
+    def _maintain(self):
+        """心跳中执行：为本进程的任务续约，回收过期租约，清理过期批次"""
+        self.store.renew(self.lease_owner, LEASE_SECONDS)
+        requeued, failed = self.store.requeue_expired(self._lost_result)
+        if requeued or failed:
+            print(f"回收过期的批量任务: 重新排队 {requeued}，失败 {failed}")
+            self._wake.set()
+        self.store.purge_batches(time.time() - BATCH_RETENTION)
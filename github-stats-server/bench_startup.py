@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+启动性能测试
+对比 worker 冷启动（每个 worker 自己导入应用）和 preload 后 fork 的启动时间，
+以及 worker 回收后第一个请求的响应时间。
+
+用法: python bench_startup.py [次数]
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+ROUNDS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+COLD_WORKER = '''
+import time
+started = time.perf_counter()
+import app
+booted = time.perf_counter()
+app.app.test_client().get('/health')
+done = time.perf_counter()
+print(booted - started, done - started)
+'''
+
+
+def cold_worker():
+    """模拟未开启 preload 时回收后的 worker：新进程重新导入应用"""
+    output = subprocess.check_output([sys.executable, '-c', COLD_WORKER], cwd=HERE,
+                                     stderr=subprocess.DEVNULL, text=True)
+    boot, first = output.strip().splitlines()[-1].split()
+    return float(boot), float(first)
+
+
+def preloaded_worker(app_module):
+    """模拟开启 preload 后回收的 worker：从已加载应用的 master fork"""
+    read_fd, write_fd = os.pipe()
+    started = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        booted = time.perf_counter()
+        app_module.app.test_client().get('/health')
+        done = time.perf_counter()
+        os.write(write_fd, f"{booted - started} {done - started}".encode())
+        os._exit(0)
+    os.close(write_fd)
+    data = os.read(read_fd, 1024).decode()
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    boot, first = data.split()
+    return float(boot), float(first)
+
+
+def report(name, samples):
+    boots = sorted(s[0] for s in samples)
+    firsts = sorted(s[1] for s in samples)
+    print(f"{name:<12} 启动: 中位数 {boots[len(boots) // 2] * 1000:8.1f} ms   "
+          f"首次响应: 中位数 {firsts[len(firsts) // 2] * 1000:8.1f} ms")
+
+
+def main():
+    sys.path.insert(0, HERE)
+    os.chdir(HERE)
+
+    cold = [cold_worker() for _ in range(ROUNDS)]
+
+    if not hasattr(os, 'fork'):
+        report('冷启动', cold)
+        print("当前平台不支持 fork，跳过 preload 测试")
+        return
+
+    # master 中导入一次应用（gunicorn preload_app 的行为）
+    import contextlib
+    import io
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as app_module
+    preloaded = [preloaded_worker(app_module) for _ in range(ROUNDS)]
+
+    print(f"=== worker 启动测试（{ROUNDS} 次）===")
+    report('冷启动', cold)
+    report('preload', preloaded)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+GitHub Statistics CLI
+在命令行中统计仓库（URL、owner/repo 或本地 git 仓库路径），与服务器使用同一个统计引擎（engine）
+和缓存格式：写入服务器的缓存目录即可预热缓存，也可以离线审计一批仓库。
+只导入统计引擎，不加载 Flask、CORS 和 i18n。
+
+用法:
+    python cli.py https://github.com/owner/repo owner/other ./local-checkout
+    python cli.py --input repos.txt --workers 8 --format ndjson --output results.ndjson
+    python cli.py owner/repo --ref v1.0 --cache off --files
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import redirect_stdout
+
+from engine import (analyzer_profile, clone_repository, resolve_remote_sha, analyze_repository_limited,
+                    is_cacheable, summarize_stats, save_stats)
+from languages import sort_languages
+from result_cache import ResultCache, BlobCache
+from sandbox import JobLimits
+
+# 与服务器（app.py）的 CACHE_DIR 相同，默认直接预热本机服务器的缓存
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'github_stats_cache')
+# rw: 读取并写入缓存；ro: 只读取；wo: 不读取、重新统计并写入（刷新）；off: 不使用缓存
+CACHE_MODES = ('rw', 'ro', 'wo', 'off')
+
+
+def parse_target(target):
+    """返回 (repo_url, owner, repo)；本地路径的 owner 为 'local'，repo 为目录名"""
+    if os.path.isdir(target):
+        path = os.path.abspath(target)
+        return path, 'local', os.path.basename(path)
+    match = re.search(r'github\.com[/:]([^/]+)/([^/?#]+?)(?:\.git)?/?$', target)
+    if match:
+        return target, match.group(1), match.group(2)
+    match = re.fullmatch(r'([\w.-]+)/([\w.-]+)', target)
+    if match:
+        return f"https://github.com/{target}.git", match.group(1), match.group(2)
+    # 其他 git 地址：owner 为主机名，repo 为最后一段路径
+    match = re.search(r'^(?:[\w+]+://)?(?:[^@/]+@)?([^/:]+)[/:](?:.*/)?([^/]+?)(?:\.git)?/?$', target)
+    if match:
+        return target, match.group(1), match.group(2)
+    raise ValueError(f"无法识别的仓库: {target}")
+
+
+def analyze_target(target, options, cache, tree_store):
+    """统计一个仓库，返回结果字典；与服务器相同，先克隆（本地仓库克隆已提交的内容）再统计"""
+    started = time.time()
+    repo_url, owner, repo = parse_target(target)
+    sha = resolve_remote_sha(repo_url, options.ref)
+    cache_key = ResultCache.make_key(owner, repo, sha) if sha and cache is not None else None
+
+    stats = cache.get(cache_key) if cache_key and options.cache in ('rw', 'ro') else None
+    cached = stats is not None
+    if stats is None:
+        if sha is None and os.path.isdir(repo_url) and not options.ref:
+            # 不是 git 仓库的本地目录：直接统计，不缓存
+            stats = analyze_repository_limited(repo_url, options.limits)
+        else:
+            work_dir = tempfile.mkdtemp(prefix='github_stats_cli_')
+            try:
+                success, message = clone_repository(repo_url, os.path.join(work_dir, repo), options.ref)
+                if not success:
+                    raise RuntimeError(message)
+                stats = analyze_repository_limited(os.path.join(work_dir, repo), options.limits, tree_store)
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+        if cache_key and options.cache in ('rw', 'wo') and is_cacheable(stats):
+            save_stats(cache, cache_key, stats)
+
+    result = {'target': target, 'status': 'ok', 'owner': owner, 'repo': repo, 'ref': options.ref,
+              'sha': sha, 'cached': cached}
+    result.update(summarize_stats(stats))
+    result['languages'] = sort_languages(stats['language_stats'])
+    if options.files:
+        result['files'] = stats['file_stats']
+    result['elapsed'] = round(time.time() - started, 3)
+    return result
+
+
+def read_targets(options):
+    """命令行参数和 --input 文件（- 为标准输入）中的仓库，忽略空行和 # 开头的行"""
+    targets = list(options.targets)
+    if options.input:
+        source = sys.stdin if options.input == '-' else open(options.input, encoding='utf-8')
+        with source:
+            targets.extend(line.strip() for line in source if line.strip() and not line.lstrip().startswith('#'))
+    return targets
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='统计 GitHub 仓库的代码行数（与服务器共用统计引擎和缓存）')
+    parser.add_argument('targets', nargs='*', help='仓库 URL、owner/repo 或本地 git 仓库路径')
+    parser.add_argument('-i', '--input', help='每行一个仓库的文件，- 为标准输入')
+    parser.add_argument('--ref', help='分支、标签或提交SHA，默认为默认分支（本地仓库为 HEAD）')
+    parser.add_argument('-w', '--workers', type=int, default=4, help='并发统计的仓库数（默认4）')
+    parser.add_argument('--cache', choices=CACHE_MODES, default='rw',
+                        help='rw 读写缓存（默认），ro 只读，wo 重新统计并写入，off 不使用')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help=f'缓存目录（默认 {DEFAULT_CACHE_DIR}）')
+    parser.add_argument('-f', '--format', choices=('json', 'ndjson'), default='json',
+                        help='json 按输入顺序输出一个数组（默认），ndjson 按完成顺序每行一个仓库')
+    parser.add_argument('-o', '--output', help='输出文件，默认为标准输出')
+    parser.add_argument('--files', action='store_true', help='输出中包含逐文件统计')
+    parser.add_argument('-q', '--quiet', action='store_true', help='不在标准错误中显示进度')
+    parser.add_argument('-v', '--verbose', action='store_true', help='在标准错误中显示克隆和统计的详细日志')
+    options = parser.parse_args(argv)
+    if options.workers < 1:
+        parser.error('--workers 至少为 1')
+    return options
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    try:
+        targets = read_targets(options)
+    except OSError as e:
+        print(f"读取仓库列表失败: {e}", file=sys.stderr)
+        return 2
+    if not targets:
+        print("没有要统计的仓库", file=sys.stderr)
+        return 2
+
+    # 每个仓库的资源上限与服务器相同（JOB_MAX_FILES / JOB_MAX_BYTES / JOB_MAX_SECONDS / JOB_MAX_RSS_MB）
+    options.limits = JobLimits.from_env()
+    cache = tree_store = None
+    if options.cache != 'off':
+        cache = ResultCache(options.cache_dir, analyzer_profile.id)
+        if options.cache != 'ro':
+            tree_store = BlobCache(os.path.join(options.cache_dir, 'blobs.sqlite3'), analyzer_profile.id)
+
+    output = open(options.output, 'w', encoding='utf-8') if options.output else sys.stdout
+    progress = None if options.quiet else sys.stderr
+    # 统计引擎的日志写到标准输出，这里改为标准错误（--verbose）或丢弃，标准输出只保留结果
+    log = sys.stderr if options.verbose else open(os.devnull, 'w')
+    results = [None] * len(targets)
+    failed = 0
+    try:
+        with redirect_stdout(log), ThreadPoolExecutor(max_workers=options.workers) as executor:
+            futures = {executor.submit(analyze_target, target, options, cache, tree_store): index
+                       for index, target in enumerate(targets)}
+            for done, future in enumerate(as_completed(futures), 1):
+                index = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'target': targets[index], 'status': 'error', 'error': str(e)}
+                    failed += 1
+                results[index] = result
+                if progress is not None:
+                    summary = (f"{result['totalLines']} 行, {result['totalFiles']} 个文件"
+                               f"{'（缓存）' if result['cached'] else ''}" if result['status'] == 'ok'
+                               else f"失败: {result['error'].splitlines()[0] if result['error'] else ''}")
+                    print(f"[{done}/{len(targets)}] {targets[index]}: {summary}", file=progress, flush=True)
+                if options.format == 'ndjson':
+                    output.write(json.dumps(result, ensure_ascii=False) + '\n')
+                    output.flush()
+        if options.format == 'json':
+            json.dump(results, output, ensure_ascii=False, indent=2)
+            output.write('\n')
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if log is not sys.stderr:
+            log.close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+# 多节点
+# 各节点定期在共享任务库中写入心跳，心跳在 NODE_TIMEOUT 秒内的节点视为在线。
+# owner/repo 通过一致性哈希映射到在线节点之一：该仓库的请求和批量任务都交给这个节点，
+# 它的镜像和缓存命中率最高；节点增减时只有少部分仓库换节点。
+import bisect
+import hashlib
+import os
+import socket
+import threading
+import time
+
+# 心跳间隔和判定节点失联的时间（秒）
+HEARTBEAT_INTERVAL = 10
+NODE_TIMEOUT = 30
+# 每个节点在哈希环上的虚拟节点数
+RING_REPLICAS = 100
+# 在线节点列表的缓存时间（秒），避免每个请求都查询任务库
+MEMBERS_TTL = 5
+
+
+def _hash(value):
+    return int(hashlib.md5(value.encode('utf-8')).hexdigest()[:16], 16)
+
+
+class HashRing:
+    """一致性哈希环"""
+
+    def __init__(self, nodes, replicas=RING_REPLICAS):
+        points = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(replicas))
+        self._keys = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key):
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._nodes[index]
+
+
+class Cluster:
+    """本节点的身份、心跳线程和在线节点的哈希环
+
+    url 为其他节点转发请求时使用的地址，未设置时本节点只领取任务，不接收转发的请求。
+    add_task(func) 注册在心跳线程中周期执行的维护任务（例如续约、回收过期任务）
+    """
+
+    def __init__(self, store, node_id, url=None, node_timeout=NODE_TIMEOUT):
+        self.store = store
+        self.node_id = node_id
+        self.url = url.rstrip('/') if url else None
+        self.node_timeout = node_timeout
+        self.tasks = []
+        self._members = None
+        self._members_at = 0
+        self._ring = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, store):
+        """从环境变量读取节点ID（NODE_ID，默认为主机名）和地址（NODE_URL）"""
+        return cls(store, os.environ.get('NODE_ID') or socket.gethostname(), os.environ.get('NODE_URL') or None)
+
+    def add_task(self, func):
+        self.tasks.append(func)
+
+    def start(self):
+        """在当前进程中启动心跳线程（gunicorn 预加载时 master 中的线程不会带到 worker）"""
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='cluster-heartbeat', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            for func in [self.heartbeat] + self.tasks:
+                try:
+                    func()
+                except Exception as e:
+                    print(f"节点维护任务失败 {getattr(func, '__name__', func)}: {e}")
+            time.sleep(HEARTBEAT_INTERVAL)
+
+    def heartbeat(self):
+        self.store.heartbeat(self.node_id, self.url)
+
+    def alive_after(self):
+        """心跳晚于该时间的节点在线"""
+        return time.time() - self.node_timeout
+
+    def members(self):
+        """在线节点 {节点ID: URL}（包括本节点）"""
+        now = time.time()
+        with self._lock:
+            if self._members is not None and now - self._members_at < MEMBERS_TTL:
+                return self._members
+        try:
+            members = self.store.alive_nodes(self.alive_after())
+        except Exception as e:
+            print(f"读取在线节点失败: {e}")
+            members = dict(self._members or {})
+        members[self.node_id] = self.url
+        with self._lock:
+            if self._members is None or set(members) != set(self._members):
+                self._ring = HashRing(sorted(members))
+            self._members = members
+            self._members_at = now
+        return members
+
+    def owner(self, owner, repo):
+        """负责该仓库的节点ID"""
+        self.members()
+        return self._ring.node_for(f"{owner}/{repo}".lower())
+
+    def route(self, owner, repo):
+        """该仓库应转发到的节点地址；由本节点负责或负责的节点没有地址时返回 None"""
+        node = self.owner(owner, repo)
+        if node == self.node_id:
+            return None
+        return self.members().get(node)
+
+    def stats(self):
+        members = self.members()
+        return {'node': self.node_id, 'nodes': sorted(members), 'routable': sum(1 for url in members.values() if url)}
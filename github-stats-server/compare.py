@@ -0,0 +1,76 @@
+# 统计对比
+# 计算两个快照之间按目录和语言的增量：
+# 同一个镜像中的两个提交只累加发生变化的文件；不同仓库的两个完整统计结果直接相减。
+import os
+
+COUNT_KEYS = ('lines', 'code', 'comment', 'blank')
+
+
+def new_delta():
+    return {
+        'totals': {'lines': 0, 'files': 0, 'code': 0, 'comment': 0, 'blank': 0},
+        'languages': {},
+        'folders': {}
+    }
+
+
+def _folders_of(path):
+    """文件的所有父级目录，包括根目录 '.'"""
+    folder = os.path.dirname(path)
+    while folder:
+        yield folder
+        folder = os.path.dirname(folder)
+    yield '.'
+
+
+def _add(target, entry, sign, files=1):
+    for key in COUNT_KEYS:
+        target[key] = target.get(key, 0) + sign * entry[key]
+    target['files'] = target.get('files', 0) + sign * files
+
+
+def apply_file(delta, path, entry, sign):
+    """把单个文件的统计加入（sign=1）或减出（sign=-1）增量"""
+    _add(delta['totals'], entry, sign)
+    _add(delta['languages'].setdefault(entry['language'], {}), entry, sign)
+    for folder in _folders_of(path):
+        _add(delta['folders'].setdefault(folder, {}), entry, sign)
+
+
+def diff_changed_files(removed, added):
+    """由两个提交之间变化的文件（{路径: 文件统计}）计算增量"""
+    delta = new_delta()
+    for path, entry in removed.items():
+        apply_file(delta, path, entry, -1)
+    for path, entry in added.items():
+        apply_file(delta, path, entry, 1)
+    return finalize_delta(delta)
+
+
+def diff_stats(base, head):
+    """两个完整统计结果（analyze_repository_stats 的返回值）之间的增量"""
+    delta = new_delta()
+    for key, stats_key in (('lines', 'total_lines'), ('files', 'total_files'), ('code', 'code_lines'),
+                           ('comment', 'comment_lines'), ('blank', 'blank_lines')):
+        delta['totals'][key] = head[stats_key] - base[stats_key]
+
+    for sign, stats in ((-1, base), (1, head)):
+        language_files = {}
+        for file_info in stats['file_stats'].values():
+            language = file_info['language']
+            language_files[language] = language_files.get(language, 0) + 1
+        for language, counts in stats['language_line_stats'].items():
+            _add(delta['languages'].setdefault(language, {}), counts, sign, language_files.get(language, 0))
+        for folder, counts in stats['folder_stats'].items():
+            _add(delta['folders'].setdefault(folder, {}), counts, sign, counts['files'])
+    return finalize_delta(delta)
+
+
+def finalize_delta(delta):
+    """去掉没有变化的语言和目录，语言按行数变化的绝对值排序"""
+    delta['languages'] = dict(sorted(
+        ((language, counts) for language, counts in delta['languages'].items() if any(counts.values())),
+        key=lambda item: abs(item[1]['lines']), reverse=True))
+    delta['folders'] = {folder: counts for folder, counts in sorted(delta['folders'].items())
+                        if any(counts.values())}
+    return delta
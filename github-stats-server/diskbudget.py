@@ -0,0 +1,336 @@
+# 磁盘空间预算
+# 统计克隆目录、镜像和结果缓存各自占用的空间，超过高水位时按最后使用时间（LRU）淘汰，直到低于低水位；
+# 可用空间不足时新的克隆先等待后台释放空间，仍然不足则拒绝。
+# 淘汰只是把条目改名移到同一目录下的 .trash 中，实际删除在后台线程进行，不增加请求的耗时。
+# 用量每隔 SWEEP_INTERVAL 秒完整扫描一次；两次扫描之间淘汰的条目按扫描时记录的大小从用量中扣除。
+import os
+import shutil
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+TRASH_DIR = '.trash'
+# 后台完整扫描的间隔（秒）
+SWEEP_INTERVAL = 60
+# 可用空间不足时重新检查的间隔（秒）
+ADMIT_POLL_INTERVAL = 2
+
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def path_size(path):
+    """文件或目录实际占用的字节数（按分配的块计算），不存在时为 0"""
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return 0
+    size = getattr(st, 'st_blocks', 0) * 512 or st.st_size
+    if not os.path.isdir(path) or os.path.islink(path):
+        return size
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                size += path_size(entry.path)
+    except OSError:
+        pass
+    return size
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return 0
+
+
+def child_dirs(suffix=''):
+    """条目为根目录下的每个子目录（可按后缀过滤）"""
+    def list_entries(root):
+        try:
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    if entry.name != TRASH_DIR and entry.name.endswith(suffix) and entry.is_dir(follow_symlinks=False):
+                        yield (entry.path,), path_size(entry.path), _mtime(entry.path)
+        except OSError:
+            return
+    return list_entries
+
+
+def bucket_files(suffix, companions=()):
+    """条目为两级目录（xx/xxxx.json）中的文件，companions 为同名的附属文件后缀，一起计算和淘汰"""
+    def list_entries(root):
+        try:
+            buckets = [entry.path for entry in os.scandir(root) if len(entry.name) == 2 and entry.is_dir()]
+        except OSError:
+            return
+        for bucket in buckets:
+            try:
+                names = os.listdir(bucket)
+            except OSError:
+                continue
+            for name in names:
+                if not name.endswith(suffix):
+                    continue
+                path = os.path.join(bucket, name)
+                paths = (path,) + tuple(path[:-len(suffix)] + extra for extra in companions)
+                yield paths, sum(path_size(p) for p in paths), _mtime(path)
+    return list_entries
+
+
+class DiskArea:
+    """预算管理的一个目录
+
+    list_entries(root) 产出 (路径元组, 字节数, 最后使用时间)；
+    min_idle 秒内使用过的条目不淘汰（例如正在进行的克隆），
+    max_idle 秒未使用的条目无论是否超出预算都淘汰（例如 worker 崩溃后遗留的克隆）；
+    guard(path) 返回非阻塞的锁，获取失败（BlockingIOError）说明条目正在使用
+    """
+
+    def __init__(self, name, root, list_entries, min_idle=0, max_idle=0, guard=None):
+        self.name = name
+        self.root = root
+        self.list_entries = list_entries
+        self.min_idle = min_idle
+        self.max_idle = max_idle
+        self.guard = guard
+
+
+class DiskBudget:
+    """所有目录的空间预算和后台删除
+
+    用量超过 max_bytes * high 或可用空间低于 min_free_bytes 时开始淘汰，淘汰到 max_bytes * low 以下；
+    fixed_paths 计入用量但不淘汰（例如 blob 缓存数据库）
+    """
+
+    def __init__(self, areas, max_bytes, high=0.9, low=0.75, min_free_bytes=1024 ** 3, fixed_paths=()):
+        self.areas = areas
+        self.max_bytes = max_bytes
+        self.high = high
+        self.low = low
+        self.min_free_bytes = min_free_bytes
+        self.fixed_paths = fixed_paths
+        self.usage = {}
+        self.evicted = 0
+        self.last_sweep = None
+        # 上次扫描时各条目的 (目录名, 字节数)，淘汰时据此扣除用量，不需要重新扫描
+        self._sizes = {}
+        self._sweep_requested = False
+        self._wake = threading.Event()
+        self._swept = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, areas, fixed_paths=()):
+        """从环境变量读取预算（DISK_BUDGET_GB / DISK_MIN_FREE_MB / DISK_HIGH_WATERMARK / DISK_LOW_WATERMARK）"""
+        return cls(areas,
+                   max_bytes=int(_env_float('DISK_BUDGET_GB', 20) * 1024 ** 3),
+                   high=_env_float('DISK_HIGH_WATERMARK', 0.9),
+                   low=_env_float('DISK_LOW_WATERMARK', 0.75),
+                   min_free_bytes=int(_env_float('DISK_MIN_FREE_MB', 1024) * 1024 ** 2),
+                   fixed_paths=fixed_paths)
+
+    def free_bytes(self):
+        """各目录所在文件系统中最少的可用空间"""
+        free = None
+        for area in self.areas:
+            path = area.root
+            while path and not os.path.exists(path):
+                path = os.path.dirname(path)
+            try:
+                available = shutil.disk_usage(path or '.').free
+            except OSError:
+                continue
+            free = available if free is None else min(free, available)
+        return free if free is not None else 0
+
+    def _ensure_thread(self):
+        """在当前进程中启动后台线程（gunicorn 预加载时 master 中的线程不会带到 worker）"""
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._wake = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='disk-budget', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        next_sweep = time.monotonic() + SWEEP_INTERVAL
+        while True:
+            self._wake.wait(max(0, next_sweep - time.monotonic()))
+            self._wake.clear()
+            if not self._sweep_requested and time.monotonic() < next_sweep:
+                # discard 唤醒：只清空回收目录
+                self._empty_trash()
+                continue
+            self._sweep_requested = False
+            next_sweep = time.monotonic() + SWEEP_INTERVAL
+            try:
+                swept = self.sweep()
+            except Exception as e:
+                print(f"磁盘空间检查失败: {e}")
+                swept = False
+            if swept:
+                with self._swept:
+                    self._swept.notify_all()
+
+    def discard(self, path):
+        """移到回收目录，由后台线程删除；上次扫描计入的大小从用量中扣除"""
+        if self._move_to_trash(os.path.dirname(path), path):
+            self._forget(path)
+            self._ensure_thread()
+            self._wake.set()
+
+    def _forget(self, path):
+        name, size = self._sizes.pop(path, (None, 0))
+        if name is not None:
+            self.usage[name] = max(0, self.usage.get(name, 0) - size)
+
+    def admit(self, timeout=30):
+        """新的克隆或镜像前调用：可用空间不足时唤醒后台淘汰并等待，最多 timeout 秒；仍然不足返回 False
+
+        每隔 ADMIT_POLL_INTERVAL 秒请求一次淘汰：淘汰完成后立即重新检查，仍然不足（或其他 worker 正在淘汰、
+        本进程的扫描直接跳过）时等到间隔结束再请求，不连续重复扫描
+        """
+        self._ensure_thread()
+        deadline = time.monotonic() + timeout
+        while self.free_bytes() < self.min_free_bytes:
+            now = time.monotonic()
+            if now >= deadline:
+                print(f"磁盘可用空间不足: {self.free_bytes() // 1024 ** 2} MB")
+                return False
+            next_request = min(deadline, now + ADMIT_POLL_INTERVAL)
+            self._sweep_requested = True
+            self._wake.set()
+            with self._swept:
+                self._swept.wait(next_request - now)
+            if self.free_bytes() < self.min_free_bytes:
+                time.sleep(max(0, next_request - time.monotonic()))
+        return True
+
+    @staticmethod
+    def _move_to_trash(root, path):
+        trash = os.path.join(root, TRASH_DIR)
+        try:
+            os.makedirs(trash, exist_ok=True)
+            os.rename(path, os.path.join(trash, uuid.uuid4().hex))
+            return True
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            print(f"移到回收目录失败 {path}: {e}")
+            return False
+
+    def _evict(self, area, paths):
+        """淘汰一个条目，条目正在使用时返回 False"""
+        if area.guard is None:
+            return any([self._move_to_trash(os.path.dirname(p), p) for p in paths if os.path.exists(p)])
+        try:
+            with area.guard(paths[0]):
+                return any([self._move_to_trash(os.path.dirname(p), p) for p in paths if os.path.exists(p)])
+        except BlockingIOError:
+            return False
+
+    def _sweep_lock(self):
+        """同一时间只有一个 worker 执行淘汰，返回锁文件，未获得锁时返回 None"""
+        if fcntl is None:
+            return True
+        root = self.areas[0].root
+        os.makedirs(root, exist_ok=True)
+        lock_file = open(os.path.join(root, '.disk-budget.lock'), 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def sweep(self):
+        """统计用量，淘汰过期条目和超出预算的条目，然后清空回收目录
+
+        其他 worker 正在执行时直接返回 False
+        """
+        lock_file = self._sweep_lock()
+        if lock_file is None:
+            return False
+        try:
+            started = time.time()
+            now = time.time()
+            usage = {}
+            sizes = {}
+            candidates = []
+            for area in self.areas:
+                total = 0
+                for paths, size, last_used in area.list_entries(area.root):
+                    idle = now - last_used
+                    if area.max_idle and idle > area.max_idle and self._evict(area, paths):
+                        self.evicted += 1
+                        continue
+                    total += size
+                    sizes[paths[0]] = (area.name, size)
+                    if idle >= area.min_idle:
+                        candidates.append((last_used, size, area, paths))
+                usage[area.name] = total
+            usage['fixed'] = sum(path_size(p) for p in self.fixed_paths)
+            used = sum(usage.values())
+
+            free = self.free_bytes()
+            if used > self.max_bytes * self.high or free < self.min_free_bytes:
+                target = self.max_bytes * self.low
+                freed = 0
+                for last_used, size, area, paths in sorted(candidates, key=lambda item: item[0]):
+                    if used - freed <= target and free + freed >= self.min_free_bytes:
+                        break
+                    if self._evict(area, paths):
+                        freed += size
+                        usage[area.name] -= size
+                        sizes.pop(paths[0], None)
+                        self.evicted += 1
+                print(f"磁盘预算: 已用 {used // 1024 ** 2} MB, 淘汰 {freed // 1024 ** 2} MB")
+
+            self._empty_trash()
+            self.usage = usage
+            self._sizes = sizes
+            self.last_sweep = {'at': now, 'seconds': round(time.time() - started, 3)}
+        finally:
+            if lock_file is not True:
+                lock_file.close()
+        return True
+
+    def _empty_trash(self):
+        for area in self.areas:
+            trash = os.path.join(area.root, TRASH_DIR)
+            try:
+                names = os.listdir(trash)
+            except OSError:
+                continue
+            for name in names:
+                path = os.path.join(trash, name)
+                if os.path.isdir(path) and not os.path.islink(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    def stats(self):
+        return {
+            'usage': dict(self.usage),
+            'maxBytes': self.max_bytes,
+            'freeBytes': self.free_bytes(),
+            'minFreeBytes': self.min_free_bytes,
+            'evicted': self.evicted,
+            'lastSweep': self.last_sweep
+        }
@@ -0,0 +1,11 @@
+# 统计引擎
+# 克隆、遍历和统计仓库的全部逻辑，不依赖 Flask、CORS 和 i18n，
+# 服务器（app.py）和命令行工具（cli.py）共用同一套实现和缓存格式
+from .files import (BINARY_EXTENSIONS, MAX_TEXT_FILE_SIZE, is_text_file, read_text_sample, is_binary_name,
+                    count_lines_in_file, count_file_lines, analyze_file_content, open_file_buffer,
+                    iter_repository_files)
+from .git import is_valid_ref, probe_git, clone_repository, resolve_remote_sha, resolve_ref_path
+from .settings import ANALYZER_VERSION, analyzer_profile
+from .stats import (SLOWEST_FILES_COUNT, new_stats, thaw_stats, add_file_to_stats, finalize_stats,
+                    analyze_repository_stats, analyze_repository_limited, analyze_archive_stream,
+                    is_cacheable, summarize_stats, save_stats)
@@ -0,0 +1,245 @@
+# 文件级统计
+# 二进制和文本判断、读取文件缓冲、语言识别和行数统计，以及检出目录的遍历
+import io
+import mmap
+import os
+from contextlib import contextmanager
+
+import lfs
+from languages import detect_language
+from line_counter import count_line_breakdown
+
+# 二进制文件扩展名和魔数标识
+BINARY_EXTENSIONS = {
+    '.exe', '.dll', '.so', '.dylib', '.a', '.lib', '.obj', '.o',
+    '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.ico', '.webp',
+    '.mp3', '.wav', '.flac', '.aac', '.ogg', '.mp4', '.avi', '.mkv', '.mov',
+    '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx',
+    '.zip', '.tar', '.gz', '.bz2', '.xz', '.7z', '.rar',
+    '.bin', '.dat', '.db', '.sqlite', '.sqlite3',
+    '.ttf', '.otf', '.woff', '.woff2', '.eot',
+    '.pyc', '.pyo', '.class', '.jar', '.war'
+}
+
+# 文本文件大小上限，超过的文件不统计
+MAX_TEXT_FILE_SIZE = 10 * 1024 * 1024
+# 超过该大小的文件使用mmap读取，更小的文件直接整体读入
+MMAP_THRESHOLD = 1024 * 1024
+
+# 文本判断：读取的样本大小、NULL 字节和控制字符比例上限、解码后可打印字符比例下限、尝试的编码
+TEXT_SAMPLE_SIZE = 8192
+MAX_NULL_RATIO = 0.01
+MAX_CONTROL_RATIO = 0.02
+MIN_PRINTABLE_RATIO = 0.85
+TEXT_ENCODINGS = ['utf-8', 'gbk', 'gb2312', 'latin-1', 'cp1252']
+
+# 常见的二进制文件魔数
+BINARY_SIGNATURES = [
+    b'\x89PNG',  # PNG
+    b'\xff\xd8\xff',  # JPEG
+    b'GIF8',  # GIF
+    b'\x00\x00\x01\x00',  # ICO
+    b'BM',  # BMP
+    b'PK\x03\x04',  # ZIP
+    b'\x1f\x8b',  # GZIP
+    b'\x7fELF',  # ELF
+    b'MZ',  # Windows executable
+    b'\xca\xfe\xba\xbe',  # Java class
+    b'%PDF',  # PDF
+]
+
+def is_text_file(file_path):
+    """
+    使用多种方法智能判断文件是否为文本文件
+    包括扩展名、魔数、字符编码等检测方法
+    """
+    return read_text_sample(file_path) is not None
+
+def read_text_sample(file_path):
+    """
+    判断文件是否为文本文件，是则返回读取的开头样本（最多8KB），否则返回None
+    样本同时用于语言识别（shebang、内容启发式）
+    """
+    try:
+        print(f"[DEBUG] Checking file: {file_path}")
+        # 快速检查：文件大小限制
+        file_size = os.path.getsize(file_path)
+        if file_size == 0:  # 空文件
+            print(f"[DEBUG] {file_path}: Skipped - empty file")
+            return None
+        if file_size > MAX_TEXT_FILE_SIZE:  # 超过10MB跳过
+            print(f"[DEBUG] {file_path}: Skipped - too large ({file_size} bytes)")
+            return None
+            
+        # 快速检查：扩展名黑名单
+        _, ext = os.path.splitext(file_path)
+        if ext.lower() in BINARY_EXTENSIONS:
+            print(f"[DEBUG] {file_path}: Skipped - binary extension ({ext})")
+            return None
+        
+        # 读取文件内容进行深度检测
+        sample_size = min(TEXT_SAMPLE_SIZE, file_size)  # 读取8KB或整个文件
+        with open(file_path, 'rb') as f:
+            chunk = f.read(sample_size)
+        
+        result = _looks_like_text(chunk)
+        print(f"[DEBUG] {file_path}: Final result = {result}")
+        return chunk if result else None
+            
+    except Exception as e:
+        print(f"[DEBUG] {file_path}: Exception occurred - {e}")
+        return None
+
+def is_binary_name(file_name):
+    """根据扩展名快速判断是否为已知的二进制文件"""
+    _, ext = os.path.splitext(file_name)
+    return ext.lower() in BINARY_EXTENSIONS
+
+def _looks_like_text(chunk):
+    """根据文件开头的样本内容判断是否为文本"""
+    # 1. 检查二进制文件魔数标识
+    for signature in BINARY_SIGNATURES:
+        if chunk.startswith(signature):
+            return False
+    
+    # 2. 检查NULL字节（二进制文件的明显特征）
+    null_count = chunk.count(b'\x00')
+    if null_count > 0:
+        # 允许少量NULL字节（有些文本文件可能包含）
+        null_ratio = null_count / len(chunk)
+        if null_ratio > MAX_NULL_RATIO:  # 超过1%的NULL字节就认为是二进制
+            return False
+    
+    # 3. 检查不可打印控制字符（除了常见的换行符等）
+    control_chars = 0
+    printable_controls = {0x09, 0x0A, 0x0D}  # Tab, LF, CR
+    for byte in chunk:
+        if byte < 32 and byte not in printable_controls:
+            control_chars += 1
+    
+    if len(chunk) > 0 and control_chars / len(chunk) > MAX_CONTROL_RATIO:  # 超过2%控制字符
+        return False
+    
+    # 4. 尝试使用常见编码解码文件
+    for encoding in TEXT_ENCODINGS:
+        try:
+            decoded_text = chunk.decode(encoding)
+            
+            # 检查解码后的文本质量
+            if _is_reasonable_text(decoded_text):
+                return True
+                
+        except (UnicodeDecodeError, UnicodeError):
+            continue
+    
+    return False
+
+def _is_reasonable_text(text):
+    """
+    检查解码后的文本是否合理
+    """
+    if not text:
+        return False
+    
+    # 检查文本中可打印字符的比例
+    printable_chars = 0
+    for char in text:
+        # 字母、数字、标点、空格、换行符等
+        if char.isprintable() or char in '\t\n\r\f\v':
+            printable_chars += 1
+    
+    printable_ratio = printable_chars / len(text)
+    
+    # 要求至少85%的字符是可打印的
+    return printable_ratio >= MIN_PRINTABLE_RATIO
+
+def count_lines_in_file(file_path):
+    """统计单个文件的行数"""
+    return count_file_lines(file_path)['lines']
+
+def count_file_lines(file_path, language=None):
+    """统计单个文件的总行数、代码行、注释行和空行，只读取一次文件"""
+    try:
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            return count_line_breakdown(f, language)
+    except Exception:
+        return {'lines': 0, 'code': 0, 'comment': 0, 'blank': 0}
+
+def analyze_file_content(file_name, data):
+    """统计内存中的文件内容（磁盘文件的读取缓冲、git blob、压缩包成员等）
+
+    data 可以是 bytes 或 mmap，同一个缓冲同时用于文本判断、语言识别、行数统计和大小。
+    不是文本文件或为空时返回None
+    """
+    file_size = len(data)
+    if file_size == 0 or file_size > MAX_TEXT_FILE_SIZE:
+        return None
+    if is_binary_name(file_name):
+        return None
+    # LFS 指针只是占位的小文本，不按文本文件统计
+    if file_size < lfs.MAX_POINTER_SIZE and lfs.parse_pointer(data):
+        return None
+    
+    sample = data[:TEXT_SAMPLE_SIZE]
+    if not _looks_like_text(sample):
+        return None
+    
+    language = detect_language(file_name, sample)
+    # newline=None 与 open() 的文本模式一致，\r\n 和 \r 都视为换行
+    text = io.StringIO(str(data, 'utf-8', 'ignore'), newline=None)
+    counts = count_line_breakdown(text, language)
+    if counts['lines'] == 0:
+        return None
+    
+    _, ext = os.path.splitext(file_name)
+    counts.update({
+        'file_type': ext if ext else '无扩展名',
+        'language': language,
+        'size': file_size
+    })
+    return counts
+
+@contextmanager
+def open_file_buffer(file_path, file_size):
+    """只打开一次文件，小文件整体读入，大文件使用mmap映射"""
+    with open(file_path, 'rb') as f:
+        if file_size < MMAP_THRESHOLD:
+            yield f.read()
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+def iter_repository_files(repo_path, exclusion_rules, enter_dir=None):
+    """使用 os.scandir 遍历仓库，产出 (相对路径, 文件名, 完整路径, 文件大小)
+
+    文件大小来自 DirEntry.stat()，不再单独调用 getsize；被排除的目录不会进入，符号链接不跟随。
+    enter_dir(相对路径) 返回 False 的子目录也不会进入（已由调用方处理，例如从子树缓存嫁接）
+    """
+    stack = [('', repo_path)]
+    while stack:
+        prefix, directory = stack.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError as e:
+            print(f"无法读取目录 {directory}: {e}")
+            continue
+        
+        subdirs = []
+        for entry in sorted(entries, key=lambda e: e.name):
+            relative_path = prefix + entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    # 按排除规则剪枝，被排除的目录不会再被遍历
+                    if exclusion_rules.is_excluded(relative_path, is_dir=True):
+                        continue
+                    if enter_dir is None or enter_dir(relative_path):
+                        subdirs.append((relative_path + '/', entry.path))
+                elif entry.is_file(follow_symlinks=False):
+                    # 跳过被排除的文件（压缩文件、锁文件、vendored/generated 等）
+                    if not exclusion_rules.is_excluded(relative_path):
+                        yield relative_path, entry.name, entry.path, entry.stat(follow_symlinks=False).st_size
+            except OSError as e:
+                print(f"无法读取 {entry.path}: {e}")
+        
+        # 逆序入栈，保证按名称顺序遍历
+        stack.extend(reversed(subdirs))
@@ -0,0 +1,167 @@
+# Git 操作
+# 检查 Git 是否可用、浅克隆指定引用，以及通过 ls-remote 把分支或标签解析为提交SHA
+import os
+import re
+import shutil
+import subprocess
+
+from mirrors import is_valid_ref
+
+_git_probe = None
+
+def probe_git():
+    """检查Git是否可用，返回 (是否可用, 版本或错误信息)，结果只计算一次"""
+    global _git_probe
+    if _git_probe is None:
+        env = os.environ.copy()
+        if '/mingw64/bin' not in env.get('PATH', ''):
+            env['PATH'] = '/mingw64/bin:' + env.get('PATH', '')
+        try:
+            git_version = subprocess.run(['git', '--version'],
+                                         capture_output=True, text=True, timeout=10,
+                                         env=env)
+            if git_version.returncode == 0:
+                _git_probe = (True, git_version.stdout.strip())
+            else:
+                _git_probe = (False, git_version.stderr.strip())
+        except Exception as e:
+            # 异常不缓存，下次再试
+            return False, f"Git检查异常: {str(e)}"
+        print(f"Git检查: {_git_probe[1]}")
+    return _git_probe
+
+def clone_repository(repo_url, target_dir, ref=None):
+    """克隆仓库到指定目录，ref 为分支、标签或提交SHA（为空时克隆默认分支）"""
+    try:
+        print(f"开始克隆仓库: {repo_url} -> {target_dir}")
+        import sys
+        sys.stdout.flush()
+        
+        # 设置环境变量确保Git可用
+        env = os.environ.copy()
+        if '/mingw64/bin' not in env.get('PATH', ''):
+            env['PATH'] = '/mingw64/bin:' + env.get('PATH', '')
+        
+        # 确保目标目录不存在
+        if os.path.exists(target_dir):
+            print(f"删除已存在的目录: {target_dir}")
+            shutil.rmtree(target_dir)
+        
+        # 创建父目录
+        parent_dir = os.path.dirname(target_dir)
+        print(f"创建父目录: {parent_dir}")
+        os.makedirs(parent_dir, exist_ok=True)
+        
+        if ref and not is_valid_ref(ref):
+            return False, f"无效的引用: {ref}"
+        
+        # 简化Git检查 - 直接尝试使用git
+        git_cmd = 'git'
+        
+        # Git检查结果在启动时缓存，不再每次克隆都执行 git --version
+        git_ok, git_message = probe_git()
+        if not git_ok:
+            print(f"Git检查失败: {git_message}")
+            return False, f"Git检查失败: {git_message}"
+        
+        # 使用浅克隆减少下载时间
+        if ref and re.fullmatch(r'[0-9a-f]{40}', ref):
+            # clone --branch 不支持提交SHA，先克隆空仓库再只拉取该提交
+            cmd = [git_cmd, 'clone', '--depth', '1', '--no-checkout', '--end-of-options', repo_url, target_dir]
+        elif ref:
+            cmd = [git_cmd, 'clone', '--depth', '1', '--branch', ref, '--end-of-options', repo_url, target_dir]
+        else:
+            cmd = [git_cmd, 'clone', '--depth', '1', '--end-of-options', repo_url, target_dir]
+        print(f"执行命令: {' '.join(cmd)}")
+        
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300, 
+                              encoding='utf-8', errors='ignore', env=env)
+        if result.returncode == 0 and ref and '--no-checkout' in cmd:
+            for step in (['fetch', '--depth', '1', '--end-of-options', 'origin', ref], ['checkout', '-q', ref, '--']):
+                result = subprocess.run([git_cmd] + step, cwd=target_dir, capture_output=True, text=True,
+                                        timeout=300, encoding='utf-8', errors='ignore', env=env)
+                if result.returncode != 0:
+                    break
+        
+        print(f"Git clone 返回码: {result.returncode}")
+        if result.stdout:
+            print(f"Git clone 标准输出: {result.stdout}")
+        if result.stderr:
+            print(f"Git clone 错误输出: {result.stderr}")
+        
+        if result.returncode == 0:
+            print(f"克隆成功，目录大小: {len(os.listdir(target_dir)) if os.path.exists(target_dir) else 0} 项")
+            return True, "克隆成功"
+        else:
+            error_msg = result.stderr.strip() if result.stderr.strip() else "未知错误"
+            print(f"克隆失败: {error_msg}")
+            return False, f"克隆失败: {error_msg}"
+            
+    except subprocess.TimeoutExpired:
+        print("克隆超时")
+        return False, "克隆超时"
+    except Exception as e:
+        print(f"克隆异常: {str(e)}")
+        return False, f"克隆异常: {str(e)}"
+
+def resolve_remote_sha(repo_url, ref=None):
+    """通过 git ls-remote 获取远程引用（默认分支、分支或标签）对应的提交SHA，失败返回None
+
+    完整的提交SHA直接返回；同名时优先分支，附注标签取其指向的提交
+    """
+    ref = ref or 'HEAD'
+    if re.fullmatch(r'[0-9a-f]{40}', ref):
+        return ref
+    if not is_valid_ref(ref):
+        print(f"无效的引用: {ref}")
+        return None
+    try:
+        # 附注标签需要单独匹配 ^{} 才会返回其指向的提交
+        result = subprocess.run(['git', 'ls-remote', '--end-of-options', repo_url, ref, ref + '^{}'],
+                                capture_output=True, text=True, timeout=30,
+                                encoding='utf-8', errors='ignore')
+        if result.returncode == 0 and result.stdout.strip():
+            refs = dict(reversed(line.split('\t', 1)) for line in result.stdout.splitlines() if '\t' in line)
+            # 只接受完全相同的引用名：ls-remote 按尾部匹配，main 也会匹配 refs/heads/feature/main
+            for name in (f'refs/heads/{ref}', f'refs/tags/{ref}^{{}}', f'refs/tags/{ref}'):
+                if name in refs:
+                    return refs[name]
+            if ref == 'HEAD' or ref.startswith('refs/'):
+                return refs.get(f'{ref}^{{}}') or refs.get(ref)
+        print(f"ls-remote 失败: {result.stderr.strip() if result.returncode else '引用不存在'}")
+    except Exception as e:
+        print(f"ls-remote 异常: {e}")
+    return None
+
+# 页面路径中最多尝试的前缀段数
+MAX_REF_PATH_SEGMENTS = 20
+
+def resolve_ref_path(repo_url, path):
+    """从页面路径（tree/ 或 blob/ 之后的部分，例如 feature/x/src/app.py）中找出最长的已有分支或标签名
+
+    分支名可以含 /，无法单从URL区分分支和目录，因此用一次 ls-remote 查询所有前缀，返回最长的匹配，
+    没有匹配时返回 None；单段路径和完整的提交SHA直接返回
+    """
+    segments = [segment for segment in path.strip('/').split('/') if segment]
+    if not segments or segments[0].startswith('-'):
+        return None
+    if len(segments) == 1:
+        return segments[0]
+    prefixes = ['/'.join(segments[:count])
+                for count in range(min(len(segments), MAX_REF_PATH_SEGMENTS), 0, -1)]
+    patterns = [pattern for prefix in prefixes for pattern in (f'refs/heads/{prefix}', f'refs/tags/{prefix}')]
+    try:
+        result = subprocess.run(['git', 'ls-remote', '--end-of-options', repo_url] + patterns,
+                                capture_output=True, text=True, timeout=30,
+                                encoding='utf-8', errors='ignore')
+        if result.returncode == 0:
+            names = {line.split('\t', 1)[1] for line in result.stdout.splitlines() if '\t' in line}
+            for prefix in prefixes:
+                if f'refs/heads/{prefix}' in names or f'refs/tags/{prefix}' in names:
+                    return prefix
+            print(f"页面路径中没有已有的引用: {path}")
+        else:
+            print(f"ls-remote 失败: {result.stderr.strip()}")
+    except Exception as e:
+        print(f"ls-remote 异常: {e}")
+    return None
@@ -0,0 +1,32 @@
+# 统计配置的版本
+# 影响统计结果的全部配置汇总为 analyzer_profile，服务器和命令行工具写入的缓存条目使用同一个 profile
+import lfs
+from analyzer_profile import AnalyzerProfile
+from exclusions import DEFAULT_EXCLUDE_PATTERNS, LINGUIST_ATTRIBUTES
+from languages import EXTENSION_LANGUAGES, FILENAME_LANGUAGES, SHEBANG_LANGUAGES, AMBIGUOUS_EXTENSIONS
+from line_counter import COMMENT_SYNTAX
+from .files import (BINARY_EXTENSIONS, BINARY_SIGNATURES, MAX_TEXT_FILE_SIZE, TEXT_SAMPLE_SIZE,
+                    MAX_NULL_RATIO, MAX_CONTROL_RATIO, MIN_PRINTABLE_RATIO, TEXT_ENCODINGS)
+
+# 统计逻辑的版本，统计代码的行为变化时递增；配置的变化由 analyzer_profile 的哈希自动反映
+ANALYZER_VERSION = '2'
+
+# 影响统计结果的全部配置，哈希后作为缓存条目和 ETag 的 profile
+analyzer_profile = AnalyzerProfile(ANALYZER_VERSION, {
+    'binary_extensions': BINARY_EXTENSIONS,
+    'binary_signatures': BINARY_SIGNATURES,
+    'max_text_file_size': MAX_TEXT_FILE_SIZE,
+    'text_sample_size': TEXT_SAMPLE_SIZE,
+    'max_null_ratio': MAX_NULL_RATIO,
+    'max_control_ratio': MAX_CONTROL_RATIO,
+    'min_printable_ratio': MIN_PRINTABLE_RATIO,
+    'text_encodings': TEXT_ENCODINGS,
+    'default_exclude_patterns': DEFAULT_EXCLUDE_PATTERNS,
+    'linguist_attributes': LINGUIST_ATTRIBUTES,
+    'extension_languages': EXTENSION_LANGUAGES,
+    'filename_languages': FILENAME_LANGUAGES,
+    'shebang_languages': SHEBANG_LANGUAGES,
+    'ambiguous_extensions': AMBIGUOUS_EXTENSIONS,
+    'comment_syntax': COMMENT_SYNTAX,
+    'lfs_max_pointer_size': lfs.MAX_POINTER_SIZE
+})
@@ -0,0 +1,316 @@
+# 仓库统计
+# 统计结果的结构和累加；遍历检出目录或压缩包统计，可以在资源受限的子进程中执行
+import heapq
+import os
+import time
+from collections import defaultdict
+
+import archive
+import export
+import lfs
+import profiling
+from exclusions import ExclusionRules
+from sandbox import JobLimits, JobBudget, run_limited, report_progress
+from subtrees import SubtreeCache, read_tree_shas
+from .files import MAX_TEXT_FILE_SIZE, analyze_file_content, is_binary_name, iter_repository_files, open_file_buffer
+
+# 每次统计记录的最慢文件数量
+SLOWEST_FILES_COUNT = 10
+
+def new_stats():
+    """创建空的统计结果"""
+    return {
+        'total_lines': 0,
+        'total_files': 0,
+        'code_lines': 0,
+        'comment_lines': 0,
+        'blank_lines': 0,
+        'file_stats': {},
+        'folder_stats': {},
+        'file_type_stats': defaultdict(int),
+        'language_stats': defaultdict(int),
+        'language_line_stats': {},
+        # Git LFS 指针文件 {路径: {'oid', 'size'}}，不计入行数
+        'lfs_files': {},
+        # 包含子模块时每个子模块的统计摘要
+        'submodules': [],
+        # 超出资源限制时为 {'reason', 'limit', 'files', 'bytes'}，结果只包含部分文件
+        'truncated': None,
+        # 读取和统计最慢的文件 [{'path', 'ms', 'size'}]，用于排查慢仓库
+        'slowest_files': []
+    }
+
+def thaw_stats(stats):
+    """从缓存读出的统计结果恢复为可继续累加的结构"""
+    stats['file_type_stats'] = defaultdict(int, stats['file_type_stats'])
+    stats['language_stats'] = defaultdict(int, stats['language_stats'])
+    stats.setdefault('lfs_files', {})
+    stats.setdefault('submodules', [])
+    stats.setdefault('truncated', None)
+    stats.setdefault('slowest_files', [])
+    return stats
+
+def add_file_to_stats(stats, relative_path, file_info):
+    """将单个文件的统计累加到结果中
+
+    file_info 包含 lines/code/comment/blank/file_type/language/size
+    """
+    lines = file_info['lines']
+    language = file_info['language']
+    file_type = file_info['file_type']
+    
+    stats['total_lines'] += lines
+    stats['total_files'] += 1
+    stats['code_lines'] += file_info['code']
+    stats['comment_lines'] += file_info['comment']
+    stats['blank_lines'] += file_info['blank']
+    
+    # 记录文件统计
+    stats['file_stats'][relative_path] = {
+        'lines': lines,
+        'code': file_info['code'],
+        'comment': file_info['comment'],
+        'blank': file_info['blank'],
+        'file_type': file_type,
+        'language': language,
+        'size': file_info['size']
+    }
+    
+    # 文件类型统计（用于显示分布）
+    stats['file_type_stats'][file_type] += lines
+    stats['language_stats'][language] += lines
+    language_info = stats['language_line_stats'].setdefault(
+        language, {'lines': 0, 'code': 0, 'comment': 0, 'blank': 0})
+    for key in language_info:
+        language_info[key] += file_info[key]
+    
+    # 文件夹统计 - 累加到所有父级文件夹
+    folder = os.path.dirname(relative_path) or '.'
+    
+    # 创建所有父级文件夹的路径列表
+    folder_paths = []
+    current_path = folder
+    while current_path and current_path != '.':
+        folder_paths.append(current_path)
+        parent = os.path.dirname(current_path)
+        if parent == current_path:  # 到达根目录
+            break
+        current_path = parent
+    
+    # 添加根目录
+    folder_paths.append('.')
+    
+    # 将文件统计累加到所有父级文件夹
+    for folder_path in folder_paths:
+        if folder_path not in stats['folder_stats']:
+            stats['folder_stats'][folder_path] = {'lines': 0, 'files': 0, 'code': 0, 'comment': 0, 'blank': 0}
+        folder_info = stats['folder_stats'][folder_path]
+        folder_info['lines'] += lines
+        folder_info['files'] += 1
+        folder_info['code'] += file_info['code']
+        folder_info['comment'] += file_info['comment']
+        folder_info['blank'] += file_info['blank']
+
+def finalize_stats(stats):
+    """计算各文件和文件夹的百分比"""
+    if stats['total_lines'] > 0:
+        for file_path, file_info in stats['file_stats'].items():
+            file_info['percentage'] = (file_info['lines'] / stats['total_lines']) * 100
+        
+        for folder_path, folder_info in stats['folder_stats'].items():
+            folder_info['percentage'] = (folder_info['lines'] / stats['total_lines']) * 100
+    
+    return stats
+
+def analyze_repository_stats(repo_path, exclusion_rules=None, budget=None, stats=None, tree_store=None):
+    """分析仓库结构和代码行数
+
+    exclusion_rules 为空时使用默认规则和仓库的 .gitattributes；
+    budget 超出限制时停止遍历，返回已统计的部分结果并设置 truncated。
+    仓库是 git 检出且提供了 tree_store（BlobCache）时，tree SHA 已缓存的目录直接嫁接统计结果，不再遍历
+    """
+    if exclusion_rules is None:
+        exclusion_rules = ExclusionRules.for_repository(repo_path)
+    if stats is None:
+        stats = new_stats()
+    
+    trees = read_tree_shas(repo_path) if tree_store is not None else {}
+    subtrees = SubtreeCache(tree_store, exclusion_rules, trees)
+    walked = set()
+    
+    def enter_dir(relative_dir):
+        if subtrees.try_graft(stats, relative_dir):
+            return False
+        walked.add(relative_dir)
+        return True
+    
+    # 最慢的 SLOWEST_FILES_COUNT 个文件（小顶堆）
+    slowest = []
+    files = iter_repository_files(repo_path, exclusion_rules, enter_dir) if enter_dir('') else ()
+    for relative_path, file_name, file_path, file_size in files:
+        # 不打开文件即可排除的情况：空文件、超大文件、二进制扩展名
+        # （小于 1KB 的二进制扩展名文件可能是 LFS 指针，仍然读取）
+        might_be_pointer = file_size < lfs.MAX_POINTER_SIZE
+        skipped = (file_size == 0 or file_size > MAX_TEXT_FILE_SIZE
+                   or (is_binary_name(file_name) and not might_be_pointer))
+        
+        # 跳过的文件也计入文件数，避免大量小文件拖住遍历
+        if budget is not None:
+            reason = budget.charge(0 if skipped else file_size)
+            if reason:
+                print(f"超出资源限制 ({reason})，返回部分结果: {budget.files} 个文件, {budget.bytes} 字节")
+                stats['truncated'] = budget.truncation(reason)
+                break
+            if budget.checkpoint_due():
+                # 子进程被杀掉时父进程返回这里统计到的部分
+                report_progress((stats, budget.usage()))
+        
+        if skipped:
+            continue
+        
+        # 只统计文本文件：每个文件只打开一次，同一个缓冲用于判断、识别和计数
+        started = time.perf_counter()
+        try:
+            with open_file_buffer(file_path, file_size) as buffer:
+                pointer = lfs.parse_pointer(buffer) if might_be_pointer else None
+                file_info = None if pointer else analyze_file_content(file_name, buffer)
+        except (OSError, ValueError) as e:
+            print(f"读取文件失败 {file_path}: {e}")
+            continue
+        item = (time.perf_counter() - started, relative_path, file_size)
+        if len(slowest) < SLOWEST_FILES_COUNT:
+            heapq.heappush(slowest, item)
+        elif item > slowest[0]:
+            heapq.heapreplace(slowest, item)
+        
+        if pointer:  # LFS 指针单独记录，不下载实际对象
+            stats['lfs_files'][relative_path] = pointer
+        elif file_info:  # 只统计非空文本文件
+            add_file_to_stats(stats, relative_path, file_info)
+    
+    stats['slowest_files'] = [{'path': path, 'ms': round(seconds * 1000, 2), 'size': size}
+                              for seconds, path, size in sorted(slowest, reverse=True)]
+    subtrees.record(stats, walked)
+    return finalize_stats(stats)
+
+def analyze_repository_limited(repo_path, limits=None, tree_store=None, budget=None):
+    """在资源受限的子进程中统计仓库，超出限制时返回标记了 truncated 的部分结果
+
+    limits 为空时从环境变量读取；tree_store 见 analyze_repository_stats。
+    budget 为多个仓库共用的 JobBudget（父仓库和它的子模块），子进程中的累计值返回后写回；
+    预算已用完时不再统计，直接返回标记了 truncated 的空结果
+    """
+    if budget is None:
+        budget = JobBudget(limits or JobLimits.from_env())
+    stats = new_stats()
+    if budget.exhausted:
+        stats = finalize_stats(stats)
+        stats['truncated'] = budget.truncation(budget.exhausted)
+        return stats
+    if profiling.active():
+        # 性能分析只能看到当前进程，直接在请求进程中统计（内存上限不生效）
+        return analyze_repository_stats(repo_path, None, budget, stats, tree_store)
+    
+    def analyze_in_child(*args):
+        return analyze_repository_stats(*args), budget.usage()
+    
+    def on_memory_error():
+        # 在子进程中执行：stats 中保留了内存不足之前统计的文件
+        stats['truncated'] = budget.truncation('memory')
+        return finalize_stats(stats), budget.usage()
+    
+    def on_killed(reason, progress):
+        # 子进程没有返回结果，返回它最近一次发送的中间结果；超时后共用预算的其他仓库也不再统计
+        partial = new_stats()
+        if progress is not None:
+            partial, usage = progress
+            budget.restore(usage)
+        if reason == 'time':
+            budget.exhausted = reason
+        partial = finalize_stats(partial)
+        partial['truncated'] = budget.truncation(reason)
+        return partial, budget.usage()
+    
+    result, usage = run_limited(analyze_in_child, (repo_path, None, budget, stats, tree_store),
+                                budget.remaining_limits(), on_memory_error, on_killed)
+    budget.restore(usage)
+    return result
+
+def analyze_archive_stream(stream, archive_format):
+    """统计压缩包中的文件，成员逐个从流中读取，不解压到磁盘
+
+    超出 archive 模块中的限制时抛出 archive.ArchiveLimitError
+    """
+    # 顶级目录未知，流式阶段先用不依赖根目录的默认规则过滤，最后再应用 .gitattributes
+    default_rules = ExclusionRules.from_gitattributes('')
+    
+    def wanted(path, size):
+        file_name = os.path.basename(path)
+        if file_name == '.gitattributes':
+            return True
+        if size == 0 or (is_binary_name(file_name) and size >= lfs.MAX_POINTER_SIZE):
+            return False
+        return not default_rules.is_path_excluded(path)
+    
+    entries = {}
+    pointers = {}
+    attributes = {}
+    for path, data in archive.iter_members(stream, archive_format, wanted):
+        if data is None:
+            continue
+        file_name = os.path.basename(path)
+        if file_name == '.gitattributes':
+            attributes[path] = data.decode('utf-8', errors='ignore')
+        pointer = lfs.parse_pointer(data)
+        if pointer:
+            pointers[path] = pointer
+            continue
+        file_info = analyze_file_content(file_name, data)
+        if file_info:
+            entries[path] = file_info
+    
+    root = archive.common_root(list(entries) + list(pointers) + list(attributes))
+    rules = ExclusionRules.from_gitattributes(attributes.get(root + '.gitattributes', ''))
+    
+    stats = new_stats()
+    for path in sorted(entries):
+        relative_path = path[len(root):]
+        if rules.is_path_excluded(relative_path):
+            continue
+        add_file_to_stats(stats, relative_path, entries[path])
+    for path in sorted(pointers):
+        relative_path = path[len(root):]
+        if not rules.is_path_excluded(relative_path):
+            stats['lfs_files'][relative_path] = pointers[path]
+    return finalize_stats(stats)
+
+def is_cacheable(stats):
+    """文件数、字节数的截断结果是确定的，可以缓存；超时和内存不足与当时的负载有关，不缓存
+
+    旧 profile 的过期结果正在重新统计，也不进入响应缓存和 ETag
+    """
+    if stats.get('stale'):
+        return False
+    truncated = stats.get('truncated')
+    return not truncated or truncated['reason'] in ('files', 'bytes')
+
+def summarize_stats(stats):
+    """/api/stats 返回的统计摘要"""
+    return {
+        'totalLines': stats['total_lines'],
+        'totalFiles': stats['total_files'],
+        'codeLines': stats['code_lines'],
+        'commentLines': stats['comment_lines'],
+        'blankLines': stats['blank_lines'],
+        'lfsFiles': len(stats.get('lfs_files', {})),
+        'lfsBytes': sum(pointer['size'] for pointer in stats.get('lfs_files', {}).values()),
+        'submodules': stats.get('submodules', []),
+        'truncated': stats.get('truncated'),
+        'stale': bool(stats.get('stale')),
+        'slowestFiles': stats.get('slowest_files', [])
+    }
+
+def save_stats(cache, cache_key, stats):
+    """写入统计结果及其逐文件明细（导出时直接逐行读取明细）"""
+    cache.put(cache_key, stats)
+    cache.put_rows(cache_key, export.FILE_COLUMNS, export.file_rows(stats))
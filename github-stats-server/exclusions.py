@@ -0,0 +1,203 @@
+# 统计排除规则
+# 支持 .gitignore 风格的通配符、.gitattributes 中的 linguist-vendored / linguist-generated，
+# 以及服务器端的默认规则。所有规则预编译为一个正则，遍历目录时直接剪枝。
+import hashlib
+import os
+import re
+
+# 服务器端默认排除规则（.gitignore 语法）
+DEFAULT_EXCLUDE_PATTERNS = [
+    # 版本控制和依赖目录（子模块检出中的 .git 是文件）
+    '.git',
+    'node_modules/',
+    '__pycache__/',
+    'bower_components/',
+    'vendor/',
+    'third_party/',
+    'third-party/',
+    # 构建产物
+    'build/',
+    'dist/',
+    'target/',
+    # 压缩和生成的文件
+    '*.min.js',
+    '*.min.css',
+    '*.map',
+    '*.pb.go',
+    '*_pb2.py',
+    # 依赖锁文件
+    'package-lock.json',
+    'yarn.lock',
+    'pnpm-lock.yaml',
+    'Cargo.lock',
+    'poetry.lock',
+    'Pipfile.lock',
+    'Gemfile.lock',
+    'composer.lock',
+    'go.sum',
+]
+
+# .gitattributes 中表示"不计入统计"的属性
+LINGUIST_ATTRIBUTES = ('linguist-vendored', 'linguist-generated')
+
+
+def _translate_pattern(pattern):
+    """将单条 .gitignore 风格的规则转换为正则表达式字符串
+
+    生成的正则匹配相对路径（使用 / 分隔），目录路径以 / 结尾。
+    """
+    dir_only = pattern.endswith('/')
+    pattern = pattern.rstrip('/')
+
+    # 含有 / 的规则相对于仓库根目录，否则匹配任意层级
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+
+    regex = ''
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern[i:i + 3] == '**/':
+                regex += '(?:.*/)?'
+                i += 3
+                continue
+            if pattern[i:i + 2] == '**':
+                regex += '.*'
+                i += 2
+                continue
+            regex += '[^/]*'
+        elif c == '?':
+            regex += '[^/]'
+        elif c == '[':
+            end = pattern.find(']', i + 1)
+            if end == -1:
+                regex += re.escape(c)
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                regex += '[' + body.replace('\\', '\\\\') + ']'
+                i = end
+        else:
+            regex += re.escape(c)
+        i += 1
+
+    prefix = '' if anchored else '(?:.*/)?'
+    # 目录规则只匹配目录；普通规则同时匹配文件和目录
+    suffix = '/' if dir_only else '/?'
+    return prefix + regex + suffix
+
+
+def _compile(patterns):
+    """将多条规则合并为一个预编译的正则，没有规则时返回 None"""
+    if not patterns:
+        return None
+    combined = '|'.join('(?:%s)' % _translate_pattern(p) for p in patterns)
+    return re.compile(combined)
+
+
+def parse_gitattributes(content):
+    """解析 .gitattributes 内容，返回 (排除规则, 重新包含规则)"""
+    excludes = []
+    includes = []
+    for raw_line in content.splitlines():
+        line = raw_line.strip()
+        if not line or line.startswith('#'):
+            continue
+        parts = line.split()
+        if len(parts) < 2:
+            continue
+        pattern, attrs = parts[0], parts[1:]
+        for attr in attrs:
+            name, _, value = attr.partition('=')
+            if name.startswith('-') or name.startswith('!'):
+                if name[1:] in LINGUIST_ATTRIBUTES:
+                    includes.append(pattern)
+            elif name in LINGUIST_ATTRIBUTES:
+                if value.lower() in ('false', '0'):
+                    includes.append(pattern)
+                else:
+                    excludes.append(pattern)
+    return excludes, includes
+
+
+class ExclusionRules:
+    """预编译的排除规则
+
+    排除规则和重新包含规则各自合并成一个正则。重新包含规则优先级更高，
+    但被排除的目录在遍历时已经剪枝，其中的文件无法再被包含（与 .gitignore 一致）。
+    """
+
+    def __init__(self, exclude_patterns=None, include_patterns=None):
+        self.exclude_patterns = list(exclude_patterns or [])
+        self.include_patterns = list(include_patterns or [])
+        self._exclude_re = _compile(self.exclude_patterns)
+        self._include_re = _compile(self.include_patterns)
+        self._dir_cache = {}
+        patterns = '\n'.join(self.exclude_patterns) + '\0' + '\n'.join(self.include_patterns)
+        self._fingerprint = hashlib.sha1(patterns.encode('utf-8')).hexdigest()[:16]
+        # 含 / 的规则相对于仓库根目录，判断结果与所在路径有关
+        self._anchored = any('/' in p.strip('/') or p.startswith('/')
+                             for p in self.exclude_patterns + self.include_patterns)
+
+    def signature(self, relative_dir=''):
+        """子树统计结果的缓存标识：同一棵树在标识相同的规则下统计结果相同
+
+        规则中没有相对于根目录的规则时与路径无关，不同位置、不同仓库的相同子树可以共用
+        """
+        if self._anchored:
+            return f"{self._fingerprint}:{relative_dir}"
+        return self._fingerprint
+
+    @classmethod
+    def for_repository(cls, repo_path, extra_patterns=None):
+        """根据默认规则、额外规则和仓库根目录的 .gitattributes 构建规则"""
+        content = ''
+        attributes_path = os.path.join(repo_path, '.gitattributes')
+        if os.path.isfile(attributes_path):
+            try:
+                with open(attributes_path, 'r', encoding='utf-8', errors='ignore') as f:
+                    content = f.read()
+            except Exception as e:
+                print(f"读取 .gitattributes 失败: {e}")
+        return cls.from_gitattributes(content, extra_patterns)
+
+    @classmethod
+    def from_gitattributes(cls, content, extra_patterns=None):
+        """根据默认规则、额外规则和 .gitattributes 文本构建规则"""
+        excludes = list(DEFAULT_EXCLUDE_PATTERNS)
+        if extra_patterns:
+            excludes.extend(extra_patterns)
+        attr_excludes, attr_includes = parse_gitattributes(content or '')
+        excludes.extend(attr_excludes)
+        return cls(excludes, attr_includes)
+
+    def is_excluded(self, relative_path, is_dir=False):
+        """判断相对路径是否被排除，目录需传入 is_dir=True"""
+        if self._exclude_re is None:
+            return False
+        path = relative_path + '/' if is_dir else relative_path
+        if not self._exclude_re.fullmatch(path):
+            return False
+        if self._include_re is not None and self._include_re.fullmatch(path):
+            return False
+        return True
+
+    def is_path_excluded(self, relative_path):
+        """判断文件路径是否被排除，包括其任一父目录被排除的情况
+
+        用于不经过目录遍历、直接拿到完整文件列表的场景（git 树、压缩包），目录结果会被缓存
+        """
+        parts = relative_path.split('/')
+        prefix = ''
+        for part in parts[:-1]:
+            prefix = prefix + '/' + part if prefix else part
+            excluded = self._dir_cache.get(prefix)
+            if excluded is None:
+                excluded = self.is_excluded(prefix, is_dir=True)
+                self._dir_cache[prefix] = excluded
+            if excluded:
+                return True
+        return self.is_excluded(relative_path)
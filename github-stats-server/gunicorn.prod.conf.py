@@ -17,6 +17,9 @@ keepalive = 5
 max_requests = 1000
 max_requests_jitter = 50
 
+# 在 master 中加载一次应用，worker fork 后共享只读的翻译和语言表
+preload_app = True
+
 # Logging
 loglevel = 'info'
 accesslog = '-'
@@ -0,0 +1,206 @@
+# 历史统计趋势
+# 在共享的 blobless 镜像上采样 N 个提交：第一个采样点完整统计，
+# 之后每个采样点只比较前后两棵树，统计发生变化的 blob，其余结果沿用上一个采样点。
+import os
+
+from exclusions import ExclusionRules
+from result_cache import BlobCache
+
+# 采样点数量上限
+MAX_HISTORY_POINTS = 200
+
+
+def sample_commits(commits, points):
+    """从按时间排序的提交列表中均匀采样，始终包含最早和最新的提交"""
+    if points >= len(commits):
+        return list(commits)
+    if points <= 1:
+        return [commits[-1]]
+    last = len(commits) - 1
+    indexes = sorted({round(i * last / (points - 1)) for i in range(points)})
+    return [commits[i] for i in indexes]
+
+
+class _Snapshot:
+    """某个提交的统计结果，支持按文件增减"""
+
+    def __init__(self):
+        self.files = {}  # 路径 -> 文件统计
+        self.totals = {'lines': 0, 'code': 0, 'comment': 0, 'blank': 0}
+        self.languages = {}
+
+    def add(self, path, entry):
+        self.files[path] = entry
+        for key in self.totals:
+            self.totals[key] += entry[key]
+        language = entry['language']
+        self.languages[language] = self.languages.get(language, 0) + entry['lines']
+
+    def remove(self, path):
+        entry = self.files.pop(path, None)
+        if entry is None:
+            return
+        for key in self.totals:
+            self.totals[key] -= entry[key]
+        language = entry['language']
+        self.languages[language] -= entry['lines']
+        if self.languages[language] <= 0:
+            del self.languages[language]
+
+    def to_point(self, sha, timestamp):
+        return {
+            'sha': sha,
+            'timestamp': timestamp,
+            'totalLines': self.totals['lines'],
+            'totalFiles': len(self.files),
+            'codeLines': self.totals['code'],
+            'commentLines': self.totals['comment'],
+            'blankLines': self.totals['blank'],
+            'languages': dict(sorted(self.languages.items(), key=lambda x: x[1], reverse=True))
+        }
+
+
+class HistoryAnalyzer:
+    """计算仓库的历史统计趋势
+
+    analyze_blob(file_name, data) 返回单个文件的统计（不是文本文件返回 None），
+    is_candidate(file_name) 用于在拉取内容之前按文件名快速过滤二进制文件，
+    超过 max_blob_size 字节的 blob 不读取内容，按非文本文件处理。
+    各方法的 budget（sandbox.JobBudget）按读取的 blob 计算文件数、字节数和耗时，用完后停止读取。
+    """
+
+    def __init__(self, mirror_store, blob_cache, analyze_blob, is_candidate, max_blob_size=None):
+        self.mirror_store = mirror_store
+        self.blob_cache = blob_cache
+        self.analyze_blob = analyze_blob
+        self.is_candidate = is_candidate
+        self.max_blob_size = max_blob_size
+
+    def trend(self, repo_url, owner, repo, points, budget=None):
+        """返回采样提交的统计列表，从旧到新；budget 用完时只返回已完成的采样点"""
+        mirror = self.mirror_store.ensure(repo_url, owner, repo)
+        commits = self.mirror_store.first_parent_history(mirror)
+        if not commits:
+            return []
+        sampled = sample_commits(commits, min(points, MAX_HISTORY_POINTS))
+
+        results = []
+        snapshot = None
+        rules = None
+        previous_sha = None
+        for timestamp, sha in sampled:
+            if snapshot is None:
+                snapshot, rules = self._full_snapshot(mirror, sha, budget)
+            else:
+                changes = self.mirror_store.diff_tree(mirror, previous_sha, sha)
+                if any(path == '.gitattributes' for _, path, _, _ in changes):
+                    # 排除规则变了，所有路径都要重新判断（blob 结果仍然来自缓存）
+                    snapshot, rules = self._full_snapshot(mirror, sha, budget)
+                else:
+                    self._apply_changes(mirror, snapshot, rules, changes, budget)
+            if budget is not None and budget.exhausted:
+                # 当前采样点只统计了一部分
+                break
+            results.append(snapshot.to_point(sha, timestamp))
+            previous_sha = sha
+        return results
+
+    def analyze_commit(self, mirror, sha, budget=None):
+        """统计单个提交，返回 {路径: 文件统计}；只有缓存中没有的 blob 才会拉取"""
+        snapshot, _ = self._full_snapshot(mirror, sha, budget)
+        return snapshot.files
+
+    def changed_files(self, mirror, old_sha, new_sha, budget=None):
+        """比较两个提交，返回 (旧文件统计, 新文件统计)，只包含发生变化的路径
+
+        diff-tree 直接跳过 tree SHA 相同的子树，不会访问其中的文件；
+        .gitattributes 变化时两边的排除规则不同，改为比较两个完整快照。
+        budget 用完时只包含已统计的文件（由调用方标记 truncated）
+        """
+        changes = self.mirror_store.diff_tree(mirror, old_sha, new_sha)
+        if any(path == '.gitattributes' for _, path, _, _ in changes):
+            old_files = self.analyze_commit(mirror, old_sha, budget)
+            new_files = self.analyze_commit(mirror, new_sha, budget)
+            changed = {path for path in set(old_files) | set(new_files)
+                       if old_files.get(path) != new_files.get(path)}
+            return ({path: old_files[path] for path in changed if path in old_files},
+                    {path: new_files[path] for path in changed if path in new_files})
+
+        attributes = self.mirror_store.blob_at(mirror, new_sha, '.gitattributes')
+        rules = self._rules_for(mirror, {'.gitattributes': attributes} if attributes else {})
+        removed = {}
+        added = {}
+        for status, path, old_blob, new_blob in changes:
+            if not self._wanted(path, rules):
+                continue
+            if status != 'A':
+                removed[path] = old_blob
+            if status != 'D':
+                added[path] = new_blob
+        return self._lookup(mirror, removed, budget), self._lookup(mirror, added, budget)
+
+    def _rules_for(self, mirror, files):
+        """读取提交中的 .gitattributes 构建排除规则"""
+        content = ''
+        blob_sha = files.get('.gitattributes')
+        if blob_sha:
+            for _, data in self.mirror_store.read_blobs(mirror, [blob_sha]):
+                content = data.decode('utf-8', errors='ignore')
+        return ExclusionRules.from_gitattributes(content)
+
+    def _full_snapshot(self, mirror, sha, budget=None):
+        files = self.mirror_store.list_tree(mirror, sha)
+        rules = self._rules_for(mirror, files)
+        snapshot = _Snapshot()
+        wanted = {path: blob for path, blob in files.items() if self._wanted(path, rules)}
+        for path, entry in self._lookup(mirror, wanted, budget).items():
+            snapshot.add(path, entry)
+        return snapshot, rules
+
+    def _apply_changes(self, mirror, snapshot, rules, changes, budget=None):
+        added = {}
+        for status, path, _, new_blob in changes:
+            snapshot.remove(path)
+            if status != 'D' and self._wanted(path, rules):
+                added[path] = new_blob
+        for path, entry in self._lookup(mirror, added, budget).items():
+            snapshot.add(path, entry)
+
+    def _wanted(self, path, rules):
+        return self.is_candidate(os.path.basename(path)) and not rules.is_path_excluded(path)
+
+    def _lookup(self, mirror, files, budget=None):
+        """返回 {路径: 文件统计}，只有缓存中没有的 blob 才会拉取和统计
+
+        budget 用完后不再读取，返回已统计的部分
+        """
+        keys = {path: BlobCache.make_key(blob, os.path.basename(path)) for path, blob in files.items()}
+        cached = self.blob_cache.get_many(set(keys.values()))
+
+        missing = {}
+        for path, key in keys.items():
+            if key not in cached:
+                missing.setdefault(files[path], []).append(path)
+
+        if missing and budget is not None:
+            if budget.exhausted:
+                missing = {}
+            elif budget.limits.max_files:
+                # 超出文件数上限的 blob 不需要拉取（多留一个，读到它时记录超出）
+                allowed = max(0, budget.limits.max_files - budget.files) + 1
+                missing = dict(list(missing.items())[:allowed])
+        if missing:
+            print(f"统计 {len(missing)} 个新的blob")
+            self.mirror_store.prefetch_blobs(mirror, missing)
+            computed = {}
+            for blob_sha, data in self.mirror_store.read_blobs(mirror, missing, self.max_blob_size):
+                if budget is not None and budget.charge(len(data) if data is not None else 0):
+                    print(f"超出资源限制 ({budget.exhausted})，停止读取blob: {budget.files} 个, {budget.bytes} 字节")
+                    break
+                for path in missing[blob_sha]:
+                    computed[keys[path]] = (self.analyze_blob(os.path.basename(path), data)
+                                            if data is not None else None)
+            self.blob_cache.put_many(computed)
+            cached.update(computed)
+
+        return {path: cached[key] for path, key in keys.items() if cached.get(key)}
@@ -1,12 +1,53 @@
 # Flask应用国际化支持
 import os
 import json
-from flask import request, session
+import string
+import tempfile
+import time
+from flask import g, has_request_context, request, session
+
+# 重新加载翻译时更新该文件，其他 gunicorn worker 据此发现变化
+RELOAD_STAMP_FILE = os.path.join(tempfile.gettempdir(), 'github_stats_translations.stamp')
+# worker 检查重新加载标记的最短间隔（秒）
+RELOAD_CHECK_INTERVAL = 2
+
+_formatter = string.Formatter()
+
+def _flatten(data, prefix=''):
+    """将嵌套的翻译字典展开为 a.b.c 形式的单层字典"""
+    flat = {}
+    for key, value in data.items():
+        full_key = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, full_key + '.'))
+        else:
+            flat[full_key] = value
+    return flat
+
+def _compile_template(text):
+    """预先解析带 {name} 占位符的文本，返回 [(文字, 参数名)]
+
+    不含占位符或包含格式说明（如 {n:,}）时返回 None，后者回退到 str.format
+    """
+    if not isinstance(text, str) or '{' not in text:
+        return None
+    parts = []
+    try:
+        for literal, field, spec, conversion in _formatter.parse(text):
+            if spec or conversion or (field is not None and not field.isidentifier()):
+                return None
+            parts.append((literal, field))
+    except ValueError:
+        return None
+    return parts
 
 class I18n:
     def __init__(self, app=None, default_locale='zh'):
         self.default_locale = default_locale
-        self.translations = {}
+        # (翻译表, 预编译的模板)，整体替换，读取时只取一次，不会读到新旧混合的两部分
+        self.catalog = ({}, {})
+        self.loaded_at = 0
+        self._last_check = 0
         self.app = app
         
         if app is not None:
@@ -20,9 +61,17 @@ class I18n:
         @app.context_processor
         def inject_i18n():
             return dict(t=self.t, get_locale=self.get_locale)
+        
+        # 其他 worker 重新加载翻译后，本 worker 也跟着重新加载
+        @app.before_request
+        def check_translations_reload():
+            self.reload_if_changed()
     
     def load_translations(self):
-        """加载翻译文件"""
+        """加载翻译文件
+
+        新的翻译表完整构建后一次性替换，正在处理的请求不会看到加载了一半的翻译
+        """
         translations_dir = os.path.join(os.path.dirname(__file__), 'translations')
         
         # 如果translations目录不存在，创建默认翻译
@@ -30,22 +79,57 @@ class I18n:
             os.makedirs(translations_dir)
             self.create_default_translations(translations_dir)
         
-        # 清空现有翻译，重新加载
-        self.translations.clear()
-        
         # 加载翻译文件
+        raw = {}
         for filename in os.listdir(translations_dir):
             if filename.endswith('.json'):
                 locale = filename[:-5]  # 移除.json扩展名
                 filepath = os.path.join(translations_dir, filename)
                 try:
                     with open(filepath, 'r', encoding='utf-8') as f:
-                        self.translations[locale] = json.load(f)
-                        print(f"Loaded translations for {locale}: {len(self.translations[locale])} keys")
+                        raw[locale] = _flatten(json.load(f))
                 except Exception as e:
                     print(f"Error loading translation file {filepath}: {e}")
         
-        print(f"Available locales: {list(self.translations.keys())}")
+        # 每种语言合并默认语言作为回退，查找时只需一次字典访问
+        default = raw.get(self.default_locale, {})
+        translations = {locale: {**default, **table} for locale, table in raw.items()}
+        templates = {}
+        for locale, table in translations.items():
+            templates[locale] = {}
+            for key, text in table.items():
+                compiled = _compile_template(text)
+                if compiled is not None:
+                    templates[locale][key] = compiled
+        
+        # 一次赋值替换整个目录
+        self.catalog = (translations, templates)
+        self.loaded_at = time.time()
+        
+        print("Loaded translations: " + ', '.join(f"{locale} ({len(table)} keys)" for locale, table in raw.items()))
+    
+    def reload_all_workers(self):
+        """重新加载翻译，并通知其他 gunicorn worker"""
+        self.load_translations()
+        with open(RELOAD_STAMP_FILE, 'w') as f:
+            f.write(str(self.loaded_at))
+        # 标记文件的修改时间可能略晚于 loaded_at，避免本 worker 重复加载
+        self.loaded_at = max(self.loaded_at, os.path.getmtime(RELOAD_STAMP_FILE))
+    
+    def reload_if_changed(self):
+        """其他 worker 重新加载过翻译时，本 worker 也重新加载（限制检查频率）"""
+        now = time.time()
+        if now - self._last_check < RELOAD_CHECK_INTERVAL:
+            return
+        self._last_check = now
+        try:
+            stamp = os.path.getmtime(RELOAD_STAMP_FILE)
+        except OSError:
+            return
+        if stamp > self.loaded_at:
+            print("检测到翻译已在其他进程中更新，重新加载")
+            self.load_translations()
+            self.loaded_at = max(self.loaded_at, stamp)
     
     def create_default_translations(self, translations_dir):
         """创建默认的翻译文件"""
@@ -120,50 +204,63 @@ class I18n:
         with open(os.path.join(translations_dir, 'en.json'), 'w', encoding='utf-8') as f:
             json.dump(en_translations, f, ensure_ascii=False, indent=2)
         
-        # 直接加载到内存中
-        self.translations['zh'] = zh_translations
-        self.translations['en'] = en_translations
     
     def get_locale(self):
-        """获取当前语言设置"""
+        """获取当前语言设置，每个请求只解析一次，结果缓存在 flask.g 上"""
+        if not has_request_context():
+            return self.default_locale
+        locale = g.get('_i18n_locale')
+        if locale is None:
+            locale = self._resolve_locale()
+            g._i18n_locale = locale
+        return locale
+    
+    def _resolve_locale(self):
+        translations = self.catalog[0]
+        
         # 优先使用URL参数中的语言设置
         if 'lang' in request.args:
             lang = request.args.get('lang')
-            if lang in self.translations:
+            if lang in translations:
                 session['locale'] = lang
                 return lang
         
         # 其次使用session中的语言设置
-        if 'locale' in session and session['locale'] in self.translations:
+        if 'locale' in session and session['locale'] in translations:
             return session['locale']
         
         # 最后使用浏览器Accept-Language头
         return request.accept_languages.best_match(
-            list(self.translations.keys())
+            list(translations.keys())
         ) or self.default_locale
     
     def t(self, key, **kwargs):
         """翻译函数"""
         locale = self.get_locale()
+        translations, templates = self.catalog
         
-        # 获取翻译文本
-        text = self.translations.get(locale, {}).get(key)
-        if text is None:
-            # 回退到默认语言
-            text = self.translations.get(self.default_locale, {}).get(key, key)
+        # 获取翻译文本（加载时已合并默认语言）
+        if locale not in translations:
+            locale = self.default_locale
+        text = translations.get(locale, {}).get(key, key)
         
         # 支持参数替换
         if kwargs:
+            compiled = templates.get(locale, {}).get(key)
             try:
-                text = text.format(**kwargs)
-            except (KeyError, ValueError):
+                if compiled is not None:
+                    text = ''.join(literal + (str(kwargs[field]) if field is not None else '')
+                                   for literal, field in compiled)
+                else:
+                    text = text.format(**kwargs)
+            except (KeyError, ValueError, IndexError):
                 pass
         
         return text
     
     def get_available_locales(self):
         """获取可用的语言列表"""
-        return list(self.translations.keys())
+        return list(self.catalog[0].keys())
 
 # 全局实例
 i18n = I18n()
\ No newline at end of file
@@ -0,0 +1,235 @@
+# 共享任务库
+# 批量分析的任务、结果和节点心跳保存在一个 SQLite 数据库中。单机时位于本地缓存目录；
+# 多个节点时指向共享存储上的同一个文件（测试和小规模部署的替代方案，接口与具体存储无关）。
+# 节点以租约领取任务，执行期间定期续约；租约过期（节点或 worker 失联）的任务重新排队，超过重试次数记为失败。
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# 任务最多执行的次数（包括因节点失联导致的重试）
+MAX_ATTEMPTS = 3
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS batches (batch_id TEXT PRIMARY KEY, total INTEGER, created REAL)',
+    '''CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        batch_id TEXT, idx INTEGER, payload TEXT, client TEXT, node TEXT,
+        status TEXT, lease_owner TEXT, lease_expires REAL, attempts INTEGER DEFAULT 0, created REAL,
+        not_before REAL DEFAULT 0)''',
+    'CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, node)',
+    'CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id)',
+    '''CREATE TABLE IF NOT EXISTS results (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT, batch_id TEXT, job_id INTEGER, status TEXT, result TEXT)''',
+    'CREATE INDEX IF NOT EXISTS results_batch ON results (batch_id, seq)',
+    'CREATE TABLE IF NOT EXISTS nodes (node_id TEXT PRIMARY KEY, url TEXT, heartbeat REAL)',
+)
+
+
+def _create_tables(conn):
+    conn.execute('PRAGMA journal_mode=WAL')
+    for statement in _SCHEMA:
+        conn.execute(statement)
+    # 旧版本创建的任务库没有 not_before 列
+    if 'not_before' not in {row[1] for row in conn.execute('PRAGMA table_info(jobs)')}:
+        try:
+            conn.execute('ALTER TABLE jobs ADD COLUMN not_before REAL DEFAULT 0')
+        except sqlite3.OperationalError:
+            # 其他 worker 同时添加
+            pass
+
+
+class JobStore:
+    """任务、结果和节点心跳的存储，所有节点和 worker 共享"""
+
+    def __init__(self, db_path, max_attempts=MAX_ATTEMPTS):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            # 手动管理事务：领取任务时 BEGIN IMMEDIATE，保证同一任务只被一个节点领取
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            _create_tables(conn)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _transaction(self):
+        return _Transaction(self._connection())
+
+    def warm(self):
+        """预先创建数据库和表结构（使用临时连接，worker 各自建立连接）"""
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            _create_tables(conn)
+            conn.commit()
+        finally:
+            conn.close()
+
+    # 批次
+
+    def create_batch(self, batch_id, jobs, client):
+        """写入一个批次，jobs 为 [(首选节点, 任务参数)]"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute('INSERT INTO batches (batch_id, total, created) VALUES (?, ?, ?)',
+                         (batch_id, len(jobs), now))
+            conn.executemany(
+                'INSERT INTO jobs (batch_id, idx, payload, client, node, status, created) '
+                'VALUES (?, ?, ?, ?, ?, \'queued\', ?)',
+                [(batch_id, index, json.dumps(payload), client, node, now)
+                 for index, (node, payload) in enumerate(jobs)])
+
+    def batch_total(self, batch_id):
+        """批次的仓库数，批次不存在时返回 None"""
+        row = self._connection().execute('SELECT total FROM batches WHERE batch_id = ?', (batch_id,)).fetchone()
+        return row[0] if row else None
+
+    def batch_progress(self, batch_id):
+        """(已完成数, 失败数)"""
+        row = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(status = 'error'), 0) FROM results WHERE batch_id = ?",
+            (batch_id,)).fetchone()
+        return row[0], row[1]
+
+    def results_after(self, batch_id, seq):
+        """批次中序号大于 seq 的结果 [(序号, 结果)]，按完成顺序"""
+        rows = self._connection().execute(
+            'SELECT seq, result FROM results WHERE batch_id = ? AND seq > ? ORDER BY seq', (batch_id, seq))
+        return [(row_seq, json.loads(result)) for row_seq, result in rows]
+
+    def purge_batches(self, before):
+        """删除 before 之前创建且已全部完成的批次"""
+        with self._transaction() as conn:
+            expired = [row[0] for row in conn.execute(
+                'SELECT b.batch_id FROM batches b WHERE b.created < ? AND '
+                '(SELECT COUNT(*) FROM results r WHERE r.batch_id = b.batch_id) >= b.total', (before,))]
+            for batch_id in expired:
+                for table in ('results', 'jobs', 'batches'):
+                    conn.execute(f'DELETE FROM {table} WHERE batch_id = ?', (batch_id,))
+        return len(expired)
+
+    # 任务
+
+    def claim(self, node_id, lease_owner, lease_seconds, alive_after, steal_before, max_running=None):
+        """领取一个任务，返回 (任务ID, 批次ID, 序号, 参数, 客户端)，没有可领取的任务返回 None
+
+        max_running 为本节点同时执行的任务数上限（租约持有者以 "节点ID/" 开头的任务，包括所有 worker 进程），
+        已达上限时不领取
+
+        可领取：分配给本节点的任务、分配给已失联节点的任务，以及排队超过一定时间的任务（避免个别节点积压）。
+        本节点的任务优先；同样条件下优先领取正在运行任务最少的客户端的任务，保证客户端之间公平。
+        被限流推迟（defer）的任务到时间后才能领取
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            if max_running is not None:
+                prefix = f"{node_id}/"
+                running = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'running' AND substr(lease_owner, 1, ?) = ?",
+                    (len(prefix), prefix)).fetchone()[0]
+                if running >= max_running:
+                    return None
+            row = conn.execute(
+                '''SELECT j.id, j.batch_id, j.idx, j.payload, j.client FROM jobs j
+                   WHERE j.status = 'queued' AND COALESCE(j.not_before, 0) <= :now AND (
+                       j.node = :node
+                       OR j.node NOT IN (SELECT node_id FROM nodes WHERE heartbeat >= :alive_after)
+                       OR j.created < :steal_before)
+                   ORDER BY j.node = :node DESC,
+                            (SELECT COUNT(*) FROM jobs r WHERE r.status = 'running' AND r.client IS j.client),
+                            j.id
+                   LIMIT 1''',
+                {'node': node_id, 'alive_after': alive_after, 'steal_before': steal_before, 'now': now}).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET status = 'running', lease_owner = ?, lease_expires = ?, "
+                         'attempts = attempts + 1 WHERE id = ?', (lease_owner, now + lease_seconds, row[0]))
+        return row[0], row[1], row[2], json.loads(row[3]), row[4]
+
+    def defer(self, job_id, lease_owner, client, not_before):
+        """退还已领取的任务（不计入执行次数），该客户端所有排队中的任务在 not_before 之前不再领取"""
+        with self._transaction() as conn:
+            conn.execute("UPDATE jobs SET status = 'queued', lease_owner = NULL, attempts = attempts - 1 "
+                         "WHERE id = ? AND status = 'running' AND lease_owner = ?", (job_id, lease_owner))
+            conn.execute("UPDATE jobs SET not_before = ? WHERE status = 'queued' AND client IS ?",
+                         (not_before, client))
+
+    def renew(self, lease_owner, lease_seconds):
+        """为该 worker 正在执行的所有任务续约"""
+        self._connection().execute(
+            "UPDATE jobs SET lease_expires = ? WHERE status = 'running' AND lease_owner = ?",
+            (time.time() + lease_seconds, lease_owner))
+
+    def finish(self, job_id, lease_owner, status, result):
+        """记录任务结果；租约已经过期并被重新领取时忽略（结果以后执行的为准）"""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT batch_id FROM jobs WHERE id = ? AND status = 'running' AND lease_owner = ?",
+                               (job_id, lease_owner)).fetchone()
+            if row is None:
+                return False
+            conn.execute("UPDATE jobs SET status = ?, lease_owner = NULL WHERE id = ?", (status, job_id))
+            conn.execute('INSERT INTO results (batch_id, job_id, status, result) VALUES (?, ?, ?, ?)',
+                         (row[0], job_id, status, json.dumps(result, ensure_ascii=False)))
+        return True
+
+    def requeue_expired(self, failure_result):
+        """租约过期的任务重新排队；已达重试次数的记为失败，结果为 failure_result(参数, 序号)
+
+        返回 (重新排队数, 失败数)
+        """
+        now = time.time()
+        requeued = failed = 0
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT id, batch_id, idx, payload, attempts FROM jobs "
+                                "WHERE status = 'running' AND lease_expires < ?", (now,)).fetchall()
+            for job_id, batch_id, index, payload, attempts in rows:
+                if attempts < self.max_attempts:
+                    conn.execute("UPDATE jobs SET status = 'queued', lease_owner = NULL WHERE id = ?", (job_id,))
+                    requeued += 1
+                else:
+                    conn.execute("UPDATE jobs SET status = 'error', lease_owner = NULL WHERE id = ?", (job_id,))
+                    conn.execute("INSERT INTO results (batch_id, job_id, status, result) VALUES (?, ?, 'error', ?)",
+                                 (batch_id, job_id, json.dumps(failure_result(json.loads(payload), index),
+                                                               ensure_ascii=False)))
+                    failed += 1
+        return requeued, failed
+
+    def queue_summary(self):
+        """排队中的客户端数和任务数，以及运行中的任务数"""
+        conn = self._connection()
+        clients, queued = conn.execute(
+            "SELECT COUNT(DISTINCT client), COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()
+        running = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'running'").fetchone()[0]
+        return {'clients': clients, 'jobs': queued, 'running': running}
+
+    # 节点
+
+    def heartbeat(self, node_id, url):
+        self._connection().execute('INSERT OR REPLACE INTO nodes (node_id, url, heartbeat) VALUES (?, ?, ?)',
+                                   (node_id, url, time.time()))
+
+    def alive_nodes(self, alive_after):
+        """心跳在 alive_after 之后的节点 {节点ID: URL}"""
+        rows = self._connection().execute('SELECT node_id, url FROM nodes WHERE heartbeat >= ?', (alive_after,))
+        return dict(rows.fetchall())
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT，异常时回滚"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
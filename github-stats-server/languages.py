@@ -0,0 +1,219 @@
+# 编程语言识别
+# 查找表在导入时构建一次；按 文件名 -> 扩展名（含歧义扩展名的内容启发式）-> shebang 的顺序识别。
+import os
+import re
+
+# 扩展名 -> 语言
+EXTENSION_LANGUAGES = {
+    '.py': 'Python',
+    '.pyw': 'Python',
+    '.pyi': 'Python',
+    '.js': 'JavaScript',
+    '.mjs': 'JavaScript',
+    '.cjs': 'JavaScript',
+    '.ts': 'TypeScript',
+    '.jsx': 'React JSX',
+    '.tsx': 'React TSX',
+    '.java': 'Java',
+    '.c': 'C',
+    '.cpp': 'C++',
+    '.cc': 'C++',
+    '.cxx': 'C++',
+    '.hpp': 'C++ Header',
+    '.hh': 'C++ Header',
+    '.hxx': 'C++ Header',
+    '.cs': 'C#',
+    '.php': 'PHP',
+    '.rb': 'Ruby',
+    '.go': 'Go',
+    '.rs': 'Rust',
+    '.swift': 'Swift',
+    '.kt': 'Kotlin',
+    '.kts': 'Kotlin',
+    '.scala': 'Scala',
+    '.html': 'HTML',
+    '.htm': 'HTML',
+    '.css': 'CSS',
+    '.scss': 'SCSS',
+    '.sass': 'Sass',
+    '.less': 'Less',
+    '.vue': 'Vue',
+    '.svelte': 'Svelte',
+    '.xml': 'XML',
+    '.json': 'JSON',
+    '.yml': 'YAML',
+    '.yaml': 'YAML',
+    '.toml': 'TOML',
+    '.ini': 'INI',
+    '.cfg': 'Config',
+    '.conf': 'Config',
+    '.sh': 'Shell',
+    '.bash': 'Bash',
+    '.zsh': 'Shell',
+    '.ps1': 'PowerShell',
+    '.bat': 'Batch',
+    '.cmd': 'Batch',
+    '.sql': 'SQL',
+    '.r': 'R',
+    '.pl': 'Perl',
+    '.pm': 'Perl',
+    '.lua': 'Lua',
+    '.dart': 'Dart',
+    '.elm': 'Elm',
+    '.ex': 'Elixir',
+    '.exs': 'Elixir',
+    '.clj': 'Clojure',
+    '.hs': 'Haskell',
+    '.fs': 'F#',
+    '.ml': 'OCaml',
+    '.jl': 'Julia',
+    '.nim': 'Nim',
+    '.zig': 'Zig',
+    '.cmake': 'CMake',
+    '.mk': 'Makefile',
+    '.dockerfile': 'Docker',
+    '.md': 'Markdown',
+    '.rst': 'reStructuredText',
+    '.tex': 'TeX',
+    '.txt': 'Text',
+    '.csv': 'CSV',
+    '.log': 'Log',
+}
+
+# 完整文件名 -> 语言（优先于扩展名）
+FILENAME_LANGUAGES = {
+    'Dockerfile': 'Docker',
+    'Containerfile': 'Docker',
+    'Makefile': 'Makefile',
+    'makefile': 'Makefile',
+    'GNUmakefile': 'Makefile',
+    'CMakeLists.txt': 'CMake',
+    'Rakefile': 'Ruby',
+    'Gemfile': 'Ruby',
+    'Podfile': 'Ruby',
+    'Vagrantfile': 'Ruby',
+    'Jenkinsfile': 'Groovy',
+    'BUILD': 'Starlark',
+    'WORKSPACE': 'Starlark',
+    'BUILD.bazel': 'Starlark',
+    'SConstruct': 'Python',
+    'SConscript': 'Python',
+    '.gitignore': 'Git',
+    '.gitattributes': 'Git',
+    '.gitmodules': 'Git',
+    '.dockerignore': 'Docker',
+    '.bashrc': 'Shell',
+    '.zshrc': 'Shell',
+    '.profile': 'Shell',
+    '.editorconfig': 'INI',
+}
+
+# shebang 解释器 -> 语言（版本号后缀会被去掉，如 python3 -> python）
+SHEBANG_LANGUAGES = {
+    'python': 'Python',
+    'node': 'JavaScript',
+    'nodejs': 'JavaScript',
+    'deno': 'TypeScript',
+    'ts-node': 'TypeScript',
+    'sh': 'Shell',
+    'ash': 'Shell',
+    'dash': 'Shell',
+    'ksh': 'Shell',
+    'zsh': 'Shell',
+    'bash': 'Bash',
+    'perl': 'Perl',
+    'ruby': 'Ruby',
+    'php': 'PHP',
+    'lua': 'Lua',
+    'rscript': 'R',
+    'tclsh': 'Tcl',
+    'awk': 'Awk',
+    'gawk': 'Awk',
+    'pwsh': 'PowerShell',
+}
+
+# 无法识别的文件
+UNKNOWN_LANGUAGE = 'Unknown'
+
+# 需要内容启发式判断的扩展名
+_CPP_HINTS = re.compile(rb'^\s*(?:class|namespace|template\s*<|public:|private:|protected:)|::|\bstd::', re.M)
+_OBJC_HINTS = re.compile(rb'^\s*(?:@interface|@implementation|@protocol|@end|#import)\b', re.M)
+_MATLAB_HINTS = re.compile(rb'^\s*(?:function\b|end\s*$|%)', re.M)
+_SHEBANG_VERSION = re.compile(r'[\d.]+$')
+
+
+def _detect_header(sample):
+    """区分 .h 文件属于 C、C++ 还是 Objective-C"""
+    if not sample:
+        return 'C Header'
+    if _OBJC_HINTS.search(sample):
+        return 'Objective-C'
+    if _CPP_HINTS.search(sample):
+        return 'C++ Header'
+    return 'C Header'
+
+
+def _detect_m_file(sample):
+    """区分 .m 文件属于 Objective-C 还是 MATLAB"""
+    if sample and _OBJC_HINTS.search(sample):
+        return 'Objective-C'
+    if sample and _MATLAB_HINTS.search(sample):
+        return 'MATLAB'
+    return 'Objective-C'
+
+
+AMBIGUOUS_EXTENSIONS = {
+    '.h': _detect_header,
+    '.m': _detect_m_file,
+}
+
+
+def detect_shebang(sample):
+    """从文件开头的 shebang 行识别语言，无法识别返回 None"""
+    if not sample or not sample.startswith(b'#!'):
+        return None
+    first_line = sample[2:].split(b'\n', 1)[0].decode('utf-8', errors='ignore').strip()
+    parts = first_line.split()
+    if not parts:
+        return None
+
+    interpreter = os.path.basename(parts[0])
+    # /usr/bin/env python3 -> python3；跳过 env 自身的参数（如 -S）
+    if interpreter == 'env':
+        args = [p for p in parts[1:] if not p.startswith('-')]
+        if not args:
+            return None
+        interpreter = args[0]
+
+    interpreter = _SHEBANG_VERSION.sub('', interpreter.lower())
+    return SHEBANG_LANGUAGES.get(interpreter)
+
+
+def detect_language(file_name, sample=None):
+    """识别文件的编程语言
+
+    file_name 为文件名（不含目录），sample 为文件开头的字节内容（可选）
+    """
+    language = FILENAME_LANGUAGES.get(file_name)
+    if language:
+        return language
+
+    _, ext = os.path.splitext(file_name)
+    if ext:
+        detector = AMBIGUOUS_EXTENSIONS.get(ext.lower())
+        if detector:
+            return detector(sample)
+        language = EXTENSION_LANGUAGES.get(ext) or EXTENSION_LANGUAGES.get(ext.lower())
+        if language:
+            return language
+
+    language = detect_shebang(sample)
+    if language:
+        return language
+
+    return f"Other ({ext})" if ext else UNKNOWN_LANGUAGE
+
+
+def sort_languages(language_stats):
+    """按行数从多到少排序语言统计"""
+    return dict(sorted(language_stats.items(), key=lambda x: x[1], reverse=True))
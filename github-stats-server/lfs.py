@@ -0,0 +1,20 @@
+# Git LFS 指针文件
+# LFS 跟踪的文件在仓库中只是一个很小的文本指针，不下载实际对象，单独统计数量和声明的大小。
+
+# 指针文件的大小上限（规范要求小于 1024 字节）
+MAX_POINTER_SIZE = 1024
+POINTER_HEADER = b'version https://git-lfs.github.com/spec/v1\n'
+
+
+def parse_pointer(data):
+    """解析 LFS 指针，返回 {'oid', 'size'}，不是指针返回 None"""
+    if len(data) >= MAX_POINTER_SIZE or data[:len(POINTER_HEADER)] != POINTER_HEADER:
+        return None
+    fields = {}
+    for line in bytes(data).decode('utf-8', errors='replace').splitlines()[1:]:
+        key, _, value = line.partition(' ')
+        fields[key] = value
+    oid = fields.get('oid', '')
+    if not oid.startswith('sha256:') or not fields.get('size', '').isdigit():
+        return None
+    return {'oid': oid[len('sha256:'):], 'size': int(fields['size'])}
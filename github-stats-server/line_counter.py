@@ -0,0 +1,214 @@
+# 代码行 / 注释行 / 空行 分类
+# 轻量级的逐行扫描器：识别行注释、块注释和字符串，与统计总行数共用同一次读取。
+import re
+
+# 常用的注释语法
+_C_STYLE = {'line': ['//'], 'block': [('/*', '*/')], 'strings': ['"', "'"]}
+_HASH = {'line': ['#'], 'block': [], 'strings': []}
+_DASH = {'line': ['--'], 'block': [], 'strings': []}
+_MARKUP = {'line': [], 'block': [('<!--', '-->')], 'strings': []}
+
+# 语言 -> 注释语法
+# line: 行注释标记；block: 块注释 (开始, 结束)；strings: 字符串定界符；multiline_strings: 可跨行的字符串
+COMMENT_SYNTAX = {
+    'C': _C_STYLE,
+    'C Header': _C_STYLE,
+    'C++': _C_STYLE,
+    'C++ Header': _C_STYLE,
+    'Objective-C': _C_STYLE,
+    'C#': _C_STYLE,
+    'Java': _C_STYLE,
+    'Go': {'line': ['//'], 'block': [('/*', '*/')], 'strings': ['"', "'"], 'multiline_strings': ['`']},
+    'Rust': _C_STYLE,
+    'Swift': _C_STYLE,
+    'Kotlin': _C_STYLE,
+    'Scala': _C_STYLE,
+    'Dart': _C_STYLE,
+    'JavaScript': {'line': ['//'], 'block': [('/*', '*/')], 'strings': ['"', "'"], 'multiline_strings': ['`']},
+    'TypeScript': {'line': ['//'], 'block': [('/*', '*/')], 'strings': ['"', "'"], 'multiline_strings': ['`']},
+    'React JSX': {'line': ['//'], 'block': [('/*', '*/')], 'strings': ['"', "'"], 'multiline_strings': ['`']},
+    'React TSX': {'line': ['//'], 'block': [('/*', '*/')], 'strings': ['"', "'"], 'multiline_strings': ['`']},
+    'PHP': {'line': ['//', '#'], 'block': [('/*', '*/')], 'strings': ['"', "'"]},
+    'CSS': {'line': [], 'block': [('/*', '*/')], 'strings': ['"', "'"]},
+    'SCSS': _C_STYLE,
+    'Less': _C_STYLE,
+    'Sass': {'line': ['//'], 'block': [], 'strings': []},
+    'Zig': {'line': ['//'], 'block': [], 'strings': []},
+    'Groovy': _C_STYLE,
+    'Python': {'line': ['#'], 'block': [], 'strings': ['"', "'"], 'multiline_strings': ['"""', "'''"]},
+    'Starlark': {'line': ['#'], 'block': [], 'strings': ['"', "'"], 'multiline_strings': ['"""', "'''"]},
+    'Ruby': _HASH,
+    'Perl': _HASH,
+    'Shell': _HASH,
+    'Bash': _HASH,
+    'PowerShell': {'line': ['#'], 'block': [('<#', '#>')], 'strings': ['"', "'"]},
+    'R': _HASH,
+    'Julia': _HASH,
+    'Nim': _HASH,
+    'Elixir': _HASH,
+    'Tcl': _HASH,
+    'Awk': _HASH,
+    'YAML': _HASH,
+    'TOML': _HASH,
+    'Config': _HASH,
+    'INI': {'line': [';', '#'], 'block': [], 'strings': []},
+    'Makefile': _HASH,
+    'CMake': _HASH,
+    'Docker': _HASH,
+    'Git': _HASH,
+    'SQL': {'line': ['--'], 'block': [('/*', '*/')], 'strings': ["'", '"']},
+    'Lua': {'line': ['--'], 'block': [('--[[', ']]')], 'strings': ['"', "'"]},
+    'Haskell': {'line': ['--'], 'block': [('{-', '-}')], 'strings': ['"']},
+    'Elm': {'line': ['--'], 'block': [('{-', '-}')], 'strings': ['"']},
+    'OCaml': {'line': [], 'block': [('(*', '*)')], 'strings': ['"']},
+    'F#': {'line': ['//'], 'block': [('(*', '*)')], 'strings': ['"']},
+    'Clojure': {'line': [';'], 'block': [], 'strings': []},
+    'MATLAB': {'line': ['%'], 'block': [('%{', '%}')], 'strings': []},
+    'TeX': {'line': ['%'], 'block': [], 'strings': []},
+    'Batch': {'line': ['REM ', 'rem ', '::'], 'block': [], 'strings': []},
+    'HTML': _MARKUP,
+    'XML': _MARKUP,
+    'Vue': _MARKUP,
+    'Svelte': _MARKUP,
+    'Markdown': _MARKUP,
+}
+
+
+class _Scanner:
+    """单个语言的预编译扫描器"""
+
+    def __init__(self, syntax):
+        self.line_markers = tuple(syntax.get('line', []))
+        self.block_pairs = dict(syntax.get('block', []))
+        self.multiline_strings = set(syntax.get('multiline_strings', []))
+        strings = list(syntax.get('strings', [])) + list(self.multiline_strings)
+
+        # 没有块注释和跨行字符串的语言走快速路径：只看行首是否为注释标记
+        self.fast_path = not self.block_pairs and not self.multiline_strings
+
+        # 所有"有意义"的标记合并为一个正则，长的优先（如 Lua 的 --[[ 先于 --）
+        tokens = list(self.line_markers) + list(self.block_pairs) + strings
+        tokens.sort(key=len, reverse=True)
+        self.token_re = re.compile('|'.join(re.escape(t) for t in tokens)) if tokens else None
+
+        # 每种字符串定界符的结束位置搜索（单字符字符串支持反斜杠转义）
+        self.string_end_re = {}
+        for delimiter in strings:
+            if len(delimiter) == 1:
+                self.string_end_re[delimiter] = re.compile(r'\\.|' + re.escape(delimiter))
+            else:
+                self.string_end_re[delimiter] = re.compile(re.escape(delimiter))
+
+
+_SCANNERS = {language: _Scanner(syntax) for language, syntax in COMMENT_SYNTAX.items()}
+
+
+def count_line_breakdown(lines, language=None):
+    """统计行迭代器中的总行数、代码行、注释行和空行
+
+    lines 可以是已打开的文本文件对象，逐行流式处理
+    """
+    scanner = _SCANNERS.get(language)
+    total = code = comment = blank = 0
+
+    # 未知语言：非空行都算代码
+    if scanner is None or scanner.token_re is None:
+        for line in lines:
+            total += 1
+            if line.strip():
+                code += 1
+            else:
+                blank += 1
+        return {'lines': total, 'code': code, 'comment': comment, 'blank': blank}
+
+    # 快速路径：只有行注释
+    if scanner.fast_path:
+        markers = scanner.line_markers
+        for line in lines:
+            total += 1
+            stripped = line.strip()
+            if not stripped:
+                blank += 1
+            elif markers and stripped.startswith(markers):
+                comment += 1
+            else:
+                code += 1
+        return {'lines': total, 'code': code, 'comment': comment, 'blank': blank}
+
+    token_re = scanner.token_re
+    line_markers = scanner.line_markers
+    block_pairs = scanner.block_pairs
+    multiline_strings = scanner.multiline_strings
+    string_end_re = scanner.string_end_re
+
+    block_end = None      # 当前所在块注释的结束标记
+    open_string = None    # 当前所在跨行字符串的定界符
+
+    for line in lines:
+        total += 1
+        line = line.rstrip('\r\n')
+        if not line.strip():
+            blank += 1
+            continue
+
+        has_code = False
+        has_comment = False
+        pos = 0
+        length = len(line)
+
+        while pos < length:
+            if block_end is not None:
+                has_comment = True
+                end = line.find(block_end, pos)
+                if end == -1:
+                    pos = length
+                    break
+                pos = end + len(block_end)
+                block_end = None
+                continue
+
+            if open_string is not None:
+                has_code = True
+                end_re = string_end_re[open_string]
+                match = end_re.search(line, pos)
+                while match and match.group() != open_string:
+                    match = end_re.search(line, match.end())
+                if match is None:
+                    # 普通字符串在行尾结束，跨行字符串继续到下一行
+                    if open_string not in multiline_strings:
+                        open_string = None
+                    pos = length
+                    break
+                pos = match.end()
+                open_string = None
+                continue
+
+            match = token_re.search(line, pos)
+            if match is None:
+                if line[pos:].strip():
+                    has_code = True
+                break
+
+            if line[pos:match.start()].strip():
+                has_code = True
+            token = match.group()
+            pos = match.end()
+
+            if token in block_pairs:
+                has_comment = True
+                block_end = block_pairs[token]
+            elif token in line_markers:
+                has_comment = True
+                break
+            else:
+                has_code = True
+                open_string = token
+
+        if has_code:
+            code += 1
+        elif has_comment:
+            comment += 1
+        else:
+            blank += 1
+
+    return {'lines': total, 'code': code, 'comment': comment, 'blank': blank}
@@ -0,0 +1,327 @@
+# 共享的 git 镜像
+# 每个仓库保存一个不含文件内容的裸仓库（blobless partial clone），
+# 需要的文件内容按 blob SHA 批量拉取，多个功能（历史趋势等）共用同一份对象。
+import os
+import re
+import subprocess
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# 镜像多久内视为最新，不再 fetch（秒）
+MIRROR_REFRESH_INTERVAL = 60
+# 单次批量拉取 blob 的最大数量
+PREFETCH_CHUNK = 5000
+# 跳过超大 blob 时每次读取并丢弃的字节数
+SKIP_CHUNK_SIZE = 1024 * 1024
+
+
+def git_env():
+    """运行 git 的环境变量（与 clone_repository 一致）"""
+    env = os.environ.copy()
+    if '/mingw64/bin' not in env.get('PATH', ''):
+        env['PATH'] = '/mingw64/bin:' + env.get('PATH', '')
+    # 禁止交互式询问用户名密码
+    env['GIT_TERMINAL_PROMPT'] = '0'
+    return env
+
+
+def is_valid_ref(ref):
+    """引用是否可以安全地交给 git：完整的提交SHA，或不以 - 开头且符合 git check-ref-format 的名称"""
+    if not ref or ref.startswith('-'):
+        return False
+    if re.fullmatch(r'[0-9a-f]{40}', ref):
+        return True
+    result = subprocess.run(['git', 'check-ref-format', '--allow-onelevel', ref],
+                            capture_output=True, timeout=10, env=git_env())
+    return result.returncode == 0
+
+
+def run_git(args, cwd=None, input=None, timeout=300):
+    """执行 git 命令，失败时抛出 RuntimeError"""
+    result = subprocess.run(['git'] + args, cwd=cwd, input=input, capture_output=True,
+                            timeout=timeout, env=git_env())
+    if result.returncode != 0:
+        error = result.stderr.decode('utf-8', errors='ignore').strip()
+        raise RuntimeError(f"git {args[0]} 失败: {error or '未知错误'}")
+    return result.stdout
+
+
+class _MirrorLock:
+    """同一镜像的互斥锁：进程内用线程锁，跨 gunicorn worker 用文件锁
+
+    blocking=False 时锁已被占用则抛出 BlockingIOError
+    """
+
+    _thread_locks = {}
+    _guard = threading.Lock()
+
+    def __init__(self, path, blocking=True):
+        self.path = path
+        self.blocking = blocking
+        with self._guard:
+            self.thread_lock = self._thread_locks.setdefault(path, threading.Lock())
+        self.lock_file = None
+
+    def __enter__(self):
+        if not self.thread_lock.acquire(self.blocking):
+            raise BlockingIOError(self.path)
+        if fcntl is not None:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self.lock_file = open(self.path + '.lock', 'w')
+                fcntl.flock(self.lock_file, fcntl.LOCK_EX if self.blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BaseException:
+                if self.lock_file is not None:
+                    self.lock_file.close()
+                    self.lock_file = None
+                self.thread_lock.release()
+                raise
+        return self
+
+    def __exit__(self, *exc):
+        if self.lock_file is not None:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+            self.lock_file.close()
+            self.lock_file = None
+        self.thread_lock.release()
+
+
+class MirrorStore:
+    """管理所有仓库的 blobless 裸镜像"""
+
+    def __init__(self, mirrors_dir):
+        self.mirrors_dir = mirrors_dir
+
+    def mirror_path(self, owner, repo):
+        return os.path.join(self.mirrors_dir, f"{owner}_{repo}.git")
+
+    @staticmethod
+    def try_lock(path):
+        """非阻塞地锁住镜像（磁盘预算淘汰前使用），镜像正在使用时抛出 BlockingIOError"""
+        return _MirrorLock(path, blocking=False)
+
+    @staticmethod
+    def _touch(path):
+        """更新镜像目录的修改时间，磁盘预算按它判断最近使用"""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def ensure(self, repo_url, owner, repo):
+        """确保镜像存在并且足够新，返回镜像路径"""
+        path = self.mirror_path(owner, repo)
+        stamp = os.path.join(path, 'FETCH_STAMP')
+
+        with _MirrorLock(path):
+            self._touch(path)
+            if not os.path.exists(os.path.join(path, 'HEAD')):
+                print(f"创建镜像: {repo_url} -> {path}")
+                os.makedirs(self.mirrors_dir, exist_ok=True)
+                run_git(['clone', '--bare', '--filter=blob:none', '--no-tags', '--end-of-options', repo_url, path])
+                run_git(['config', 'remote.origin.fetch', '+refs/heads/*:refs/heads/*'], cwd=path)
+            elif self._is_stale(stamp) or self._is_shallow(path):
+                print(f"更新镜像: {path}")
+                args = ['fetch', '--prune', '--filter=blob:none', 'origin']
+                if self._is_shallow(path):
+                    # 之前只拉取过单个引用，补全历史
+                    args.insert(1, '--unshallow')
+                run_git(args, cwd=path)
+            else:
+                return path
+
+            with open(stamp, 'w') as f:
+                f.write(str(time.time()))
+        return path
+
+    def fetch_ref(self, repo_url, owner, repo, ref, sha=None):
+        """只把单个引用（分支、标签或提交SHA）拉取到镜像中，返回 (镜像路径, 提交SHA)
+
+        sha 为 ls-remote 解析出的提交，镜像中已有该提交时不再拉取。
+        镜像不存在时创建一个只含该提交的浅镜像；已有完整历史的镜像不加 --depth，避免变回浅镜像。
+        已有的对象不会重复下载，不同引用之间相同的 blob 共用同一份对象和统计缓存
+        """
+        if sha is None and re.fullmatch(r'[0-9a-f]{40}', ref or ''):
+            sha = ref
+        if not is_valid_ref(ref):
+            raise RuntimeError(f"无效的引用: {ref}")
+        path = self.mirror_path(owner, repo)
+        with _MirrorLock(path):
+            self._touch(path)
+            if not os.path.exists(os.path.join(path, 'HEAD')):
+                print(f"创建镜像: {repo_url} -> {path}")
+                os.makedirs(self.mirrors_dir, exist_ok=True)
+                self._init_partial(repo_url, path)
+                shallow = True
+            elif sha and self._has_commit(path, sha):
+                return path, sha
+            else:
+                shallow = self._is_shallow(path)
+            print(f"拉取引用: {ref} -> {path}")
+            args = ['fetch', '--filter=blob:none', '--no-tags']
+            if shallow:
+                args += ['--depth', '1']
+            run_git(args + ['--end-of-options', 'origin', ref], cwd=path)
+            return path, self.rev_parse(path, 'FETCH_HEAD')
+
+    @staticmethod
+    def _init_partial(repo_url, path):
+        """创建空的 blobless 裸仓库，配置与 clone --bare --filter=blob:none 一致"""
+        run_git(['init', '--bare', '-q', path])
+        for key, value in (('remote.origin.url', repo_url),
+                           ('remote.origin.fetch', '+refs/heads/*:refs/heads/*'),
+                           ('remote.origin.promisor', 'true'),
+                           ('remote.origin.partialclonefilter', 'blob:none')):
+            run_git(['config', key, value], cwd=path)
+        # HEAD 指向远程的默认分支，之后 ensure() 补全历史时可以直接使用
+        output = run_git(['ls-remote', '--symref', 'origin', 'HEAD'], cwd=path).decode()
+        match = re.match(r'ref: (refs/heads/\S+)\tHEAD', output)
+        if match:
+            run_git(['symbolic-ref', 'HEAD', match.group(1)], cwd=path)
+
+    @staticmethod
+    def _has_commit(path, sha):
+        try:
+            run_git(['cat-file', '-e', sha + '^{commit}'], cwd=path)
+            return True
+        except RuntimeError:
+            return False
+
+    @staticmethod
+    def _is_shallow(path):
+        return os.path.exists(os.path.join(path, 'shallow'))
+
+    @staticmethod
+    def _is_stale(stamp):
+        try:
+            return time.time() - os.path.getmtime(stamp) > MIRROR_REFRESH_INTERVAL
+        except OSError:
+            return True
+
+    def rev_parse(self, path, ref='HEAD'):
+        return run_git(['rev-parse', '--verify', ref + '^{commit}'], cwd=path).decode().strip()
+
+    def first_parent_history(self, path, ref='HEAD'):
+        """返回第一父提交历史 [(timestamp, sha)]，从旧到新"""
+        output = run_git(['rev-list', '--first-parent', '--timestamp', '--reverse', ref], cwd=path)
+        commits = []
+        for line in output.decode().splitlines():
+            timestamp, sha = line.split()
+            commits.append((int(timestamp), sha))
+        return commits
+
+    def list_tree(self, path, commit):
+        """列出提交中的所有普通文件，返回 {路径: blob_sha}（跳过符号链接和子模块）"""
+        output = run_git(['ls-tree', '-r', '-z', '--full-tree', commit], cwd=path)
+        files = {}
+        for record in output.split(b'\0'):
+            if not record:
+                continue
+            meta, file_path = record.split(b'\t', 1)
+            mode, obj_type, sha = meta.split()
+            if obj_type != b'blob' or mode == b'120000':
+                continue
+            files[file_path.decode('utf-8', errors='replace')] = sha.decode()
+        return files
+
+    def blob_at(self, path, commit, file_path):
+        """返回提交中某个文件的 blob SHA，不存在返回 None（不需要列出整棵树）"""
+        try:
+            return run_git(['rev-parse', '--verify', '-q', f"{commit}:{file_path}"], cwd=path).decode().strip()
+        except RuntimeError:
+            return None
+
+    def diff_tree(self, path, old_commit, new_commit):
+        """比较两个提交的树，返回 [(状态, 路径, 旧blob, 新blob)]
+
+        只比较树对象，不需要文件内容；未变化的子树直接跳过
+        """
+        output = run_git(['diff-tree', '-r', '-z', '--no-renames', '--no-commit-id',
+                          old_commit, new_commit], cwd=path)
+        changes = []
+        fields = output.split(b'\0')
+        i = 0
+        while i < len(fields) - 1:
+            meta = fields[i]
+            if not meta.startswith(b':'):
+                i += 1
+                continue
+            old_mode, new_mode, old_sha, new_sha, status = meta[1:].split()
+            file_path = fields[i + 1].decode('utf-8', errors='replace')
+            i += 2
+            # 符号链接和子模块不统计
+            if old_mode in (b'120000', b'160000') and new_mode in (b'120000', b'160000', b'000000'):
+                continue
+            if new_mode in (b'120000', b'160000'):
+                status = b'D'
+            changes.append((status.decode()[:1], file_path, old_sha.decode(), new_sha.decode()))
+        return changes
+
+    def prefetch_blobs(self, path, blob_shas):
+        """批量拉取缺失的 blob（与 git 按需拉取使用相同的方式，但一次请求多个对象）"""
+        blob_shas = list(blob_shas)
+        for i in range(0, len(blob_shas), PREFETCH_CHUNK):
+            chunk = blob_shas[i:i + PREFETCH_CHUNK]
+            try:
+                run_git(['-c', 'fetch.negotiationAlgorithm=noop', 'fetch', 'origin',
+                         '--no-tags', '--no-write-fetch-head', '--recurse-submodules=no',
+                         '--filter=blob:none', '--stdin'],
+                        cwd=path, input='\n'.join(chunk).encode() + b'\n')
+            except RuntimeError as e:
+                # 失败时由 cat-file 逐个按需拉取
+                print(f"批量拉取blob失败，回退到按需拉取: {e}")
+                return
+
+    def read_blobs(self, path, blob_shas, max_size=None):
+        """逐个产出 (blob_sha, 内容)，使用一个 cat-file --batch 进程
+
+        超过 max_size 字节的 blob 按头部中的大小分块跳过，不读入内存，内容产出为 None
+        """
+        blob_shas = list(blob_shas)
+        if not blob_shas:
+            return
+        process = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=path, env=git_env(),
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL)
+
+        # 另开线程写入请求，避免管道写满时互相等待
+        def feed():
+            try:
+                for sha in blob_shas:
+                    process.stdin.write(sha.encode() + b'\n')
+                process.stdin.close()
+            except (BrokenPipeError, OSError):
+                pass
+
+        writer = threading.Thread(target=feed, daemon=True)
+        writer.start()
+        try:
+            for _ in blob_shas:
+                header = process.stdout.readline()
+                if not header:
+                    break
+                parts = header.split()
+                if len(parts) < 3 or parts[1] == b'missing':
+                    continue
+                size = int(parts[2])
+                if max_size is not None and size > max_size:
+                    remaining = size + 1  # 包括结尾的换行
+                    while remaining > 0:
+                        chunk = process.stdout.read(min(remaining, SKIP_CHUNK_SIZE))
+                        if not chunk:
+                            break
+                        remaining -= len(chunk)
+                    yield parts[0].decode(), None
+                    continue
+                data = process.stdout.read(size)
+                process.stdout.read(1)  # 结尾的换行
+                yield parts[0].decode(), data
+        finally:
+            process.stdout.close()
+            process.wait()
+            writer.join()
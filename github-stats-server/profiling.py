@@ -0,0 +1,163 @@
+# 按需性能分析
+# 管理员请求时带上令牌和分析模式，该请求在分析器下执行，结果保存在磁盘上供下载：
+# cprofile 记录每个函数的调用次数和耗时；sample 每隔几毫秒采样一次调用栈，开销更低，
+# 输出折叠栈（folded stacks），可以直接生成火焰图。
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILE_MODES = ('cprofile', 'sample')
+# 采样间隔（秒）
+SAMPLE_INTERVAL = 0.005
+# 文本报告中列出的函数数量
+REPORT_LIMIT = 60
+# 磁盘上保留的分析结果数量
+MAX_PROFILES = 100
+
+_local = threading.local()
+
+
+def active():
+    """当前线程是否正在进行性能分析"""
+    return getattr(_local, 'session', None) is not None
+
+
+class _Sampler(threading.Thread):
+    """定时采样目标线程的调用栈"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class ProfileSession:
+    """一次性能分析，结束后 files 为 {扩展名: 内容}"""
+
+    def __init__(self, mode, label):
+        self.mode = mode
+        self.label = label
+        self.profile_id = None
+        self.files = {}
+        self.started = time.time()
+        self.elapsed = None
+
+    def start(self):
+        if self.mode == 'cprofile':
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.profiler = _Sampler(threading.get_ident())
+            self.profiler.start()
+
+    def stop(self):
+        self.elapsed = time.time() - self.started
+        header = f"# {self.label}\n# mode={self.mode} elapsed={self.elapsed:.3f}s\n"
+        if self.mode == 'cprofile':
+            self.profiler.disable()
+            report = io.StringIO()
+            stats = pstats.Stats(self.profiler, stream=report)
+            stats.sort_stats('cumulative').print_stats(REPORT_LIMIT)
+            stats.sort_stats('tottime').print_stats(REPORT_LIMIT)
+            self.files['txt'] = header + report.getvalue()
+            # 与 Profile.dump_stats 的格式相同，可以用 pstats / snakeviz 打开
+            self.profiler.create_stats()
+            self.files['prof'] = marshal.dumps(self.profiler.stats)
+        else:
+            sampler = self.profiler
+            sampler.stop()
+            self.files['folded'] = ''.join(f"{stack} {count}\n" for stack, count in sampler.stacks.most_common())
+            # 文本报告：每个函数出现在栈顶（自身）和栈中任意位置（累计）的采样数
+            own, total = Counter(), Counter()
+            for stack, count in sampler.stacks.items():
+                frames = stack.split(';')
+                own[frames[-1]] += count
+                for name in set(frames):
+                    total[name] += count
+            lines = [header, f"# samples={sampler.samples} interval={sampler.interval * 1000:.0f}ms\n",
+                     '\n自身采样数  累计采样数  函数\n']
+            for name, count in total.most_common(REPORT_LIMIT):
+                lines.append(f"{own[name]:>10}  {count:>10}  {name}\n")
+            self.files['txt'] = ''.join(lines)
+
+
+class ProfileStore:
+    """分析结果保存在 directory 中，文件名为 <id>.<扩展名>，只保留最近 max_profiles 个"""
+
+    def __init__(self, directory, max_profiles=MAX_PROFILES):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def _path(self, profile_id, extension):
+        return os.path.join(self.directory, f"{profile_id}.{extension}")
+
+    def save(self, session):
+        os.makedirs(self.directory, exist_ok=True)
+        session.profile_id = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        for extension, content in session.files.items():
+            if isinstance(content, str):
+                content = content.encode('utf-8')
+            with open(self._path(session.profile_id, extension), 'wb') as f:
+                f.write(content)
+        self._prune()
+        return session.profile_id
+
+    def _prune(self):
+        ids = sorted({name.split('.', 1)[0] for name in os.listdir(self.directory)})
+        for profile_id in ids[:-self.max_profiles]:
+            for name in os.listdir(self.directory):
+                if name.startswith(profile_id + '.'):
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except OSError:
+                        pass
+
+    def find(self, profile_id, extension):
+        """返回分析结果文件的路径，不存在时返回 None"""
+        if not profile_id.replace('-', '').isalnum():
+            return None
+        path = self._path(profile_id, extension)
+        return path if os.path.exists(path) else None
+
+
+@contextmanager
+def session(mode, store, label):
+    """在分析器下执行 with 中的代码，结束后保存；产出 ProfileSession（退出后 profile_id 可用）"""
+    current = ProfileSession(mode, label)
+    _local.session = current
+    current.start()
+    try:
+        yield current
+    finally:
+        _local.session = None
+        current.stop()
+        store.save(current)
+        print(f"性能分析已保存: {current.profile_id} ({mode}, {current.elapsed:.2f}s)")
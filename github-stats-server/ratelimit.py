@@ -0,0 +1,138 @@
+# 限流
+# 每个客户端（API key 或 IP）一个令牌桶，状态存放在 SQLite 中，所有 gunicorn worker 共享。
+# 命中缓存的请求只消耗少量令牌，需要克隆和统计的冷分析消耗更多；
+# 另外限制每个客户端同时进行的冷分析数量，突发请求时一个客户端不能占满所有 worker。
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class RateLimiter:
+    """跨 worker 共享的令牌桶和并发名额
+
+    rate 为每秒补充的令牌数，burst 为桶的容量；
+    max_active 为单个客户端同时进行的冷分析数量上限，lease_seconds 后未释放的名额视为失效（worker 崩溃）
+    """
+
+    def __init__(self, db_path, rate=0.5, burst=60, max_active=2, lease_seconds=300):
+        self.db_path = db_path
+        self.rate = rate
+        self.burst = burst
+        self.max_active = max_active
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+
+    @classmethod
+    def from_env(cls, db_path):
+        """从环境变量读取参数（RATE_LIMIT_PER_SEC / RATE_LIMIT_BURST / RATE_LIMIT_MAX_ACTIVE）"""
+        defaults = cls(db_path)
+        return cls(db_path,
+                   rate=_env_float('RATE_LIMIT_PER_SEC', defaults.rate),
+                   burst=_env_float('RATE_LIMIT_BURST', defaults.burst),
+                   max_active=int(_env_float('RATE_LIMIT_MAX_ACTIVE', defaults.max_active)),
+                   lease_seconds=defaults.lease_seconds)
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def _create_tables(self, conn):
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS buckets (client TEXT PRIMARY KEY, tokens REAL, updated REAL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS active (slot TEXT PRIMARY KEY, client TEXT, expires REAL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS active_client ON active (client)')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            # 手动管理事务：BEGIN IMMEDIATE 保证读取和更新令牌之间没有其他 worker 写入
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            self._create_tables(conn)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def warm(self):
+        """预先创建数据库和表结构（使用临时连接，worker 各自建立连接）"""
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            self._create_tables(conn)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def take(self, client, cost):
+        """从客户端的令牌桶中扣除 cost 个令牌
+
+        返回 0 表示允许；令牌不足时不扣除，返回需要等待的秒数
+        """
+        if not self.enabled or cost <= 0:
+            return 0
+        now = time.time()
+        try:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT tokens, updated FROM buckets WHERE client = ?', (client,)).fetchone()
+                tokens = self.burst if row is None else min(self.burst, row[0] + (now - row[1]) * self.rate)
+                if tokens >= cost:
+                    tokens -= cost
+                    wait = 0
+                else:
+                    wait = (cost - tokens) / self.rate
+                conn.execute('INSERT OR REPLACE INTO buckets (client, tokens, updated) VALUES (?, ?, ?)',
+                             (client, tokens, now))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            # 限流存储不可用时放行，不影响正常服务
+            print(f"限流检查失败: {e}")
+            return 0
+        return wait
+
+    def acquire(self, client):
+        """占用客户端的一个冷分析名额，返回名额ID；已达上限时返回 None"""
+        if not self.enabled or self.max_active <= 0:
+            return ''
+        now = time.time()
+        slot = uuid.uuid4().hex
+        try:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('DELETE FROM active WHERE expires < ?', (now,))
+                active = conn.execute('SELECT COUNT(*) FROM active WHERE client = ?', (client,)).fetchone()[0]
+                if active >= self.max_active:
+                    slot = None
+                else:
+                    conn.execute('INSERT INTO active (slot, client, expires) VALUES (?, ?, ?)',
+                                 (slot, client, now + self.lease_seconds))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            print(f"并发名额检查失败: {e}")
+            return ''
+        return slot
+
+    def release(self, slot):
+        if not slot:
+            return
+        try:
+            self._connection().execute('DELETE FROM active WHERE slot = ?', (slot,))
+        except sqlite3.Error as e:
+            print(f"释放并发名额失败: {e}")
@@ -0,0 +1,77 @@
+# 过期结果的后台重新统计
+# 统计配置（profile）变化后，旧 profile 的结果仍然先返回给客户端，同时排队重新统计；
+# 请求次数越多的仓库越先更新，部署后不会因为缓存同时失效而出现大量冷分析。
+import os
+import threading
+
+# 每个 worker 最多排队的过期结果数量，超出的请求不再排队（下次请求时再排）
+MAX_PENDING = 1000
+
+
+class StaleRefresher:
+    """按请求次数排序的后台重新统计队列（每个 worker 一个线程）
+
+    refresh_func(*args) 重新统计并写入缓存；on_start() 在线程启动时执行一次（例如清理旧 profile 的条目）
+    """
+
+    def __init__(self, refresh_func, on_start=None, max_pending=MAX_PENDING):
+        self.refresh_func = refresh_func
+        self.on_start = on_start
+        self.max_pending = max_pending
+        self.pending = {}  # 键 -> [请求次数, 参数]
+        self.running = None
+        self.refreshed = 0
+        self.failed = 0
+        self.condition = threading.Condition()
+        self._thread = None
+        self._pid = None
+
+    def request(self, key, *args):
+        """记录一次对过期结果 key 的请求，排队重新统计"""
+        with self.condition:
+            if key == self.running:
+                return
+            entry = self.pending.get(key)
+            if entry is not None:
+                entry[0] += 1
+            elif len(self.pending) < self.max_pending:
+                self.pending[key] = [1, args]
+            self.condition.notify()
+        self._ensure_thread()
+
+    def _ensure_thread(self):
+        # gunicorn 预加载时 master 中启动的线程不会带到 worker
+        with self.condition:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='stale-refresh', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        if self.on_start is not None:
+            try:
+                self.on_start()
+            except Exception as e:
+                print(f"后台重新统计初始化失败: {e}")
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                key = max(self.pending, key=lambda k: self.pending[k][0])
+                hits, args = self.pending.pop(key)
+                self.running = key
+            try:
+                print(f"重新统计过期结果: {key} ({hits} 次请求)")
+                self.refresh_func(*args)
+                self.refreshed += 1
+            except Exception as e:
+                print(f"重新统计失败 {key}: {e}")
+                self.failed += 1
+            finally:
+                with self.condition:
+                    self.running = None
+
+    def stats(self):
+        with self.condition:
+            return {'pending': len(self.pending), 'refreshed': self.refreshed, 'failed': self.failed}
@@ -0,0 +1,366 @@
+# 统计结果缓存
+# 按 owner/repo@commit_sha 存储在磁盘上，所有 gunicorn worker 共享。
+# 同一个提交的统计结果不会变化，因此缓存不设过期时间；
+# 每个条目带有统计配置的 profile（analyzer_profile.py），profile 不同的条目视为过期。
+# BlobCache 按 git blob SHA 缓存单个文件的行数统计，供历史趋势等按对象增量计算的功能复用；
+# 按 tree SHA 缓存的子树统计（subtrees.py）也存放在同一个库中。
+# ResponseCache 是磁盘缓存前面的一层进程内缓存，直接保存序列化（和压缩）后的响应内容。
+import os
+import gzip
+import json
+import hashlib
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# 读取缓存时最多每隔这么久更新一次文件修改时间，磁盘预算按它判断最近使用（秒）
+TOUCH_INTERVAL = 3600
+# 清理旧 profile 的 blob 缓存时每个事务删除的条目数，以及事务之间的间隔（秒），不长时间占用写锁
+PURGE_BATCH_SIZE = 1000
+PURGE_PAUSE = 0.05
+
+
+class ResultCache:
+    """磁盘上的统计结果存储，profile 为当前统计配置的 ID"""
+
+    def __init__(self, cache_dir, profile=''):
+        self.cache_dir = cache_dir
+        self.profile = profile
+
+    def warm(self):
+        """预先创建目录结构，返回已缓存的结果数量"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        count = 0
+        for name in os.listdir(self.cache_dir):
+            bucket = os.path.join(self.cache_dir, name)
+            if len(name) == 2 and os.path.isdir(bucket):
+                count += sum(1 for f in os.listdir(bucket) if f.endswith('.json'))
+        print(f"结果缓存: {count} 条")
+        return count
+
+    @staticmethod
+    def make_key(owner, repo, sha, variant=None):
+        """生成缓存键，variant 区分同一提交的不同统计方式（如包含子模块）"""
+        key = f"{owner}/{repo}@{sha}"
+        return f"{key}+{variant}" if variant else key
+
+    def _path(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + '.json')
+
+    def get(self, key):
+        """读取当前 profile 的缓存结果，不存在、损坏或已过期时返回 None"""
+        entry = self._read(key)
+        if entry is None or entry.get('profile') != self.profile:
+            return None
+        return entry.get('result')
+
+    def get_stale(self, key):
+        """读取缓存结果，不检查 profile（用于在重新统计完成前先返回旧结果）"""
+        entry = self._read(key)
+        return entry.get('result') if entry is not None else None
+
+    def _read(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"读取缓存失败 {key}: {e}")
+            return None
+        if entry.get('key') != key:
+            return None
+        self._touch(path)
+        return entry
+
+    @staticmethod
+    def _touch(path):
+        try:
+            if time.time() - os.path.getmtime(path) > TOUCH_INTERVAL:
+                os.utime(path)
+        except OSError:
+            pass
+
+    def contains(self, key):
+        """是否已有当前 profile 的缓存结果（只读取文件开头的键和 profile，不解析整个结果）
+
+        旧 profile 的条目需要重新统计，返回 False
+        """
+        prefix = json.dumps({'key': key, 'profile': self.profile}, ensure_ascii=False, separators=(',', ':'))[:-1] + ','
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                return f.read(len(prefix)) == prefix
+        except (OSError, UnicodeDecodeError):
+            return False
+
+    def put(self, key, result):
+        """写入缓存结果（先写临时文件再原子替换，避免并发读到半个文件）"""
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'key': key, 'profile': self.profile, 'result': result}, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"写入缓存失败 {key}: {e}")
+
+    def _rows_path(self, key):
+        return self._path(key)[:-len('.json')] + '.rows'
+
+    def put_rows(self, key, columns, rows):
+        """写入结果的明细行：每行一个 JSON 数组，第一行为 [键, profile]，第二行为列名
+
+        导出时逐行读取，不需要载入和解析整个结果
+        """
+        path = self._rows_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(json.dumps([key, self.profile], ensure_ascii=False) + '\n')
+                f.write(json.dumps(columns, ensure_ascii=False) + '\n')
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False, separators=(',', ':')) + '\n')
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"写入明细失败 {key}: {e}")
+
+    def has_rows(self, key):
+        """是否有当前 profile 的明细"""
+        try:
+            with open(self._rows_path(key), 'r', encoding='utf-8') as f:
+                return json.loads(f.readline() or 'null') == [key, self.profile]
+        except (OSError, ValueError):
+            return False
+
+    def iter_rows(self, key):
+        """逐行产出明细，第一行为列名；不存在或已过期时不产出任何内容"""
+        try:
+            f = open(self._rows_path(key), 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with f:
+            if json.loads(f.readline() or 'null') != [key, self.profile]:
+                return
+            for line in f:
+                yield json.loads(line)
+
+
+class BlobCache:
+    """单个文件（git blob）的统计结果缓存，存储在 SQLite 中
+
+    键为 blob SHA 加文件名：同样的内容在不同文件名下可能识别为不同语言。
+    值为 analyze_file_content 的结果，非文本文件存为 None。
+    存储时键前加上 profile，其他 profile 的条目读不到，由 purge_stale() 清理。
+    """
+
+    def __init__(self, db_path, profile=''):
+        self.db_path = db_path
+        self.prefix = f"{profile}:"
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        # fork 出的分析子进程不能使用父进程的连接
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS blobs (key TEXT PRIMARY KEY, value TEXT)')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def warm(self):
+        """预先创建数据库和表结构
+
+        使用临时连接并立即关闭：SQLite 连接不能跨 fork 共享，worker 各自建立连接
+        """
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS blobs (key TEXT PRIMARY KEY, value TEXT)')
+            count = conn.execute('SELECT COUNT(*) FROM blobs').fetchone()[0]
+            print(f"blob缓存: {count} 条")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(blob_sha, file_name):
+        return f"{blob_sha}:{file_name}"
+
+    def get_many(self, keys):
+        """批量读取，返回 {key: value}，不存在的键不出现在结果中"""
+        found = {}
+        prefix = self.prefix
+        keys = [prefix + key for key in keys]
+        conn = self._connection()
+        # SQLite 默认最多 999 个参数
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = conn.execute(f'SELECT key, value FROM blobs WHERE key IN ({placeholders})', chunk)
+            for key, value in rows:
+                found[key[len(prefix):]] = json.loads(value)
+        return found
+
+    def put_many(self, items):
+        """批量写入 {key: value}"""
+        if not items:
+            return
+        conn = self._connection()
+        try:
+            with conn:
+                conn.executemany('INSERT OR REPLACE INTO blobs (key, value) VALUES (?, ?)',
+                                 [(self.prefix + key, json.dumps(value, separators=(',', ':')))
+                                  for key, value in items.items()])
+        except Exception as e:
+            print(f"写入blob缓存失败: {e}")
+
+    def purge_stale(self, batch_size=PURGE_BATCH_SIZE):
+        """删除其他 profile 的条目，返回删除的数量
+
+        按主键范围分批删除，每批一个事务；同一节点只由一个 worker 执行（文件锁），
+        完成后写入标记文件，当前 profile 已清理过时直接返回
+        """
+        marker = self.db_path + '.purged'
+        lock_file = None
+        try:
+            if fcntl is not None:
+                lock_file = open(self.db_path + '.purge.lock', 'w')
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return 0
+            try:
+                with open(marker, encoding='utf-8') as f:
+                    if f.read() == self.prefix:
+                        return 0
+            except OSError:
+                pass
+            deleted = self._purge_batches(batch_size)
+            with open(marker, 'w', encoding='utf-8') as f:
+                f.write(self.prefix)
+        except Exception as e:
+            print(f"清理blob缓存失败: {e}")
+            return 0
+        finally:
+            if lock_file is not None:
+                lock_file.close()
+        if deleted:
+            print(f"清理过期的blob缓存: {deleted} 条")
+        return deleted
+
+    def _purge_batches(self, batch_size):
+        upper = self.prefix[:-1] + chr(ord(self.prefix[-1]) + 1)
+        conn = self._connection()
+        deleted = 0
+        for condition, bound in (('key < ?', self.prefix), ('key >= ?', upper)):
+            while True:
+                with conn:
+                    count = conn.execute(
+                        f'DELETE FROM blobs WHERE key IN (SELECT key FROM blobs WHERE {condition} LIMIT ?)',
+                        (bound, batch_size)).rowcount
+                deleted += count
+                if count < batch_size:
+                    break
+                time.sleep(PURGE_PAUSE)
+        return deleted
+
+
+class CachedResponse:
+    """序列化后的响应内容及其 gzip 压缩版本"""
+
+    __slots__ = ('body', 'gzipped')
+
+    def __init__(self, body):
+        self.body = body
+        self.gzipped = gzip.compress(body, 6)
+
+    @property
+    def size(self):
+        return len(self.body) + len(self.gzipped)
+
+
+class ResponseCache:
+    """每个 worker 进程内的 LRU 响应缓存，按总字节数限制大小
+
+    键为 owner/repo@sha；同一 slot（默认为 owner/repo）写入新的 SHA 时，旧 SHA 的条目被移除。
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._latest = {}  # slot -> 当前缓存的键
+        self._slots = {}  # 键 -> slot
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """返回 CachedResponse，不存在返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, slot=None):
+        """缓存序列化后的响应内容（bytes），返回 CachedResponse"""
+        entry = CachedResponse(body)
+        if entry.size > self.max_bytes:
+            return entry
+        slot = slot or key.split('@', 1)[0]
+        with self._lock:
+            previous = self._latest.get(slot)
+            if previous is not None and previous != key:
+                self._remove(previous)
+            self._remove(key)
+            self._entries[key] = entry
+            self._latest[slot] = key
+            self._slots[key] = slot
+            self.total_bytes += entry.size
+            while self.total_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return entry
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.total_bytes -= entry.size
+        slot = self._slots.pop(key)
+        if self._latest.get(slot) == key:
+            del self._latest[slot]
+
+    def stats(self):
+        """命中率等计数（仅当前 worker）"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.total_bytes,
+                'maxBytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,202 @@
+# 分析任务的资源限制
+# 每个分析任务限制文件数量、读取字节数、运行时间和内存（子进程中通过 resource.setrlimit），
+# 超出限制时返回已统计的部分结果并标记 truncated，不影响 worker 本身。
+import math
+import multiprocessing
+import os
+import signal
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 子进程因限制被杀掉后，父进程额外等待的时间（秒）
+KILL_GRACE_SECONDS = 5
+# 内存不足时释放的预留内存，保证还能把部分结果发回父进程
+MEMORY_RESERVE_BYTES = 8 * 1024 * 1024
+# 子进程向父进程发送中间结果的间隔（秒），子进程被杀掉时父进程返回最近一次的中间结果
+CHECKPOINT_INTERVAL = 5
+
+# 子进程中发送中间结果的连接（父进程中为 None）
+_progress_conn = None
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class JobLimits:
+    """单个分析任务的资源上限，0 表示不限制"""
+
+    def __init__(self, max_files=200000, max_bytes=2 * 1024 * 1024 * 1024,
+                 max_seconds=90, max_rss_bytes=1024 * 1024 * 1024):
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.max_rss_bytes = max_rss_bytes
+
+    @classmethod
+    def from_env(cls):
+        """从环境变量读取限制（JOB_MAX_FILES / JOB_MAX_BYTES / JOB_MAX_SECONDS / JOB_MAX_RSS_MB）"""
+        defaults = cls()
+        return cls(max_files=_env_int('JOB_MAX_FILES', defaults.max_files),
+                   max_bytes=_env_int('JOB_MAX_BYTES', defaults.max_bytes),
+                   max_seconds=_env_int('JOB_MAX_SECONDS', defaults.max_seconds),
+                   max_rss_bytes=_env_int('JOB_MAX_RSS_MB', defaults.max_rss_bytes // (1024 * 1024)) * 1024 * 1024)
+
+
+class JobBudget:
+    """在遍历过程中累计已访问的文件数、读取的字节数和耗时
+
+    charge() 返回超出的限制名称（'files' / 'bytes' / 'time'），未超出返回 None。
+    多个仓库可以共用一个预算（父仓库和它的子模块），exhausted 为已超出的限制，之后的仓库不再统计
+    """
+
+    def __init__(self, limits):
+        self.limits = limits
+        self.files = 0
+        self.bytes = 0
+        self.exhausted = None
+        self.started = time.monotonic()
+        self._last_checkpoint = self.started
+
+    def charge(self, file_size=0):
+        """记录访问一个文件（file_size 为将要读取的字节数）"""
+        self.files += 1
+        self.bytes += file_size
+        limits = self.limits
+        if limits.max_files and self.files > limits.max_files:
+            self.exhausted = 'files'
+        elif limits.max_bytes and self.bytes > limits.max_bytes:
+            self.exhausted = 'bytes'
+        elif limits.max_seconds and time.monotonic() - self.started > limits.max_seconds:
+            self.exhausted = 'time'
+        return self.exhausted
+
+    def checkpoint_due(self):
+        """距离上次发送中间结果超过 CHECKPOINT_INTERVAL 秒时返回 True"""
+        now = time.monotonic()
+        if now - self._last_checkpoint < CHECKPOINT_INTERVAL:
+            return False
+        self._last_checkpoint = now
+        return True
+
+    def usage(self):
+        """在子进程中累计的值，返回父进程后用 restore() 写回"""
+        return self.files, self.bytes, self.exhausted
+
+    def restore(self, usage):
+        self.files, self.bytes, self.exhausted = usage
+
+    def remaining_limits(self):
+        """下一个子进程的限制：运行时间扣除共用预算已经用掉的部分"""
+        limits = self.limits
+        if not limits.max_seconds:
+            return limits
+        remaining = max(1, math.ceil(limits.max_seconds - (time.monotonic() - self.started)))
+        return JobLimits(limits.max_files, limits.max_bytes, remaining, limits.max_rss_bytes)
+
+    def truncation(self, reason):
+        """统计结果中的 truncated 字段：超出的限制、上限值和截断时已处理的文件数、字节数"""
+        limits = self.limits
+        limit = {'files': limits.max_files, 'bytes': limits.max_bytes,
+                 'time': limits.max_seconds, 'memory': limits.max_rss_bytes}.get(reason)
+        return {'reason': reason, 'limit': limit, 'files': self.files, 'bytes': self.bytes}
+
+
+def _apply_rlimits(limits):
+    """在子进程中设置内存和 CPU 时间上限"""
+    if resource is None:
+        return
+    if limits.max_rss_bytes:
+        # RLIMIT_AS 限制虚拟内存，比 RSS 更严格，但是唯一能可靠生效的限制
+        resource.setrlimit(resource.RLIMIT_AS, (limits.max_rss_bytes, limits.max_rss_bytes))
+    if limits.max_seconds:
+        cpu = limits.max_seconds + KILL_GRACE_SECONDS
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+
+
+def report_progress(payload):
+    """在 run_limited 的子进程中把中间结果发给父进程，其他情况下不做任何事"""
+    if _progress_conn is not None:
+        _progress_conn.send(('progress', payload))
+
+
+def _child_main(conn, func, args, limits, on_memory_error):
+    global _progress_conn
+    _progress_conn = conn
+    reserve = bytearray(MEMORY_RESERVE_BYTES)
+    try:
+        _apply_rlimits(limits)
+        conn.send(('ok', func(*args)))
+    except MemoryError:
+        del reserve
+        conn.send(('ok', on_memory_error()))
+    except BaseException as e:
+        conn.send(('error', f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+def sandbox_available():
+    return resource is not None and 'fork' in multiprocessing.get_all_start_methods()
+
+
+def run_limited(func, args, limits, on_memory_error, on_killed):
+    """在设置了资源限制的子进程中执行 func(*args)，返回其结果
+
+    on_memory_error() 在子进程内存不足时调用，返回部分结果；
+    on_killed(reason, progress) 在子进程被杀掉（超时、CPU 或内存上限）时调用，返回替代结果，
+    progress 为子进程最近一次通过 report_progress() 发送的中间结果（没有时为 None）。
+    子进程中抛出的其他异常在父进程中以 RuntimeError 抛出。
+    不支持 fork 的平台直接在当前进程中执行（只有文件数、字节数和时间限制生效）。
+    """
+    if not sandbox_available():
+        return func(*args)
+
+    # fork 后子进程直接使用已加载的应用和表，不需要重新导入
+    context = multiprocessing.get_context('fork')
+    parent_conn, child_conn = context.Pipe(duplex=False)
+    process = context.Process(target=_child_main,
+                              args=(child_conn, func, args, limits, on_memory_error),
+                              daemon=True)
+    process.start()
+    child_conn.close()
+
+    deadline = time.monotonic() + limits.max_seconds + KILL_GRACE_SECONDS if limits.max_seconds else None
+    progress = None
+    try:
+        while True:
+            if not parent_conn.poll(None if deadline is None else max(0, deadline - time.monotonic())):
+                status, payload = 'killed', 'time'
+                break
+            try:
+                status, payload = parent_conn.recv()
+            except EOFError:
+                status, payload = 'killed', None
+                break
+            if status != 'progress':
+                break
+            progress = payload
+    finally:
+        parent_conn.close()
+        if process.is_alive():
+            process.kill()
+        process.join()
+
+    if status == 'ok':
+        return payload
+    if status == 'error':
+        raise RuntimeError(payload)
+
+    if payload is None:
+        # 没有返回结果就退出：SIGXCPU 为 CPU 时间超限，其余按内存不足处理（包括被 OOM killer 杀掉）
+        sigxcpu = getattr(signal, 'SIGXCPU', None)
+        payload = 'time' if sigxcpu is not None and process.exitcode == -sigxcpu else 'memory'
+    print(f"分析子进程被终止 (原因: {payload}, 退出码: {process.exitcode})")
+    return on_killed(payload, progress)
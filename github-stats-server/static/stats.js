@@ -0,0 +1,228 @@
+// 每次只渲染可见区域的行，上下各多渲染若干行
+const ROW_OVERSCAN = 10;
+
+// 全局变量
+let currentFolder = '';
+let listing = {};              // 目录 -> {d: [[名称, 行数, 占比, 文件数]], f: [[名称, 行数, 占比]]}
+const folderRows = new Map();  // 目录首次访问时才构建行数据
+let currentRows = [];
+let rowHeight = 0;
+let renderedStart = -1;
+let renderedEnd = -1;
+let scheduled = false;
+
+// 初始化数据 - 从Base64解码
+try {
+    const statsElement = document.getElementById('stats-data');
+    if (!statsElement) {
+        throw new Error('找不到stats-data元素');
+    }
+    const statsB64 = statsElement.textContent.trim();
+    if (!statsB64) {
+        throw new Error('stats-data为空');
+    }
+    // Base64解码（按UTF-8解码，支持中文文件名）
+    const bytes = Uint8Array.from(atob(statsB64), c => c.charCodeAt(0));
+    listing = JSON.parse(new TextDecoder('utf-8').decode(bytes));
+} catch (error) {
+    console.error('数据解析失败:', error);
+    listing = {};
+}
+
+function parentOf(folderPath) {
+    return folderPath.includes('/') ? folderPath.substring(0, folderPath.lastIndexOf('/')) : '';
+}
+
+// 获取目录的行数据（懒加载，结果缓存）
+function getRows(folderPath) {
+    if (folderRows.has(folderPath)) {
+        return folderRows.get(folderPath);
+    }
+    const entry = listing[folderPath] || { d: [], f: [] };
+    const prefix = folderPath ? folderPath + '/' : '';
+    const rows = [];
+    
+    // 添加返回上级目录按钮（如果不在根目录）
+    if (folderPath) {
+        rows.push({ type: 'back', path: parentOf(folderPath) });
+    }
+    for (const [name, lines, percentage, files] of entry.d) {
+        rows.push({ type: 'folder', name, path: prefix + name, lines, percentage, files });
+    }
+    for (const [name, lines, percentage] of entry.f) {
+        rows.push({ type: 'file', name, lines, percentage });
+    }
+    // 如果目录为空
+    if (rows.length === (folderPath ? 1 : 0)) {
+        rows.push({ type: 'empty' });
+    }
+    
+    folderRows.set(folderPath, rows);
+    return rows;
+}
+
+function createElement(tag, className, text) {
+    const el = document.createElement(tag);
+    if (className) el.className = className;
+    if (text !== undefined) el.textContent = text;
+    return el;
+}
+
+// 创建单行元素（使用textContent，文件名不会被当作HTML）
+function createRow(row) {
+    let el;
+    if (row.type === 'back') {
+        el = createElement('div', 'back-button');
+        el.dataset.path = row.path;
+        const name = createElement('div', 'item-name');
+        name.append(createElement('span', '', '🔙'), createElement('span', '', '返回上级目录'));
+        el.appendChild(name);
+    } else if (row.type === 'empty') {
+        el = createElement('div', 'file-item');
+        const name = createElement('div', 'item-name');
+        name.style.color = '#656d76';
+        name.style.fontStyle = 'italic';
+        name.append(createElement('span', '', '📭'), createElement('span', '', '此目录为空'));
+        el.appendChild(name);
+    } else {
+        const isFolder = row.type === 'folder';
+        el = createElement('div', isFolder ? 'folder-item' : 'file-item');
+        if (isFolder) {
+            el.dataset.path = row.path;
+        }
+        const name = createElement('div', 'item-name');
+        name.append(createElement('span', isFolder ? 'folder-icon' : 'file-icon'), createElement('span', '', row.name));
+        
+        const stats = createElement('div', 'item-stats');
+        const bar = createElement('div', 'progress-bar');
+        const fill = createElement('div', 'progress-fill');
+        fill.style.width = row.percentage + '%';
+        bar.appendChild(fill);
+        stats.append(
+            createElement('span', 'lines-count', row.lines.toLocaleString() + ' 行'),
+            createElement('span', 'percentage', row.percentage.toFixed(1) + '%'),
+            bar
+        );
+        el.append(name, stats);
+    }
+    el.classList.add('virtual-row');
+    return el;
+}
+
+// 测量单行高度（不同屏幕宽度下样式不同）
+function measureRowHeight() {
+    const fileList = document.getElementById('fileList');
+    const probe = createRow({ type: 'folder', name: 'probe', path: '', lines: 0, percentage: 0, files: 0 });
+    probe.style.visibility = 'hidden';
+    fileList.appendChild(probe);
+    const height = probe.offsetHeight || 50;
+    probe.remove();
+    return height;
+}
+
+// 导航到指定文件夹
+function navigateToFolder(folderPath) {
+    currentFolder = folderPath;
+    currentRows = getRows(folderPath);
+    updateBreadcrumb();
+    
+    const fileList = document.getElementById('fileList');
+    if (!rowHeight) {
+        rowHeight = measureRowHeight();
+    }
+    fileList.style.height = (currentRows.length * rowHeight) + 'px';
+    
+    // 如果列表顶部已滚出屏幕，回到列表顶部
+    const top = fileList.getBoundingClientRect().top;
+    if (top < 0) {
+        window.scrollBy(0, top);
+    }
+    renderedStart = renderedEnd = -1;
+    renderFileList();
+}
+
+// 更新面包屑导航
+function updateBreadcrumb() {
+    const breadcrumb = document.getElementById('breadcrumb');
+    const root = createElement('a', '', '根目录');
+    root.dataset.path = '';
+    breadcrumb.replaceChildren(root);
+    
+    if (currentFolder) {
+        const pathParts = currentFolder.split('/');
+        let currentPath = '';
+        
+        for (let i = 0; i < pathParts.length; i++) {
+            currentPath += (i > 0 ? '/' : '') + pathParts[i];
+            const link = createElement('a', '', pathParts[i]);
+            link.dataset.path = currentPath;
+            breadcrumb.append(' ', createElement('span', '', '/'), ' ', link);
+        }
+    }
+}
+
+// 渲染文件列表 - 只渲染可见区域内的行
+function renderFileList() {
+    scheduled = false;
+    const fileList = document.getElementById('fileList');
+    const total = currentRows.length;
+    const viewTop = Math.max(0, -fileList.getBoundingClientRect().top);
+    const viewBottom = viewTop + window.innerHeight;
+    const start = Math.max(0, Math.floor(viewTop / rowHeight) - ROW_OVERSCAN);
+    const end = Math.min(total, Math.ceil(viewBottom / rowHeight) + ROW_OVERSCAN);
+    
+    if (start === renderedStart && end === renderedEnd) {
+        return;
+    }
+    renderedStart = start;
+    renderedEnd = end;
+    
+    const fragment = document.createDocumentFragment();
+    for (let i = start; i < end; i++) {
+        const el = createRow(currentRows[i]);
+        el.style.top = (i * rowHeight) + 'px';
+        el.style.height = rowHeight + 'px';
+        fragment.appendChild(el);
+    }
+    fileList.replaceChildren(fragment);
+}
+
+function scheduleRender() {
+    if (!scheduled) {
+        scheduled = true;
+        requestAnimationFrame(renderFileList);
+    }
+}
+
+// 页面加载完成后初始化
+function initializePage() {
+    try {
+        // 点击事件委托：文件夹、返回按钮和面包屑都带有 data-path
+        const onNavigate = (event) => {
+            const target = event.target.closest('[data-path]');
+            if (target) {
+                navigateToFolder(target.dataset.path);
+            }
+        };
+        document.getElementById('fileList').addEventListener('click', onNavigate);
+        document.getElementById('breadcrumb').addEventListener('click', onNavigate);
+        
+        window.addEventListener('scroll', scheduleRender, { passive: true });
+        window.addEventListener('resize', () => {
+            rowHeight = 0;
+            navigateToFolder(currentFolder);
+        });
+        
+        navigateToFolder('');
+    } catch (error) {
+        console.error('初始化出错:', error);
+    }
+}
+
+// 确保在页面加载完成后执行
+if (document.readyState === 'loading') {
+    document.addEventListener('DOMContentLoaded', initializePage);
+} else {
+    // DOM已经加载完成，立即执行
+    initializePage();
+}
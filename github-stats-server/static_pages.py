@@ -0,0 +1,61 @@
+# 静态页面和静态资源缓存
+# 页面在启动时读入内存并计算 ETag / Last-Modified，之后的请求不再读磁盘；
+# 静态资源的 URL 带上内容哈希，可以让浏览器长期缓存。
+import hashlib
+import os
+
+from flask import Response
+
+# HTML 页面的缓存时间（配合 ETag 重新验证）
+PAGE_MAX_AGE = 24 * 3600
+# 带版本号的静态资源缓存时间
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+
+class CachedPage:
+    """读入内存的静态 HTML 页面"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.body = f.read()
+        self.etag = hashlib.md5(self.body).hexdigest()
+        self.last_modified = int(os.path.getmtime(path))
+
+    def response(self, request):
+        """返回页面响应，客户端缓存仍有效时返回 304"""
+        response = Response(self.body, mimetype='text/html')
+        response.set_etag(self.etag)
+        response.last_modified = self.last_modified
+        response.cache_control.public = True
+        response.cache_control.max_age = PAGE_MAX_AGE
+        return response.make_conditional(request)
+
+
+class AssetVersions:
+    """静态资源的内容哈希，用于生成带版本号的 URL"""
+
+    def __init__(self, static_dir, url_prefix='/static/'):
+        self.static_dir = static_dir
+        self.url_prefix = url_prefix
+        self.versions = {}
+        for name in os.listdir(static_dir):
+            path = os.path.join(static_dir, name)
+            if os.path.isfile(path):
+                with open(path, 'rb') as f:
+                    self.versions[name] = hashlib.md5(f.read()).hexdigest()[:12]
+
+    def url(self, name):
+        version = self.versions.get(name)
+        if version is None:
+            return self.url_prefix + name
+        return f"{self.url_prefix}{name}?v={version}"
+
+    def apply_cache_headers(self, request, response):
+        """带版本号的静态资源内容不会变化，允许长期缓存"""
+        if request.path.startswith(self.url_prefix) and request.args.get('v') and response.status_code == 200:
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = ASSET_MAX_AGE
+            response.cache_control.immutable = True
+        return response
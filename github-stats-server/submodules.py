@@ -0,0 +1,85 @@
+# 子模块
+# 读取 .gitmodules 和 gitlink 得到每个子模块的路径、地址和提交，
+# 按需用 git submodule update --depth 1 --jobs 并行浅拉取。
+# 子模块的统计结果按 (仓库, 提交) 缓存，与直接统计该仓库共用同一个缓存键。
+import hashlib
+import os
+import re
+from urllib.parse import urljoin
+
+from mirrors import run_git
+
+# 并行拉取子模块的数量
+SUBMODULE_JOBS = 8
+# 单个仓库最多处理的子模块数量
+MAX_SUBMODULES = 100
+
+
+class Submodule:
+    """父仓库中的一个子模块"""
+
+    def __init__(self, path, url, sha):
+        self.path = path
+        self.url = url
+        self.sha = sha
+        self.owner, self.repo = submodule_identity(url)
+
+
+def resolve_url(parent_url, url):
+    """相对地址（./ 或 ../ 开头）按父仓库地址解析"""
+    if url.startswith(('./', '../')):
+        return urljoin(parent_url.rstrip('/') + '/', url)
+    return url
+
+
+def submodule_identity(url):
+    """从子模块地址得到 (owner, repo)，用于缓存键；无法解析时使用地址的哈希"""
+    match = re.search(r'[/:]([^/:]+)/([^/]+?)(?:\.git)?/?$', url)
+    if match:
+        return match.group(1), match.group(2)
+    return 'submodule', hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+
+
+def _gitmodules(repo_path):
+    """解析 .gitmodules，返回 {路径: 地址}"""
+    if not os.path.exists(os.path.join(repo_path, '.gitmodules')):
+        return {}
+    try:
+        output = run_git(['config', '-z', '-f', '.gitmodules', '--get-regexp',
+                          r'^submodule\..*\.(path|url)$'], cwd=repo_path)
+    except RuntimeError:
+        return {}
+
+    entries = {}
+    for record in output.decode('utf-8', errors='replace').split('\0'):
+        if '\n' not in record:
+            continue
+        key, value = record.split('\n', 1)
+        name, _, field = key[len('submodule.'):].rpartition('.')
+        entries.setdefault(name, {})[field] = value
+    return {entry['path']: entry['url'] for entry in entries.values() if 'path' in entry and 'url' in entry}
+
+
+def list_submodules(repo_path, parent_url):
+    """列出检出的提交中的子模块 [Submodule]，只包含 .gitmodules 中有地址的 gitlink"""
+    urls = _gitmodules(repo_path)
+    if not urls:
+        return []
+    output = run_git(['ls-files', '-s', '-z'], cwd=repo_path)
+    submodules = []
+    for record in output.split(b'\0'):
+        if not record.startswith(b'160000 '):
+            continue
+        meta, path = record.split(b'\t', 1)
+        path = path.decode('utf-8', errors='replace')
+        if path in urls:
+            submodules.append(Submodule(path, resolve_url(parent_url, urls[path]), meta.split()[1].decode()))
+    return submodules[:MAX_SUBMODULES]
+
+
+def fetch_submodules(repo_path, paths, jobs=SUBMODULE_JOBS):
+    """并行浅拉取指定路径的子模块（不递归）"""
+    if not paths:
+        return
+    run_git(['submodule', 'update', '--init', '--depth', '1',
+             '--jobs', str(jobs), '--'] + list(paths), cwd=repo_path)
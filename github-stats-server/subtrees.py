@@ -0,0 +1,174 @@
+# 子树统计缓存
+# git 的每个目录都有 tree SHA，内容相同的目录（未修改的子目录、vendored 的库、fork）SHA 相同。
+# 每个目录的统计按 tree SHA 缓存：汇总的行数、文件数、类型和语言分布，直接包含的文件，以及子目录的 tree SHA。
+# 统计新提交时，SHA 已缓存的目录整体嫁接到结果中，不再遍历和读取其中的文件。
+import os
+
+from mirrors import run_git
+
+COUNT_KEYS = ('lines', 'code', 'comment', 'blank')
+
+
+def read_tree_shas(repo_path):
+    """检出目录中每个目录的 tree SHA {相对路径: sha}，根目录为 ''；不是 git 仓库时返回空字典"""
+    try:
+        root = run_git(['rev-parse', 'HEAD^{tree}'], cwd=repo_path).decode().strip()
+        output = run_git(['ls-tree', '-r', '-d', '-z', 'HEAD'], cwd=repo_path)
+    except (RuntimeError, OSError):
+        return {}
+    trees = {'': root}
+    for record in output.split(b'\0'):
+        if not record:
+            continue
+        meta, path = record.split(b'\t', 1)
+        _, obj_type, sha = meta.split()
+        if obj_type == b'tree':
+            trees[path.decode('utf-8', errors='replace')] = sha.decode()
+    return trees
+
+
+def _join(directory, name):
+    return f"{directory}/{name}" if directory else name
+
+
+def _new_entry():
+    return {'totals': {'lines': 0, 'files': 0, 'code': 0, 'comment': 0, 'blank': 0},
+            'file_types': {}, 'languages': {}, 'files': {}, 'lfs': {}, 'dirs': {}}
+
+
+def _merge_into(entry, child):
+    """把子目录的汇总累加到目录上"""
+    for key, value in child['totals'].items():
+        entry['totals'][key] += value
+    for file_type, lines in child['file_types'].items():
+        entry['file_types'][file_type] = entry['file_types'].get(file_type, 0) + lines
+    for language, counts in child['languages'].items():
+        target = entry['languages'].setdefault(language, dict.fromkeys(COUNT_KEYS, 0))
+        for key in COUNT_KEYS:
+            target[key] += counts[key]
+
+
+class SubtreeCache:
+    """一次仓库统计中使用的子树缓存
+
+    store 为 BlobCache（与 blob 结果存放在同一个 SQLite 中）；
+    trees 为 read_tree_shas 的结果，为空时不使用缓存
+    """
+
+    def __init__(self, store, rules, trees):
+        self.store = store
+        self.rules = rules
+        self.trees = trees
+        self.children = {}  # 目录 -> 子目录列表
+        for path in trees:
+            if path:
+                self.children.setdefault(os.path.dirname(path), []).append(path)
+        # 一次读出本仓库所有目录已有的缓存，之后的判断只查内存
+        self.known = store.get_many(self._key(path) for path in trees) if trees else {}
+        self.grafted = {}  # 目录 -> 嫁接的缓存条目
+
+    def _key(self, path):
+        return f"tree:{self.trees[path]}:{self.rules.signature(path)}"
+
+    def _entry(self, path):
+        return self.known.get(self._key(path))
+
+    def _complete(self, path):
+        """目录及其所有（未被排除的）子目录都有缓存"""
+        if self._entry(path) is None:
+            return False
+        return all(self._complete(child) for child in self._included_children(path))
+
+    def _included_children(self, path):
+        return [child for child in self.children.get(path, ())
+                if not self.rules.is_excluded(child, is_dir=True)]
+
+    def try_graft(self, stats, path):
+        """目录的统计已缓存时嫁接到 stats 中并返回 True，调用方不再遍历该目录"""
+        if path not in self.trees or not self._complete(path):
+            return False
+        entry = self._entry(path)
+        totals = entry['totals']
+        stats['total_lines'] += totals['lines']
+        stats['total_files'] += totals['files']
+        stats['code_lines'] += totals['code']
+        stats['comment_lines'] += totals['comment']
+        stats['blank_lines'] += totals['blank']
+        for file_type, lines in entry['file_types'].items():
+            stats['file_type_stats'][file_type] += lines
+        for language, counts in entry['languages'].items():
+            stats['language_stats'][language] += counts['lines']
+            target = stats['language_line_stats'].setdefault(language, dict.fromkeys(COUNT_KEYS, 0))
+            for key in COUNT_KEYS:
+                target[key] += counts[key]
+        # 上级目录只累加汇总
+        if totals['files']:
+            parent = path
+            while parent:
+                parent = os.path.dirname(parent)
+                self._add_folder(stats, parent or '.', totals)
+        self._place(stats, path)
+        self.grafted[path] = entry
+        return True
+
+    def _place(self, stats, path):
+        """写入子树中每个目录和文件的明细"""
+        entry = self._entry(path)
+        if entry['totals']['files']:
+            self._add_folder(stats, path or '.', entry['totals'])
+        for name, file_info in entry['files'].items():
+            stats['file_stats'][_join(path, name)] = dict(file_info)
+        for name, pointer in entry['lfs'].items():
+            stats['lfs_files'][_join(path, name)] = pointer
+        for child in self._included_children(path):
+            self._place(stats, child)
+
+    @staticmethod
+    def _add_folder(stats, folder, totals):
+        folder_info = stats['folder_stats'].setdefault(folder, {'lines': 0, 'files': 0, 'code': 0, 'comment': 0, 'blank': 0})
+        for key in folder_info:
+            folder_info[key] += totals[key]
+
+    def record(self, stats, walked):
+        """遍历完成后，为遍历过的目录生成缓存条目并写入（结果被截断时不写入）"""
+        if not self.trees or stats.get('truncated'):
+            return
+        direct = {}
+        for file_path, file_info in stats['file_stats'].items():
+            directory, _, name = file_path.rpartition('/')
+            direct.setdefault(directory, {})[name] = file_info
+        lfs_direct = {}
+        for file_path, pointer in stats['lfs_files'].items():
+            directory, _, name = file_path.rpartition('/')
+            lfs_direct.setdefault(directory, {})[name] = pointer
+
+        entries = dict(self.grafted)
+        # 从最深的目录开始，子目录的汇总先计算好
+        for path in sorted((p for p in walked if p in self.trees), key=lambda p: p.count('/') + bool(p), reverse=True):
+            entry = _new_entry()
+            for name, file_info in direct.get(path, {}).items():
+                entry['files'][name] = {key: value for key, value in file_info.items() if key != 'percentage'}
+                for key in COUNT_KEYS:
+                    entry['totals'][key] += file_info[key]
+                entry['totals']['files'] += 1
+                file_type = file_info['file_type']
+                entry['file_types'][file_type] = entry['file_types'].get(file_type, 0) + file_info['lines']
+                language = entry['languages'].setdefault(file_info['language'], dict.fromkeys(COUNT_KEYS, 0))
+                for key in COUNT_KEYS:
+                    language[key] += file_info[key]
+            entry['lfs'] = lfs_direct.get(path, {})
+            complete = True
+            for child in self._included_children(path):
+                child_entry = entries.get(child)
+                if child_entry is None:
+                    # 子目录没有遍历到（例如读取失败），该目录不缓存
+                    complete = False
+                    break
+                entry['dirs'][os.path.basename(child)] = self.trees[child]
+                _merge_into(entry, child_entry)
+            if complete:
+                entries[path] = entry
+
+        new_entries = {self._key(path): entry for path, entry in entries.items()
+                       if path not in self.grafted and self._key(path) not in self.known}
+        self.store.put_many(new_entries)